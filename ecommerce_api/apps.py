@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class EcommerceApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ecommerce_api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Workers de l'outbox démarrés par la première requête du processus serveur,
+        # et non au chargement : pas de threads dans les commandes de gestion
+        if getattr(settings, 'NOTIFICATION_DISPATCH_MODE', 'async') == 'async':
+            from .notifications import start_dispatcher
+
+            request_started.connect(start_dispatcher, dispatch_uid='ecommerce_api.start_dispatcher')
@@ -0,0 +1,227 @@
+"""
+Versions asynchrones des lectures les plus sollicitées, pour un déploiement
+ASGI (`ASYNC_READ_VIEWS = True`) : mêmes paramètres, mêmes codes et mêmes corps
+JSON que les vues de `views.py`, requêtes passées par l'ORM asynchrone.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .cache import catalogue_cache
+from .conditional import conditional, favorites_validators, product_list_validators
+from .models import Cart, Favorite, Notification, Product
+from .notifications import aget_counter, counter_etag
+from .pagination import KeysetPagination, ProductPagination
+from .search import get_search_backend, tokenize
+from .serializers import NotificationListSerializer, ProductSerializer
+
+
+def render(data, status=status.HTTP_200_OK):
+    """Même rendu que `Response` de DRF (JSONRenderer : compact, UTF-8)."""
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def api_get(view):
+    """Équivalent asynchrone de `@api_view(['GET'])` : méthode vérifiée, exceptions DRF rendues en JSON."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            if request.method not in ('GET', 'HEAD'):
+                raise exceptions.MethodNotAllowed(request.method)
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return render({'detail': exc.detail}, status=exc.status_code)
+    return wrapper
+
+
+async def product_context(products, user_id):
+    """Contexte de `ProductSerializer` préchargé : la sérialisation ne fait plus de requête."""
+    context = {
+        'user_id': user_id,
+        'rating_stats': await sync_to_async(catalogue_cache.get_rating_stats)([p.id for p in products]),
+    }
+    if user_id:
+        context['favorite_ids'] = {
+            product_id async for product_id in Favorite.objects.filter(userId=user_id).values_list('productId', flat=True)
+        }
+        context['cart_ids'] = {
+            product_id async for product_id in Cart.objects.filter(userId=user_id).values_list('productId', flat=True)
+        }
+    return context
+
+
+async def serialize_products(products, user_id):
+    return ProductSerializer(products, many=True, context=await product_context(products, user_id)).data
+
+
+@api_get
+@conditional(product_list_validators)
+async def get_products(request):
+    request = Request(request)
+    user_id = request.query_params.get('userId')
+    products = Product.objects.all()
+
+    if KeysetPagination.is_requested(request):
+        paginator = KeysetPagination(ordering=('id',))
+
+        async def load_page():
+            results = await paginator.apaginate_queryset(products, request)
+            return results, paginator.next_cursor, paginator.previous_cursor
+
+        # Même entrée de cache que la vue synchrone
+        params = ('cursor', request.query_params.get('cursor'), paginator.get_page_size(request))
+        result_page, paginator.next_cursor, paginator.previous_cursor = await catalogue_cache.aget_list(
+            'products', params, load_page
+        )
+        data = await serialize_products(result_page, user_id)
+        return render(paginator.get_paginated_data('products', data))
+
+    paginator = ProductPagination()
+    page = request.query_params.get('page', 1)
+
+    async def load_numbered_page():
+        # Pagination DRF (COUNT + page) : synchrone, exécutée dans un thread
+        return await sync_to_async(lambda: list(paginator.paginate_queryset(products, request)))()
+
+    params = ('page', page, paginator.get_page_size(request))
+    result_page = await catalogue_cache.aget_list('products', params, load_numbered_page)
+    return render({"products": await serialize_products(result_page, user_id)})
+
+
+@api_get
+async def search_for_product(request):
+    request = Request(request)
+    keyword = request.query_params.get('q', '')
+    user_id = request.query_params.get('userId')
+
+    if not tokenize(keyword):
+        products = [product async for product in Product.objects.all().aiterator(chunk_size=2000)]
+        return render({"products": await serialize_products(products, user_id)})
+
+    # Index chargé depuis l'ORM au premier appel du processus : hors de la boucle d'événements
+    product_ids = await sync_to_async(get_search_backend().search)(keyword)
+    if 'page' in request.query_params or 'page_size' in request.query_params:
+        paginator = ProductPagination()
+        product_ids = paginator.paginate_queryset(product_ids, request)
+
+    products_dict = await Product.objects.ain_bulk(product_ids)
+    products = [products_dict[pid] for pid in product_ids if pid in products_dict]
+    return render({"products": await serialize_products(products, user_id)})
+
+
+@api_get
+@conditional(favorites_validators)
+async def get_favorites(request):
+    user_id = request.GET.get('userId')
+    favorite_ids = Favorite.objects.filter(userId=user_id).values_list('productId', flat=True)
+    products = [product async for product in Product.objects.filter(id__in=favorite_ids)]
+    return render({"favorites": await serialize_products(products, user_id)})
+
+
+@api_get
+async def get_products_in_cart(request):
+    user_id = request.GET.get('userId')
+    cart_product_ids = Cart.objects.filter(userId=user_id).values_list('productId', flat=True)
+    products = [product async for product in Product.objects.filter(id__in=cart_product_ids)]
+    return render({"carts": await serialize_products(products, user_id)})
+
+
+# Notifications
+def serialize_notifications(notifications):
+    return NotificationListSerializer(notifications, many=True).data
+
+
+@api_get
+async def notification_list(request):
+    """Équivalent de `NotificationListView` (modes page, `?cursor=` et `?since_id=`)."""
+    request = Request(request)
+    per_page = 20
+    try:
+        user = await User.objects.aget(id=request.GET.get('userId'))
+    except User.DoesNotExist:
+        return render({
+            'success': False,
+            'message': 'Accès non autorisé'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    counter = await aget_counter(user.id)
+    notifications = Notification.objects.filter(user=user)
+
+    if 'since_id' in request.GET:
+        return await notification_list_since(request, user, counter)
+
+    if KeysetPagination.is_requested(request):
+        paginator = KeysetPagination(ordering=('-created_at', '-id'))
+        paginator.page_size = per_page
+        page = await paginator.apaginate_queryset(notifications, request)
+        return render({
+            'success': True,
+            'message': 'Notifications récupérées avec succès',
+            **paginator.get_paginated_data('notifications', serialize_notifications(page)),
+            'total_count': counter.total,
+            'unread_count': counter.unread
+        })
+
+    total_pages = max(1, -(-counter.total // per_page))
+    try:
+        page = int(request.GET.get('page', 1))
+    except (TypeError, ValueError):
+        page = 1
+    page = min(max(page, 1), total_pages)
+    offset = (page - 1) * per_page
+    notifications_page = [
+        notification async for notification in notifications.order_by('-created_at', '-id')[offset:offset + per_page]
+    ]
+    return render({
+        'success': True,
+        'message': 'Notifications récupérées avec succès',
+        'notifications': serialize_notifications(notifications_page),
+        'total_pages': total_pages,
+        'current_page': page,
+        'total_count': counter.total,
+        'unread_count': counter.unread
+    })
+
+
+async def notification_list_since(request, user, counter):
+    try:
+        since_id = int(request.GET.get('since_id') or 0)
+    except ValueError:
+        return render({
+            'success': False,
+            'message': 'since_id invalide'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    limit = KeysetPagination.max_page_size
+    etag = counter_etag(counter, 'since', since_id, limit)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    notifications = []
+    if since_id < (counter.latest_id or 0):
+        notifications = [
+            notification async for notification in
+            Notification.objects.filter(user=user, id__gt=since_id).order_by('id')[:limit + 1]
+        ]
+    has_more = len(notifications) > limit
+    notifications = notifications[:limit]
+
+    response = render({
+        'success': True,
+        'message': 'Notifications récupérées avec succès',
+        'notifications': serialize_notifications(notifications),
+        'since_id': notifications[-1].id if notifications else max(since_id, counter.latest_id or 0),
+        'has_more': has_more,
+        'total_count': counter.total,
+        'unread_count': counter.unread
+    })
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,7 @@
+from django.db.backends.mysql import base
+
+from ecommerce_api.dbpool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """Backend MySQL de Django avec pool de connexions (`OPTIONS['pool']`)."""
@@ -0,0 +1,7 @@
+from django.db.backends.sqlite3 import base
+
+from ecommerce_api.dbpool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """Backend SQLite de Django avec pool de connexions (`OPTIONS['pool']`)."""
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+_MISSING = object()
+
+
+class CatalogueCache:
+    """
+    Cache en lecture (read-through) du catalogue, au-dessus du framework de
+    cache de Django.
+
+    - Entrées de listes/pages versionnées : `catalogue:<espace>:v<n>:<clé>`. Une
+      écriture incrémente la version de l'espace, ce qui rend d'un coup toutes
+      les pages obsolètes sans avoir à les énumérer.
+    - Anti-stampede : un seul worker recharge une clé absente (verrou posé avec
+      `cache.add`), les autres attendent son résultat.
+    """
+    key_prefix = 'catalogue'
+
+    def __init__(self, alias=None, timeout=None, lock_timeout=5.0, poll_interval=0.01):
+        self.alias = alias
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'loads': 0}
+
+    @property
+    def cache(self):
+        return caches[self.alias or getattr(settings, 'CATALOGUE_CACHE_ALIAS', 'default')]
+
+    def get_timeout(self):
+        if self.timeout is not None:
+            return self.timeout
+        return getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', 300)
+
+    # Statistiques
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._stats_lock:
+            for name in self._stats:
+                self._stats[name] = 0
+
+    # Lecture avec rechargement unique
+    def get_or_load(self, key, loader, timeout=None):
+        cache = self.cache
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            self._count('hits')
+            return value
+        self._count('misses')
+
+        lock_key = f'{key}:lock'
+        if cache.add(lock_key, 1, self.lock_timeout):
+            try:
+                self._count('loads')
+                value = loader()
+                cache.set(key, value, self.get_timeout() if timeout is None else timeout)
+                return value
+            finally:
+                cache.delete(lock_key)
+
+        # Un autre worker recharge déjà cette clé : on attend son résultat
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+        self._count('loads')
+        return loader()
+
+    async def aget_or_load(self, key, loader, timeout=None):
+        """`get_or_load` pour les vues asynchrones : `loader` est une coroutine et l'attente ne bloque pas la boucle."""
+        cache = self.cache
+        value = await cache.aget(key, _MISSING)
+        if value is not _MISSING:
+            self._count('hits')
+            return value
+        self._count('misses')
+
+        lock_key = f'{key}:lock'
+        if await cache.aadd(lock_key, 1, self.lock_timeout):
+            try:
+                self._count('loads')
+                value = await loader()
+                await cache.aset(key, value, self.get_timeout() if timeout is None else timeout)
+                return value
+            finally:
+                await cache.adelete(lock_key)
+
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            value = await cache.aget(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+        self._count('loads')
+        return await loader()
+
+    # Versions des espaces de listes
+    def _version_key(self, namespace):
+        return f'{self.key_prefix}:version:{namespace}'
+
+    def get_version(self, namespace):
+        cache = self.cache
+        key = self._version_key(namespace)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, 1, None)
+            version = cache.get(key, 1)
+        return version
+
+    async def aget_version(self, namespace):
+        cache = self.cache
+        key = self._version_key(namespace)
+        version = await cache.aget(key)
+        if version is None:
+            await cache.aadd(key, 1, None)
+            version = await cache.aget(key, 1)
+        return version
+
+    def bump_version(self, namespace):
+        cache = self.cache
+        key = self._version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 2, None)
+
+    def list_key(self, namespace, version, params):
+        digest = hashlib.md5(str(params).encode('utf-8')).hexdigest()
+        return f'{self.key_prefix}:{namespace}:v{version}:{digest}'
+
+    def get_list(self, namespace, params, loader):
+        version = self.get_version(namespace)
+        return self.get_or_load(self.list_key(namespace, version, params), loader)
+
+    async def aget_list(self, namespace, params, loader):
+        version = await self.aget_version(namespace)
+        return await self.aget_or_load(self.list_key(namespace, version, params), loader)
+
+    # Paniers
+    def cart_key(self, user_id):
+        # La version des produits fait partie de la clé : un changement de prix ou
+        # de stock rend obsolètes tous les récapitulatifs de panier
+        return f'{self.key_prefix}:cart:{user_id}:v{self.get_version("products")}'
+
+    def get_cart(self, user_id, loader):
+        return self.get_or_load(self.cart_key(user_id), loader)
+
+    def invalidate_cart(self, user_id):
+        self.cache.delete(self.cart_key(user_id))
+
+    # Agrégats des avis
+    def get_rating_stats(self, product_ids):
+        """`{product_id: ProductRatingStats}` d'une liste de produits, invalidé à chaque avis."""
+        from .models import ProductRatingStats
+
+        product_ids = list(product_ids)
+        return self.get_list('ratings', product_ids, lambda: ProductRatingStats.objects.in_bulk(product_ids))
+
+    def invalidate_ratings(self):
+        self.bump_version('ratings')
+
+    def invalidate_products(self):
+        """Appelé par les signaux, et explicitement après les écritures en masse (`bulk_update`...)."""
+        self.bump_version('products')
+
+    def invalidate_posters(self):
+        self.bump_version('posters')
+
+    def clear(self):
+        self.cache.clear()
+        self.reset_stats()
+
+
+catalogue_cache = CatalogueCache()
@@ -0,0 +1,122 @@
+import json
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, DecimalField, ExpressionWrapper, F, IntegerField, Value, When
+from django.db.models.functions import Coalesce
+
+from .cache import catalogue_cache
+from .models import Cart, Product
+from .serializers import CartSummarySerializer
+
+
+# Colonnes déjà présentes dans la ligne, jamais recopiées dans `extra`
+CART_COLUMNS = {'userId', 'productId', 'quantity', 'cart'}
+EXTRA_MAX_KEYS = 20
+EXTRA_MAX_BYTES = 1024
+
+
+def cart_extra(data):
+    """
+    Champs supplémentaires envoyés par le client, à conserver dans `Cart.extra`.
+
+    Seules les valeurs scalaires sont gardées (au plus `EXTRA_MAX_KEYS` clés et
+    `EXTRA_MAX_BYTES` octets en JSON) : la colonne reste petite et typée,
+    contrairement à l'ancienne copie intégrale de la requête.
+    """
+    if not isinstance(data, dict):
+        return None
+    extra = {}
+    size = 2
+    for key, value in data.items():
+        if key in CART_COLUMNS or not isinstance(value, (str, int, float, bool, type(None))):
+            continue
+        item_size = len(json.dumps({key: value}).encode('utf-8'))
+        if len(extra) >= EXTRA_MAX_KEYS or size + item_size > EXTRA_MAX_BYTES:
+            break
+        extra[str(key)] = value
+        size += item_size
+    return extra or None
+
+
+def cart_lines(user_id):
+    """
+    Lignes du panier d'un utilisateur en une seule requête : jointure sur le
+    produit, prix de ligne et disponibilité calculés par la base. Un produit
+    supprimé du catalogue donne une ligne sans prix et hors stock.
+    """
+    return (
+        Cart.objects.filter(userId=user_id)
+        .annotate(
+            product_name=F('product__product_name'),
+            image=F('product__image'),
+            unit_price=F('product__price'),
+            line_total=ExpressionWrapper(
+                F('product__price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)
+            ),
+            available_quantity=Coalesce(F('product__quantity'), Value(0), output_field=IntegerField()),
+            in_stock=Case(
+                When(product__quantity__gte=F('quantity'), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+        .order_by('created_at', 'id')
+        .values(
+            'productId', 'product_name', 'image', 'quantity', 'unit_price', 'line_total',
+            'available_quantity', 'in_stock',
+        )
+    )
+
+
+def build_cart_summary(user_id):
+    lines = list(cart_lines(user_id))
+    summary = {
+        'lines': lines,
+        'item_count': len(lines),
+        'total_quantity': sum(line['quantity'] for line in lines),
+        'grand_total': sum((line['line_total'] for line in lines if line['line_total'] is not None), Decimal('0')),
+        'all_in_stock': all(line['in_stock'] for line in lines),
+    }
+    return CartSummarySerializer(summary).data
+
+
+def get_cart_summary(user_id):
+    """Récapitulatif du panier, mis en cache par utilisateur."""
+    return catalogue_cache.get_cart(user_id, lambda: build_cart_summary(user_id))
+
+
+def apply_cart_operations(user_id, operations):
+    """
+    Applique un lot d'opérations `{productId, quantity}` au panier dans une seule
+    transaction : un upsert pour les quantités > 0, un DELETE pour les 0. Pour un
+    même produit, la dernière opération l'emporte.
+
+    Renvoie la liste des produits inconnus (rien n'est alors écrit).
+    """
+    quantities = {}
+    for operation in operations:
+        quantities[operation['productId']] = operation['quantity']
+
+    upserts = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    removals = [product_id for product_id, quantity in quantities.items() if quantity == 0]
+
+    existing = set(Product.objects.filter(id__in=upserts).values_list('id', flat=True))
+    unknown = sorted(set(upserts) - existing)
+    if unknown:
+        return unknown
+
+    with transaction.atomic():
+        if upserts:
+            kwargs = {'update_conflicts': True, 'update_fields': ['quantity']}
+            # MySQL (ON DUPLICATE KEY UPDATE) ne permet pas de préciser la contrainte visée
+            if connection.features.supports_update_conflicts_with_target:
+                kwargs['unique_fields'] = ['userId', 'productId']
+            Cart.objects.bulk_create(
+                [Cart(userId=user_id, productId=product_id, quantity=quantity) for product_id, quantity in upserts.items()],
+                **kwargs
+            )
+        if removals:
+            Cart.objects.filter(userId=user_id, productId__in=removals).delete()
+        transaction.on_commit(lambda: catalogue_cache.invalidate_cart(user_id))
+    return []
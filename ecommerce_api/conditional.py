@@ -0,0 +1,152 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .cache import catalogue_cache
+from .models import Cart, Favorite, Poster, Product, Review
+
+
+class Validators:
+    """
+    Validateur d'une réponse : un état (tuple de valeurs simples) calculé sans
+    sérialiser la réponse. L'ETag est une empreinte de l'état, préfixée par le
+    nom de la ressource.
+
+    Pas de `Last-Modified` : la plus grande date de modification ne bouge pas
+    quand une ligne est supprimée (produit, favori, article du panier), et un
+    client qui n'enverrait que `If-Modified-Since` recevrait un 304 périmé.
+    Le nombre de lignes et le plus grand id, dans l'ETag, voient ces suppressions.
+    """
+
+    def __init__(self, name, state=()):
+        self.name = name
+        self.state = tuple(state)
+
+    def add(self, state, last_modified=None):
+        # La date fait partie de l'état : une modification sans ajout ni suppression change l'ETag
+        self.state += (*state, last_modified.isoformat() if last_modified is not None else None)
+        return self
+
+    @property
+    def etag(self):
+        digest = hashlib.md5(repr(self.state).encode('utf-8')).hexdigest()[:20]
+        return f'"{self.name}-{digest}"'
+
+
+def add_validator_headers(response, validators):
+    response['ETag'] = validators.etag
+    # Le client garde la réponse mais doit la revalider à chaque fois
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def conditional(get_validators):
+    """
+    Réponse conditionnelle d'une vue en lecture : `get_validators(request, ...)`
+    renvoie des `Validators` (ou `None` pour laisser la vue répondre, par exemple
+    à une requête invalide). Si le client a déjà cette version (`If-None-Match`),
+    la vue n'est pas appelée et la réponse est un 304 sans corps.
+
+    À placer sous `@api_view` : la vue reçoit la requête DRF. Les vues
+    asynchrones sont aussi prises en charge (validateurs calculés dans un thread).
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                validators = await sync_to_async(get_validators)(request, *args, **kwargs)
+                if validators is None:
+                    return await view(request, *args, **kwargs)
+
+                response = get_conditional_response(request, etag=validators.etag)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                return add_validator_headers(response, validators)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            validators = get_validators(request, *args, **kwargs)
+            if validators is None:
+                return view(request, *args, **kwargs)
+
+            response = get_conditional_response(request, etag=validators.etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            return add_validator_headers(response, validators)
+        return wrapper
+    return decorator
+
+
+def queryset_state(queryset, field):
+    """`(nombre de lignes, plus grand id)` et plus grande valeur de `field`, en un seul agrégat."""
+    state = queryset.order_by().aggregate(count=Count('pk'), latest_id=Max('pk'), last_modified=Max(field))
+    return (state['count'], state['latest_id']), state['last_modified']
+
+
+def latest_row_state(queryset, field):
+    """Pour les tables en ajout seul (avis) : id et `field` de la dernière ligne, via la clé primaire."""
+    latest = queryset.order_by('-pk').values_list('pk', field).first()
+    return ((latest[0],), latest[1]) if latest else ((None,), None)
+
+
+# États du catalogue, mis en cache sous la version de leur espace : recalculés
+# après chaque écriture, sans requête tant que rien ne change
+def products_state():
+    return catalogue_cache.get_list('products', 'state', lambda: queryset_state(Product.objects.all(), 'updated_at'))
+
+
+def ratings_state():
+    return catalogue_cache.get_list('ratings', 'state', lambda: latest_row_state(Review.objects.all(), 'created_at'))
+
+
+def posters_state():
+    return catalogue_cache.get_list('posters', 'state', lambda: queryset_state(Poster.objects.all(), 'updated_at'))
+
+
+def user_state(validators, user_id):
+    """Ajoute les favoris et le panier de l'utilisateur (indicateurs `isFavourite` / `isInCart`)."""
+    if not user_id:
+        return validators
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return validators
+    validators.add(*queryset_state(Favorite.objects.filter(userId=user_id), 'created_at'))
+    return validators.add(*queryset_state(Cart.objects.filter(userId=user_id), 'created_at'))
+
+
+# Validateurs des vues
+def product_list_validators(request):
+    validators = Validators('products').add(*products_state()).add(*ratings_state())
+    return user_state(validators, request.GET.get('userId'))
+
+
+def favorites_validators(request):
+    validators = Validators('favorites').add(*products_state()).add(*ratings_state())
+    return user_state(validators, request.GET.get('userId'))
+
+
+def reviews_validators(request):
+    try:
+        product_id = int(request.GET.get('productId'))
+    except (TypeError, ValueError):
+        return None
+    # Index (productId, -created_at) : pas de lecture de la table des avis
+    return Validators('reviews').add(*queryset_state(Review.objects.filter(productId=product_id), 'created_at'))
+
+
+def posters_validators(request):
+    return Validators('posters').add(*posters_state())
@@ -0,0 +1,349 @@
+"""
+Pool de connexions pour les backends de base de données Django qui n'en ont pas
+(MySQL, SQLite), activé par `DATABASES[...]['OPTIONS']['pool']` comme le pool
+natif du backend PostgreSQL.
+
+Avec `CONN_MAX_AGE = 0`, Django ferme la connexion à la fin de chaque requête ;
+ici, la fermeture rend la connexion au pool au lieu de la couper, et la requête
+suivante la reprend sans nouvelle poignée de main TCP ni authentification.
+Le pool est partagé par tous les threads du processus (workers WSGI multi-thread,
+threads des vues synchrones et de l'ORM sous ASGI) et repart à vide après un fork.
+"""
+import os
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError
+from django.db.backends.base.base import NO_DB_ALIAS
+
+
+class PoolTimeout(OperationalError):
+    """Aucune connexion libérée dans le délai `timeout`."""
+
+
+def check_connection(connection):
+    """Vérification au retrait du pool : un aller-retour `SELECT 1` (DB-API)."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def close_connection(connection):
+    try:
+        connection.close()
+    except Exception:
+        # Connexion déjà coupée côté serveur : rien à libérer
+        pass
+
+
+class ConnectionPool:
+    """
+    Pool de connexions DB-API thread-safe.
+
+    - `max_size` : connexions ouvertes au plus (prêtées + libres) ; au-delà,
+      `getconn` attend qu'une connexion soit rendue, au plus `timeout` secondes ;
+    - `max_idle` : une connexion libre depuis plus longtemps est fermée (rester
+      sous le `wait_timeout` du serveur) ; `max_lifetime` : âge maximal ;
+    - `check` : appelé sur une connexion réutilisée avant de la prêter, une
+      connexion qui échoue est jetée et remplacée.
+
+    Les connexions libres sont reprises de la plus récemment rendue à la plus
+    ancienne, pour que les moins utiles expirent.
+    """
+
+    def __init__(self, max_size=10, timeout=30.0, max_idle=600.0, max_lifetime=3600.0,
+                 check=None, close=close_connection):
+        if max_size < 1:
+            raise ImproperlyConfigured('Le pool de connexions doit avoir max_size >= 1.')
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check = check
+        self._close = close
+        self._lock = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._closed = False
+        # (connexion, ouverte à, rendue à), la plus récemment rendue à droite
+        self._idle = deque()
+        # id(connexion) -> ouverte à, pour les connexions prêtées
+        self._in_use = {}
+        # Connexions en cours d'ouverture, comptées dans la taille du pool
+        self._opening = 0
+        self._waiting = 0
+        self._stats = {
+            'checkouts': 0,
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'health_check_failures': 0,
+            'timeouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    @property
+    def size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _check_fork(self):
+        # Connexions héritées du parent : ne pas les fermer (cela couperait aussi
+        # les siennes, même socket), seulement les oublier
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _expired(self, opened_at, returned_at, now):
+        return (
+            (self.max_idle is not None and now - returned_at > self.max_idle)
+            or (self.max_lifetime is not None and now - opened_at > self.max_lifetime)
+        )
+
+    def _discard(self, connection):
+        # Fermeture hors verrou : elle peut faire un aller-retour réseau
+        with self._lock:
+            self._stats['connections_closed'] += 1
+        self._close(connection)
+
+    def getconn(self, connect):
+        """
+        Prête une connexion : une connexion libre valide, sinon une nouvelle
+        ouverte par `connect()` si la taille le permet, sinon attend.
+        Renvoie `(connexion, réutilisée)`.
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            expired = []
+            connection = opened_at = None
+            with self._lock:
+                self._check_fork()
+                if self._closed:
+                    raise OperationalError('Le pool de connexions est fermé.')
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        candidate, candidate_opened_at, returned_at = self._idle.pop()
+                        if self._expired(candidate_opened_at, returned_at, now):
+                            expired.append(candidate)
+                            continue
+                        connection, opened_at = candidate, candidate_opened_at
+                        self._in_use[id(connection)] = opened_at
+                        break
+                    if connection is not None or self.size < self.max_size:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'Aucune connexion disponible après {self.timeout} s '
+                            f'({self.max_size} connexions prêtées).'
+                        )
+                    waited = True
+                    self._waiting += 1
+                    try:
+                        self._lock.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if connection is None:
+                    self._opening += 1
+
+            for candidate in expired:
+                self._discard(candidate)
+
+            if connection is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    with self._lock:
+                        self._opening -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._opening -= 1
+                    self._in_use[id(connection)] = time.monotonic()
+                    self._stats['connections_opened'] += 1
+                self._record_checkout(start, waited)
+                return connection, False
+
+            if self.check is not None:
+                try:
+                    self.check(connection)
+                except Exception:
+                    with self._lock:
+                        self._in_use.pop(id(connection), None)
+                        self._stats['health_check_failures'] += 1
+                        self._lock.notify()
+                    self._discard(connection)
+                    continue
+            self._record_checkout(start, waited)
+            return connection, True
+
+    def _record_checkout(self, start, waited):
+        wait_time = time.monotonic() - start
+        with self._lock:
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += wait_time
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+
+    def putconn(self, connection, broken=False):
+        """Rend une connexion prêtée ; `broken` la ferme au lieu de la garder."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Prêtée avant le fork : elle appartient au parent
+                self._check_fork()
+                return
+            opened_at = self._in_use.pop(id(connection), None)
+            now = time.monotonic()
+            keep = (
+                opened_at is not None and not broken and not self._closed
+                and (self.max_lifetime is None or now - opened_at <= self.max_lifetime)
+            )
+            if keep:
+                self._idle.append((connection, opened_at, now))
+            # Connexions libres les plus anciennes expirées
+            expired = []
+            while self._idle and self._expired(self._idle[0][1], self._idle[0][2], now):
+                expired.append(self._idle.popleft()[0])
+            self._lock.notify()
+        if not keep:
+            expired.append(connection)
+        for candidate in expired:
+            self._discard(candidate)
+
+    def close(self):
+        """Ferme les connexions libres ; celles encore prêtées le seront à leur retour."""
+        with self._lock:
+            self._check_fork()
+            self._closed = True
+            idle = [connection for connection, _, _ in self._idle]
+            self._idle.clear()
+            self._lock.notify_all()
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._lock:
+            self._check_fork()
+            stats = dict(self._stats)
+            stats.update({
+                'max_size': self.max_size,
+                'size': self.size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+            })
+        for name in ('wait_time_total', 'wait_time_max'):
+            stats[f'{name}_ms'] = round(stats.pop(name) * 1000, 3)
+        stats['wait_time_avg_ms'] = round(stats['wait_time_total_ms'] / stats['waits'], 3) if stats['waits'] else 0.0
+        return stats
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    À placer devant le `DatabaseWrapper` d'un backend Django : avec
+    `OPTIONS['pool']` (`True` ou les arguments de `ConnectionPool`), les
+    connexions sont prises dans un pool par base au lieu d'être ouvertes à
+    chaque requête. `CONN_HEALTH_CHECKS` active la vérification au retrait.
+    """
+    _connection_pools = {}
+    _connection_pools_lock = threading.Lock()
+
+    @property
+    def pool_key(self):
+        # Le NAME change quand la suite de tests bascule sur la base de test
+        return (self.alias, self.settings_dict['NAME'])
+
+    @property
+    def pool(self):
+        pool_options = self.settings_dict['OPTIONS'].get('pool')
+        if self.alias == NO_DB_ALIAS or not pool_options:
+            return None
+
+        pool = self._connection_pools.get(self.pool_key)
+        if pool is None:
+            if self.settings_dict.get('CONN_MAX_AGE', 0) != 0:
+                raise ImproperlyConfigured(
+                    'Le pool de connexions remplace les connexions persistantes : CONN_MAX_AGE doit valoir 0.'
+                )
+            if pool_options is True:
+                pool_options = {}
+            with self._connection_pools_lock:
+                pool = self._connection_pools.get(self.pool_key)
+                if pool is None:
+                    pool = ConnectionPool(
+                        check=check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+                        **pool_options,
+                    )
+                    self._connection_pools[self.pool_key] = pool
+        return pool
+
+    def close_pool(self):
+        with self._connection_pools_lock:
+            pool = self._connection_pools.pop(self.pool_key, None)
+        if pool is not None:
+            pool.close()
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        # Option du pool, pas du pilote
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        self.pool_connection_reused = False
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection, self.pool_connection_reused = pool.getconn(partial(super().get_new_connection, conn_params))
+        return connection
+
+    def init_connection_state(self):
+        # Une connexion réutilisée garde les réglages de session posés à son ouverture
+        if self.connection is not None and getattr(self, 'pool_connection_reused', False):
+            return
+        super().init_connection_state()
+
+    def close_if_health_check_failed(self):
+        if self.pool is not None:
+            # Le pool ne prête que des connexions vérifiées
+            return
+        return super().close_if_health_check_failed()
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        # Même si la fermeture a lieu dans un bloc atomic, la connexion rendue ne
+        # doit plus être utilisée par ce wrapper
+        connection, self.connection = self.connection, None
+        broken = False
+        try:
+            if self.in_atomic_block or not self.autocommit:
+                # Ne pas prêter une connexion avec une transaction ouverte
+                connection.rollback()
+            elif self.errors_occurred:
+                check_connection(connection)
+        except self.Database.Error:
+            broken = True
+        pool.putconn(connection, broken=broken)
+
+
+def pool_stats():
+    """Métriques des pools de ce processus, par alias de base."""
+    with PooledDatabaseWrapperMixin._connection_pools_lock:
+        pools = list(PooledDatabaseWrapperMixin._connection_pools.items())
+    return {alias: pool.stats() for (alias, name), pool in pools}
+
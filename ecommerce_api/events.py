@@ -0,0 +1,292 @@
+import asyncio
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .models import Notification
+from .serializers import NotificationListSerializer
+
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Abonnement d'une connexion à un canal.
+
+    La file ne garde qu'un message : les messages sont des signaux idempotents
+    (« il y a du nouveau jusqu'à l'id N »), un message en attente couvre donc
+    ceux qui arrivent avant sa lecture. Une connexion inactive ne coûte qu'une
+    file vide.
+    """
+
+    def __init__(self, broker, channel, loop):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=1)
+
+    def deliver(self, message):
+        # Appelé depuis n'importe quel thread
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # Boucle fermée : connexion déjà terminée
+            self.close()
+
+    def _put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Prochain message, ou `None` après `timeout` secondes sans message."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class BaseBroker:
+    """Pub/sub entre les workers qui créent les notifications et les connexions ouvertes."""
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class LocalBroker(BaseBroker):
+    """
+    Diffusion dans le processus courant uniquement : suffisant avec un seul
+    processus serveur, et utilisé dans les tests à la place de Redis.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, message):
+        self.dispatch(channel, message)
+
+    def dispatch(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class RedisBroker(LocalBroker):
+    """
+    Diffusion entre processus via Redis Pub/Sub (`NOTIFICATION_REDIS_URL`).
+
+    Chaque processus n'ouvre qu'un abonnement Redis (motif `<préfixe>*`) dans un
+    thread d'écoute, puis redistribue localement : le nombre de connexions
+    clientes n'a pas d'effet sur Redis.
+    """
+    prefix = 'notifications:'
+
+    def __init__(self, url=None):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBroker nécessite le paquet "redis".')
+        self.client = redis.Redis.from_url(url or getattr(settings, 'NOTIFICATION_REDIS_URL', 'redis://localhost:6379/0'))
+        self._listener = None
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, json.dumps(message))
+
+    def subscribe(self, channel):
+        self._start_listener()
+        return super().subscribe(channel)
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name='notification-broker', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self.prefix + '*')
+        for item in pubsub.listen():
+            try:
+                channel = item['channel']
+                if isinstance(channel, bytes):
+                    channel = channel.decode('utf-8')
+                self.dispatch(channel[len(self.prefix):], json.loads(item['data']))
+            except Exception:
+                logger.exception('Message de notification invalide reçu de Redis')
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'NOTIFICATION_BROKER', 'ecommerce_api.events.LocalBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def publish_new_notifications(latest_ids):
+    """Signale, pour chaque utilisateur, le plus grand id de notification créé."""
+    broker = get_broker()
+    for user_id, latest_id in latest_ids.items():
+        try:
+            broker.publish(user_channel(user_id), {'latest_id': latest_id})
+        except Exception:
+            # Les clients rattrapent à leur reconnexion (Last-Event-ID)
+            logger.exception('Échec de la publication des notifications')
+
+
+def format_event(data, event=None, event_id=None):
+    """Bloc Server-Sent Events (`id`, `event`, `data`)."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def stream_sync_to_async(func):
+    """
+    `sync_to_async` pour les lectures en base des flux ouverts : elles passent
+    par un pool de `NOTIFICATION_STREAM_DB_THREADS` threads partagé par tout le
+    processus.
+
+    Sous ASGIHandler, `sync_to_async` par défaut (et l'ORM asynchrone) exécute le
+    code dans un thread propre à la requête, gardé jusqu'à la fin de la réponse :
+    chaque flux inactif immobiliserait un thread.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'NOTIFICATION_STREAM_DB_THREADS', 4),
+                    thread_name_prefix='notification-stream',
+                )
+    return sync_to_async(func, thread_sensitive=False, executor=_executor)
+
+
+def release_connection(func):
+    """Rend la connexion du thread (au pool) après `func`, hors transaction en cours."""
+    @wraps(func)
+    def inner(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Un flux ouvert ne garde pas de connexion entre deux lectures
+            if not connection.in_atomic_block:
+                connection.close()
+    return inner
+
+
+def release_request_thread():
+    """
+    Arrête le thread propre à la requête en cours (celui où ASGIHandler exécute
+    les middlewares synchrones) : il resterait inactif jusqu'à la fin du flux.
+    Un appel synchrone ultérieur de la requête en recrée un.
+    """
+    context = SyncToAsync.thread_sensitive_context.get(None)
+    if context is None:
+        return
+    executor = SyncToAsync.context_to_thread_executor.pop(context, None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+@release_connection
+def load_notifications(user_id, after_id, limit):
+    notifications = Notification.objects.filter(user_id=user_id, id__gt=after_id).order_by('id')[:limit]
+    return NotificationListSerializer(notifications, many=True).data
+
+
+async def notification_events(user_id, last_id, heartbeat=None, retry=None, batch_size=100):
+    """
+    Flux SSE des notifications d'un utilisateur à partir de l'id `last_id`
+    exclu (reprise via `Last-Event-ID`).
+
+    Entre deux notifications, la connexion ne fait qu'attendre un signal du
+    broker : aucune requête en base, un commentaire `: ping` toutes les
+    `heartbeat` secondes garde la connexion ouverte à travers les proxys.
+    """
+    heartbeat = heartbeat or getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+    retry = retry or getattr(settings, 'NOTIFICATION_STREAM_RETRY', 5000)
+    load = stream_sync_to_async(load_notifications)
+
+    # Abonnement avant le rattrapage : rien n'est perdu entre les deux
+    subscription = get_broker().subscribe(user_channel(user_id))
+    try:
+        yield f'retry: {retry}\n\n'
+        # Les middlewares ont traité la réponse : plus rien à exécuter dans le thread de la requête
+        release_request_thread()
+        pending = True
+        while True:
+            while pending:
+                notifications = await load(user_id, last_id, batch_size)
+                for notification in notifications:
+                    last_id = notification['id']
+                    yield format_event(notification, event='notification', event_id=last_id)
+                pending = len(notifications) == batch_size
+
+            message = await subscription.get(heartbeat)
+            if message is None:
+                yield ': ping\n\n'
+            elif message.get('latest_id', 0) > last_id:
+                pending = True
+    finally:
+        subscription.close()
@@ -0,0 +1,195 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import History
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def upsert_history(views):
+    """Écrit `{(userId, productId): viewed_at}` en un seul INSERT ... ON CONFLICT/DUPLICATE KEY UPDATE."""
+    if not views:
+        return
+    kwargs = {'update_conflicts': True, 'update_fields': ['viewed_at']}
+    # MySQL (ON DUPLICATE KEY UPDATE) ne permet pas de préciser la contrainte visée
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = ['userId', 'productId']
+    History.objects.bulk_create(
+        [History(userId=user_id, productId=product_id, viewed_at=viewed_at)
+         for (user_id, product_id), viewed_at in views.items()],
+        batch_size=get_setting('HISTORY_FLUSH_SIZE', 1000),
+        **kwargs
+    )
+
+
+def trim_history(user_ids, limit=None):
+    """
+    Ne garde que les `limit` consultations les plus récentes de chaque
+    utilisateur (par défaut `HISTORY_MAX_ENTRIES_PER_USER` ; 0 ou `None` dans le
+    réglage = sans limite).
+
+    Une seule requête groupée sur l'index (userId, -viewed_at) trouve les
+    utilisateurs au-delà du plafond ; pour chacun d'eux seulement, une lecture
+    trouve la première ligne en trop et un seul DELETE supprime celle-ci et
+    toutes les plus anciennes. Renvoie le nombre de lignes supprimées.
+    """
+    if limit is None:
+        limit = get_setting('HISTORY_MAX_ENTRIES_PER_USER', 200)
+    if not limit or not user_ids:
+        return 0
+    over_limit = (
+        History.objects.filter(userId__in=user_ids).order_by().values('userId')
+        .annotate(entries=Count('id')).filter(entries__gt=limit).values_list('userId', flat=True)
+    )
+    deleted = 0
+    for user_id in list(over_limit):
+        cutoff = list(
+            History.objects.filter(userId=user_id).order_by('-viewed_at', '-id')
+            .values_list('viewed_at', 'id')[limit:limit + 1]
+        )
+        if not cutoff:
+            continue
+        viewed_at, history_id = cutoff[0]
+        deleted += History.objects.filter(
+            Q(viewed_at__lt=viewed_at) | Q(viewed_at=viewed_at, id__lte=history_id), userId=user_id
+        ).delete()[0]
+    return deleted
+
+
+class HistoryBuffer:
+    """
+    Tampon d'écriture différée de l'historique de consultation, par processus.
+
+    Les consultations sont regroupées en mémoire par `(userId, productId)` en ne
+    gardant que la plus récente, puis écrites par un thread de fond en un seul
+    upsert toutes les `HISTORY_FLUSH_INTERVAL` secondes, ou dès que
+    `HISTORY_FLUSH_SIZE` couples sont en attente. Le tampon est vidé à l'arrêt
+    du processus. En mode `sync` (tests), chaque consultation est écrite tout de suite.
+
+    Au pire, un arrêt brutal perd les consultations de la dernière période.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def record(self, user_id, product_id, viewed_at=None):
+        viewed_at = viewed_at or timezone.now()
+        if get_setting('HISTORY_WRITE_MODE', 'buffered') == 'sync':
+            upsert_history({(user_id, product_id): viewed_at})
+            trim_history([user_id])
+            return
+
+        key = (user_id, product_id)
+        with self._lock:
+            current = self._pending.get(key)
+            if current is None or viewed_at > current:
+                self._pending[key] = viewed_at
+            full = len(self._pending) >= get_setting('HISTORY_FLUSH_SIZE', 1000)
+        self.start()
+        if full:
+            self._wakeup.set()
+
+    def discard_user(self, user_id):
+        """
+        Oublie les consultations en attente d'un utilisateur (historique effacé).
+
+        Attend la fin d'une écriture en cours : elle a déjà retiré ses
+        consultations du tampon et doit les avoir écrites avant l'effacement.
+        """
+        with self._flush_lock, self._lock:
+            for key in [key for key in self._pending if key[0] == user_id]:
+                del self._pending[key]
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Écrit les consultations en attente ; renvoie le nombre de couples écrits."""
+        with self._flush_lock:
+            with self._lock:
+                views, self._pending = self._pending, {}
+            if not views:
+                return 0
+            try:
+                upsert_history(views)
+            except Exception:
+                # Remise en attente pour le prochain passage, sans écraser une consultation plus récente
+                with self._lock:
+                    for key, viewed_at in views.items():
+                        current = self._pending.get(key)
+                        if current is None or viewed_at > current:
+                            self._pending[key] = viewed_at
+                raise
+            # Plafond par utilisateur appliqué à l'écriture, pour les seuls utilisateurs concernés
+            trim_history({user_id for user_id, _ in views})
+            return len(views)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(get_setting('HISTORY_FLUSH_INTERVAL', 0.5))
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Échec de l'écriture de l'historique")
+            finally:
+                close_old_connections()
+
+    def stop(self, timeout=5.0):
+        """Arrête le thread d'écriture puis vide le tampon (arrêt du processus)."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            thread.join(timeout)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Échec du vidage de l'historique à l'arrêt")
+
+
+history_buffer = HistoryBuffer()
+
+
+def clear_user_history(user_id):
+    """
+    Efface l'historique d'un utilisateur en un seul `DELETE ... WHERE userId = %s`.
+
+    `History` n'a ni relation en cascade ni signal de suppression : `delete()`
+    prend le chemin rapide de Django, sans charger les lignes, et la requête ne
+    touche que les lignes de l'utilisateur, via l'index (userId, -viewed_at).
+    Renvoie le nombre de lignes supprimées.
+    """
+    # Sinon le prochain passage du tampon réécrirait les consultations effacées
+    history_buffer.discard_user(user_id)
+    deleted, _ = History.objects.filter(userId=user_id).delete()
+    return deleted
@@ -0,0 +1,192 @@
+import atexit
+import io
+import logging
+import math
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.utils import timezone
+from PIL import ExifTags, Image, ImageOps
+
+from .cache import catalogue_cache
+from .models import Poster, UserProfile
+
+
+logger = logging.getLogger(__name__)
+
+# format -> (format Pillow, extension, type MIME)
+FORMATS = {
+    'webp': ('WEBP', '.webp', 'image/webp'),
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg'),
+}
+
+# Images traitées : type -> (modèle, champ image, champ des déclinaisons)
+TARGETS = {
+    'poster': (Poster, 'image', 'image_variants'),
+    'user': (UserProfile, 'photo', 'photo_variants'),
+}
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def derivative_name(name, width, fmt):
+    """`posters/soldes.jpg` -> `posters/soldes_w640.webp`, à côté de l'original."""
+    root, _ = os.path.splitext(name)
+    return f'{root}_w{width}{FORMATS[fmt][1]}'
+
+
+def is_current(variants, source):
+    """Les déclinaisons enregistrées correspondent-elles à l'image actuelle ?"""
+    return bool(variants) and variants.get('source') == source
+
+
+def current_variants(variants, source):
+    return variants['items'] if source and is_current(variants, source) else []
+
+
+def encode(image, fmt, quality):
+    if fmt == 'jpeg' and image.mode == 'RGBA':
+        # Pas de transparence en JPEG : fond blanc
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, FORMATS[fmt][0], quality=quality, optimize=fmt == 'jpeg')
+    return buffer.getvalue()
+
+
+def generate_derivatives(name, storage=default_storage):
+    """
+    Génère les déclinaisons redimensionnées d'une image aux largeurs
+    `IMAGE_DERIVATIVE_WIDTHS` (sans agrandir) et dans les formats
+    `IMAGE_DERIVATIVE_FORMATS`, enregistrées à côté de l'original. Renvoie
+    `[{width, height, format, name}]`, de la plus petite à la plus grande.
+    """
+    formats = [fmt for fmt in get_setting('IMAGE_DERIVATIVE_FORMATS', ['webp', 'jpeg']) if fmt in FORMATS]
+    quality = get_setting('IMAGE_DERIVATIVE_QUALITY', 80)
+
+    with storage.open(name, 'rb') as file:
+        image = Image.open(file)
+        width, height = image.size
+        # Largeur affichée : une photo prise en portrait est souvent stockée couchée (EXIF)
+        if image.getexif().get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8):
+            width, height = height, width
+        widths = sorted({w for w in get_setting('IMAGE_DERIVATIVE_WIDTHS', [320, 640, 1080]) if w < width})
+        if not widths or not formats:
+            return []
+
+        # JPEG : décodage directement à l'échelle réduite (1/2, 1/4, 1/8) suffisante
+        # pour la plus grande déclinaison, bien moins coûteux que le décodage complet
+        ratio = widths[-1] / width
+        image.draft('RGB', (math.ceil(image.width * ratio), math.ceil(image.height * ratio)))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+
+    variants = []
+    for target_width in widths:
+        target_height = max(1, round(height * target_width / width))
+        resized = image.resize((target_width, target_height), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            derivative = derivative_name(name, target_width, fmt)
+            if storage.exists(derivative):
+                storage.delete(derivative)
+            saved = storage.save(derivative, ContentFile(encode(resized, fmt, quality)))
+            variants.append({'width': target_width, 'height': target_height, 'format': fmt, 'name': saved})
+    return variants
+
+
+def delete_derivatives(variants, storage=default_storage):
+    for item in (variants or {}).get('items', []):
+        if storage.exists(item['name']):
+            storage.delete(item['name'])
+
+
+def process_image(kind, pk):
+    """
+    Génère les déclinaisons de l'image d'un poster (`'poster'`) ou d'une photo
+    de profil (`'user'`) et les enregistre sur la ligne. Ne fait rien si elles
+    sont déjà à jour ; si l'image a été remplacée pendant le traitement, les
+    fichiers produits sont supprimés (la nouvelle image a sa propre tâche).
+    """
+    model, field, variants_field = TARGETS[kind]
+    row = model.objects.filter(pk=pk).values(field, variants_field).first()
+    if not row or not row[field]:
+        return None
+    source, previous = row[field], row[variants_field]
+    if is_current(previous, source):
+        return previous
+
+    variants = {'source': source, 'items': generate_derivatives(source)}
+    changes = {variants_field: variants}
+    if model is Poster:
+        # Validateur des réponses conditionnelles de get_posters
+        changes['updated_at'] = timezone.now()
+    # `update()` : pas de signal post_save, donc pas de nouvelle tâche
+    if not model.objects.filter(pk=pk, **{field: source}).update(**changes):
+        delete_derivatives(variants)
+        return None
+
+    if previous:
+        delete_derivatives(previous)
+    if model is Poster:
+        catalogue_cache.invalidate_posters()
+    return variants
+
+
+class ImageProcessor:
+    """
+    Thread de fond qui génère les déclinaisons d'images, hors du thread de la
+    requête d'envoi. Les tâches restantes sont traitées à l'arrêt du processus ;
+    celles perdues lors d'un arrêt brutal sont reprises par la commande
+    `generate_image_variants`. En mode `sync` (tests), le traitement est immédiat.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def submit(self, kind, pk):
+        if get_setting('IMAGE_PROCESSING_MODE', 'background') == 'sync':
+            process_image(kind, pk)
+            return
+        self.start()
+        self._queue.put((kind, pk))
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='image-processor', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            try:
+                process_image(*task)
+            except Exception:
+                logger.exception("Échec de la génération des déclinaisons d'image %s", task)
+            finally:
+                close_old_connections()
+
+    def stop(self, timeout=30.0):
+        """Traite les tâches en attente puis arrête le thread (arrêt du processus)."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+image_processor = ImageProcessor()
@@ -0,0 +1,144 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from .cache import catalogue_cache
+from .models import Product
+from .search import get_search_backend
+from .serializers import ProductImportSerializer
+
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+# Colonnes écrasées par l'upsert, si la ligne les fournit ; `updated_at` (auto_now)
+# est calculé à l'insertion et toujours recopié en cas de conflit
+UPDATE_FIELDS = ['product_name', 'price', 'quantity', 'category', 'image']
+
+
+def iter_csv_rows(stream):
+    """Lignes d'un flux CSV (octets) avec en-tête ; numérotation à partir de 1 après l'en-tête."""
+    text = codecs.iterdecode(stream, 'utf-8-sig')
+    for number, row in enumerate(csv.DictReader(text), start=1):
+        # Cellule vide = champ absent (valeur par défaut du modèle)
+        yield number, {key: value for key, value in row.items() if key and value != ''}
+
+
+def iter_ndjson_rows(stream):
+    """Lignes d'un flux NDJSON (un objet JSON par ligne, lignes vides ignorées)."""
+    for number, line in enumerate(stream, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8-sig' if number == 1 else 'utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f'JSON invalide : {e}')
+            continue
+        if not isinstance(row, dict):
+            yield number, ValueError('Chaque ligne doit être un objet JSON')
+            continue
+        yield number, row
+
+
+def iter_rows(stream, fmt):
+    if fmt == 'csv':
+        return iter_csv_rows(stream)
+    if fmt == 'ndjson':
+        return iter_ndjson_rows(stream)
+    raise ValueError(f"Format d'import inconnu : {fmt}")
+
+
+def guess_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def upsert_products(products, update_fields):
+    """Insère ou met à jour un lot de produits sur la clé (supplier, sku)."""
+    kwargs = {'update_conflicts': True, 'update_fields': [*update_fields, 'updated_at']}
+    # MySQL (ON DUPLICATE KEY UPDATE) ne permet pas de préciser la contrainte visée
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = ['supplier', 'sku']
+    Product.objects.bulk_create(products, **kwargs)
+
+
+def refresh_caches(keys):
+    """
+    `bulk_create` ne déclenche pas les signaux : on applique les mêmes
+    invalidations qu'une insertion unitaire (cache catalogue, index de recherche).
+    """
+    suppliers = {supplier for supplier, _ in keys}
+    skus = {sku for _, sku in keys}
+    products = [
+        p for p in Product.objects.filter(supplier__in=suppliers, sku__in=skus)
+        if (p.supplier, p.sku) in keys
+    ]
+
+    backend = get_search_backend()
+    for product in products:
+        backend.index_product(product)
+    catalogue_cache.invalidate_products()
+
+
+def import_products(rows, chunk_size=1000, max_errors=1000):
+    """
+    Importe des lignes `(numéro, dict)` par lots de `chunk_size`.
+
+    Chaque lot est validé puis écrit en un seul upsert ; les lignes invalides
+    sont rapportées (au plus `max_errors`) sans interrompre l'import. Seul le lot
+    courant est gardé en mémoire, quelle que soit la taille du fichier.
+    """
+    result = {'rows': 0, 'imported': 0, 'error_count': 0, 'errors': []}
+
+    def add_error(number, errors):
+        result['error_count'] += 1
+        if len(result['errors']) < max_errors:
+            result['errors'].append({'row': number, 'errors': errors})
+
+    # Un seul sérialiseur réutilisé pour toutes les lignes : construire ses champs
+    # à chaque ligne coûterait plus cher que la validation elle-même
+    serializer = ProductImportSerializer()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return result
+        result['rows'] += len(chunk)
+
+        # Dernière occurrence gagnante pour une même clé dans le lot
+        valid = {}
+        for number, row in chunk:
+            if isinstance(row, Exception):
+                add_error(number, {'non_field_errors': [str(row)]})
+                continue
+            try:
+                data = serializer.run_validation(row)
+            except ValidationError as e:
+                add_error(number, e.detail)
+                continue
+            valid[(data['supplier'], data['sku'])] = data
+
+        if not valid:
+            continue
+
+        # Une cellule absente ou vide garde la valeur existante (et non le défaut du
+        # modèle) : un upsert par ensemble de colonnes fournies
+        groups = {}
+        for data in valid.values():
+            fields = tuple(field for field in UPDATE_FIELDS if field in data)
+            groups.setdefault(fields, []).append(Product(**data))
+
+        with transaction.atomic():
+            for fields, products in groups.items():
+                upsert_products(products, fields)
+            transaction.on_commit(lambda keys=set(valid): refresh_caches(keys))
+        result['imported'] += len(valid)
@@ -0,0 +1,124 @@
+import copy
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import load_backend
+
+from ecommerce_api.dbpool import PooledDatabaseWrapperMixin
+
+
+# Backends Django -> équivalent avec pool de ce projet
+POOLED_ENGINES = {
+    'django.db.backends.mysql': 'ecommerce_api.backends.mysql',
+    'django.db.backends.sqlite3': 'ecommerce_api.backends.sqlite3',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la latence par requête du cycle connexion / requêtes / fermeture que Django "
+        "exécute pour chaque requête HTTP (CONN_MAX_AGE = 0), sans puis avec le pool de "
+        "connexions, sur la base --database (MySQL ou SQLite fichier)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--requests', type=int, default=2000, help='Requêtes simulées par thread')
+        parser.add_argument('--threads', type=int, default=1, help='Threads simultanés (workers)')
+        parser.add_argument('--queries', type=int, default=3, help='Requêtes SQL par requête HTTP')
+        parser.add_argument('--max-size', type=int, help='Taille du pool (défaut : --threads)')
+        parser.add_argument('--sql', default='SELECT 1')
+
+    def handle(self, *args, **options):
+        settings_dict = connections[options['database']].settings_dict
+        engine = POOLED_ENGINES.get(settings_dict['ENGINE'], settings_dict['ENGINE'])
+        backend = load_backend(engine)
+        if not issubclass(backend.DatabaseWrapper, PooledDatabaseWrapperMixin):
+            raise CommandError(f'Pas de backend avec pool pour {settings_dict["ENGINE"]}.')
+
+        results = {}
+        for mode in ('sans pool', 'avec pool'):
+            pool_options = None
+            if mode == 'avec pool':
+                pool_options = {'max_size': options['max_size'] or options['threads']}
+            results[mode] = self.run(backend, settings_dict, pool_options, options)
+
+        before, after = results['sans pool']['mean'], results['avec pool']['mean']
+        self.stdout.write(
+            f'Gain par requête : {(before - after) * 1000:.0f} µs en moyenne '
+            f'({(before - after) / before * 100:.0f} %)'
+        )
+
+    def make_wrapper(self, backend, settings_dict, pool_options, alias):
+        settings_dict = copy.deepcopy(settings_dict)
+        settings_dict['CONN_MAX_AGE'] = 0
+        options = settings_dict['OPTIONS']
+        options.pop('pool', None)
+        if pool_options:
+            options['pool'] = pool_options
+        wrapper = backend.DatabaseWrapper(settings_dict, alias)
+        if getattr(wrapper, 'is_in_memory_db', lambda: False)():
+            raise CommandError('Base SQLite en mémoire : jamais fermée par Django, rien à mesurer.')
+        return wrapper
+
+    def run(self, backend, settings_dict, pool_options, options):
+        alias = f'bench_pool_{"on" if pool_options else "off"}'
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            # Un wrapper par thread, comme `django.db.connections`
+            wrapper = self.make_wrapper(backend, settings_dict, pool_options, alias)
+            samples = []
+            try:
+                for _ in range(options['requests']):
+                    start = time.perf_counter()
+                    wrapper.ensure_connection()
+                    with wrapper.cursor() as cursor:
+                        for _ in range(options['queries']):
+                            cursor.execute(options['sql'])
+                            cursor.fetchall()
+                    # Fin de requête : close_old_connections()
+                    wrapper.close()
+                    samples.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(e)
+            with lock:
+                latencies.extend(samples)
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        wrapper = self.make_wrapper(backend, settings_dict, pool_options, alias)
+        pool = wrapper.pool
+        stats = pool.stats() if pool is not None else None
+        wrapper.close_pool()
+        if errors:
+            raise CommandError(f'{len(errors)} thread(s) en échec : {errors[0]}')
+
+        latencies.sort()
+        result = {
+            'mean': sum(latencies) / len(latencies) * 1000,
+            'p50': latencies[len(latencies) // 2] * 1000,
+            'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        }
+        self.stdout.write(
+            f'{"avec pool" if pool_options else "sans pool"} : {len(latencies)} requêtes, '
+            f'{len(latencies) / elapsed:.0f} requêtes/s, moyenne {result["mean"]:.3f} ms, '
+            f'p50 {result["p50"]:.3f} ms, p99 {result["p99"]:.3f} ms'
+        )
+        if stats:
+            self.stdout.write(
+                f'  pool : {stats["connections_opened"]} connexion(s) ouverte(s) pour {stats["checkouts"]} '
+                f'retrait(s), {stats["waits"]} attente(s) (moyenne {stats["wait_time_avg_ms"]} ms, '
+                f'max {stats["wait_time_max_ms"]} ms)'
+            )
+        return result
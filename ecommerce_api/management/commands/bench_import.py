@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ecommerce_api.importer import iter_rows, import_products
+from ecommerce_api.models import Product
+
+
+class Rollback(Exception):
+    pass
+
+
+def generate_csv(rows, suppliers=20):
+    yield b'sku,product_name,price,quantity,supplier,category\n'
+    for i in range(rows):
+        yield f'SKU-{i},Produit {i},{i % 100}.99,{i % 30},Fournisseur {i % suppliers},Catégorie {i % 12}\n'.encode()
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit de l'import en masse (lignes par seconde), insertion puis mise à jour"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Les données de test sont créées dans une transaction annulée à la fin
+        try:
+            with transaction.atomic():
+                for label in ('insertion', 'mise à jour'):
+                    start = time.perf_counter()
+                    result = import_products(
+                        iter_rows(generate_csv(options['rows']), 'csv'), chunk_size=options['chunk_size']
+                    )
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f"{label:<12}: {result['imported']} lignes en {elapsed:.2f} s "
+                        f"({result['imported'] / elapsed:,.0f} lignes/s)"
+                    )
+                self.stdout.write(f'{Product.objects.count()} produits en base')
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from ecommerce_api.models import Product
+from ecommerce_api.pagination import ProductPagination, KeysetPagination
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare la latence de la pagination OFFSET et par curseur à la page 1 et à une page profonde"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200000)
+        parser.add_argument('--page', type=int, default=10000)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Les données de test sont créées dans une transaction annulée à la fin
+        try:
+            with transaction.atomic():
+                self.seed(options['products'])
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        categories = ['Alimentation', 'Beauté', 'Électronique', 'Maison', 'Sport']
+        batch = []
+        for i in range(count):
+            batch.append(Product(
+                product_name=f'Produit {i}', price='9.99', quantity=10,
+                supplier=f'Fournisseur {i % 50}', category=categories[i % len(categories)],
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+
+    def time_it(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return samples[len(samples) // 2]
+
+    def run(self, options):
+        factory = RequestFactory()
+        size = options['page_size']
+        repeat = options['repeat']
+        queryset = Product.objects.all().order_by('id')
+
+        def offset_page(page):
+            request = Request(factory.get('/products', {'page': page, 'page_size': size}))
+            return lambda: ProductPagination().paginate_queryset(queryset, request)
+
+        def keyset_page(page):
+            cursor = ''
+            if page > 1:
+                last = queryset.values_list('id', flat=True)[(page - 1) * size - 1]
+                cursor = KeysetPagination().encode_cursor([last])
+            request = Request(factory.get('/products', {'cursor': cursor, 'page_size': size}))
+            return lambda: KeysetPagination(ordering=('id',)).paginate_queryset(queryset, request)
+
+        for label, build in (('offset', offset_page), ('keyset', keyset_page)):
+            for page in (1, options['page']):
+                median = self.time_it(build(page), repeat)
+                self.stdout.write(f'{label:<7} page {page:>6}: {median:8.2f} ms (médiane sur {repeat})')
@@ -0,0 +1,85 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from ecommerce_api.models import Product
+from ecommerce_api.search import InMemorySearchBackend
+
+
+class Rollback(Exception):
+    pass
+
+
+WORDS = [
+    'crème', 'savon', 'chaussure', 'ballon', 'téléphone', 'écouteurs', 'thé', 'café',
+    'bissap', 'mangue', 'pagne', 'boubou', 'sac', 'montre', 'lampe', 'chargeur',
+]
+CATEGORIES = ['Alimentation', 'Beauté', 'Électronique', 'Maison', 'Sport', 'Mode']
+QUERIES = ['creme', 'chaus', 'telephone ecou', 'sport', 'bis', 'mode pagne', 'lampe', 'xyz']
+
+
+class Command(BaseCommand):
+    help = "Mesure la latence par requête de l'index de recherche face au scan icontains"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Les données de test sont créées dans une transaction annulée à la fin
+        try:
+            with transaction.atomic():
+                self.seed(options['products'])
+                self.run(options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        rng = random.Random(42)
+        batch = []
+        for i in range(count):
+            batch.append(Product(
+                product_name=' '.join(rng.sample(WORDS, 2)) + f' {i}', price='9.99', quantity=10,
+                supplier=f'Fournisseur {i % 200}', category=rng.choice(CATEGORIES),
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+
+    def percentiles(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def run(self, repeat):
+        backend = InMemorySearchBackend()
+        start = time.perf_counter()
+        backend.search('warmup')
+        self.stdout.write(f'Construction de l\'index : {(time.perf_counter() - start) * 1000:.0f} ms')
+
+        for query in QUERIES:
+            def icontains():
+                return list(Product.objects.filter(
+                    Q(product_name__icontains=query) |
+                    Q(supplier__icontains=query) |
+                    Q(category__icontains=query)
+                ).values_list('id', flat=True))
+
+            def indexed():
+                return backend.search(query)
+
+            scan_p50, scan_p95 = self.percentiles(icontains, repeat)
+            index_p50, index_p95 = self.percentiles(indexed, repeat)
+            self.stdout.write(
+                f'{query!r:<18} icontains p50 {scan_p50:8.2f} ms p95 {scan_p95:8.2f} ms | '
+                f'index p50 {index_p50:8.2f} ms p95 {index_p95:8.2f} ms'
+            )
@@ -0,0 +1,221 @@
+import asyncio
+import io
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ecommerce_api.models import UserProfile
+
+
+USERNAME_PREFIX = 'bench-avatar-'
+
+
+class BenchServer(ThreadedWSGIServer):
+    # File d'attente d'écoute assez longue pour les connexions simultanées
+    request_queue_size = 4096
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def read_rss(pid):
+    """RSS courante du processus en octets (Linux), `None` si indisponible."""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid, interval=0.01):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.baseline = read_rss(pid)
+        self.peak = self.baseline
+        self._stopping = threading.Event()
+
+    def run(self):
+        while not self._stopping.is_set():
+            rss = read_rss(self.pid)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stopping.set()
+        self.join()
+
+
+def format_size(size):
+    return 'inconnue' if size is None else f'{size / 1024 / 1024:.1f} Mio'
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le débit et la mémoire (RSS) du serveur pendant des requêtes concurrentes "
+        "sur get_user_image. Sans --url, démarre un serveur WSGI multi-thread dans ce "
+        "processus ; avec --url, vise un serveur déjà démarré (--pid pour suivre sa RSS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=50, help='Utilisateurs avec photo créés pour le test')
+        parser.add_argument('--image-size', type=int, default=1600, help='Côté des photos générées, en pixels')
+        parser.add_argument('--mode', choices=['stream', 'x-accel-redirect', 'x-sendfile'], default='stream',
+                            help='MEDIA_SENDFILE_MODE du serveur intégré')
+        parser.add_argument('--url', help='Ex. http://127.0.0.1:8000/users/getImage')
+        parser.add_argument('--pid', type=int, help='Processus serveur dont suivre la RSS (mode --url)')
+
+    def handle(self, *args, **options):
+        # Une connexion = un descripteur de fichier
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+        if options['url']:
+            # Le serveur visé lit les mêmes base et MEDIA_ROOT que cette commande
+            user_ids = self.seed(options)
+            try:
+                self.run(options['url'], user_ids, options, options['pid'])
+            finally:
+                self.cleanup()
+            return
+
+        media_root = tempfile.mkdtemp()
+        mode = None if options['mode'] == 'stream' else options['mode']
+        try:
+            with override_settings(MEDIA_ROOT=media_root, MEDIA_SENDFILE_MODE=mode):
+                user_ids = self.seed(options)
+                server = BenchServer(('127.0.0.1', 0), QuietRequestHandler, ipv6=False)
+                server.set_app(WSGIHandler())
+                thread = threading.Thread(target=server.serve_forever, daemon=True)
+                thread.start()
+                try:
+                    host, port = server.server_address
+                    self.run(f'http://{host}:{port}{reverse("get_user_image")}', user_ids, options, os.getpid())
+                finally:
+                    server.shutdown()
+                    server.server_close()
+                    self.cleanup()
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def seed(self, options):
+        self.cleanup()
+        size = options['image_size']
+        buffer = io.BytesIO()
+        # Bruit : une taille de fichier réaliste pour une photo (pas d'aplats très compressibles)
+        Image.effect_noise((size, size), 64).convert('RGB').save(buffer, 'JPEG', quality=90)
+        data = buffer.getvalue()
+
+        user_ids = []
+        # Pas de déclinaisons : on mesure l'envoi de l'original
+        with override_settings(IMAGE_PROCESSING_MODE='sync', IMAGE_DERIVATIVE_WIDTHS=[]):
+            for i in range(options['users']):
+                user = User.objects.create_user(username=f'{USERNAME_PREFIX}{i}', password=None)
+                profile = UserProfile(user=user)
+                profile.photo.save(f'{USERNAME_PREFIX}{i}.jpg', ContentFile(data))
+                user_ids.append(user.id)
+        self.stdout.write(f'{len(user_ids)} photo(s) de {len(data) / 1024:.0f} Kio créée(s)')
+        return user_ids
+
+    def cleanup(self):
+        for profile in UserProfile.objects.filter(user__username__startswith=USERNAME_PREFIX):
+            if profile.photo:
+                profile.photo.delete(save=False)
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def run(self, url, user_ids, options, pid):
+        sampler = RssSampler(pid) if pid else None
+        if sampler:
+            sampler.start()
+        start = time.perf_counter()
+        stats, latencies = asyncio.run(self.load(url, user_ids, options))
+        elapsed = time.perf_counter() - start
+        if sampler:
+            sampler.stop()
+
+        self.stdout.write(
+            f"{stats['ok']} réponse(s) 200, {stats['failed']} échec(s), "
+            f"{options['concurrency']} connexion(s) simultanée(s), en {elapsed:.2f} s"
+        )
+        self.stdout.write(
+            f"Débit : {stats['ok'] / elapsed:.0f} requêtes/s, {stats['bytes'] / elapsed / 1024 / 1024:.1f} Mio/s"
+        )
+        self.report_latency(latencies)
+        for error, count in sorted(self.errors.items()):
+            self.stdout.write(f'  échec {error} : {count}')
+        if sampler:
+            growth = None if sampler.peak is None else sampler.peak - sampler.baseline
+            self.stdout.write(
+                f'RSS du serveur : {format_size(sampler.baseline)} avant, pic {format_size(sampler.peak)} '
+                f'(+{format_size(growth)})'
+            )
+
+    async def load(self, url, user_ids, options):
+        url = urlsplit(url)
+        host, port = url.hostname, url.port or 80
+        stats = {'ok': 0, 'failed': 0, 'bytes': 0}
+        latencies = []
+        errors = self.errors = {}
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def fetch(user_id):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    reader, writer = await asyncio.open_connection(host, port, limit=16 * 1024)
+                    writer.write(
+                        f'GET {url.path}?id={user_id} HTTP/1.1\r\nHost: {host}\r\n'
+                        f'Connection: close\r\n\r\n'.encode('ascii')
+                    )
+                    await writer.drain()
+                    status_line = await reader.readline()
+                    # Corps lu par blocs et jeté : la mémoire du client reste négligeable
+                    received = len(status_line)
+                    while chunk := await reader.read(16 * 1024):
+                        received += len(chunk)
+                    writer.close()
+                except OSError as e:
+                    stats['failed'] += 1
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    return
+                if b' 200 ' in status_line:
+                    stats['ok'] += 1
+                    stats['bytes'] += received
+                    latencies.append((time.perf_counter() - start) * 1000)
+                else:
+                    stats['failed'] += 1
+                    errors[status_line.decode('latin-1').strip()] = errors.get(status_line.decode('latin-1').strip(), 0) + 1
+
+        await asyncio.gather(*(fetch(user_ids[i % len(user_ids)]) for i in range(options['requests'])))
+        return stats, latencies
+
+    def report_latency(self, samples):
+        if not samples:
+            self.stdout.write('  aucune mesure')
+            return
+        samples.sort()
+        p50 = samples[len(samples) // 2]
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        self.stdout.write(f'  p50 {p50:.1f} ms, p99 {p99:.1f} ms, max {samples[-1]:.1f} ms')
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ecommerce_api.models import Favorite, Cart, History, Review, Shipping, Order, OrderItem
+
+
+# (modèle, relation virtuelle, action ON DELETE)
+RELATIONS = [
+    (Favorite, 'user', 'CASCADE'),
+    (Favorite, 'product', 'CASCADE'),
+    (Cart, 'user', 'CASCADE'),
+    (Cart, 'product', 'CASCADE'),
+    (History, 'user', 'CASCADE'),
+    (History, 'product', 'CASCADE'),
+    (Review, 'user', 'CASCADE'),
+    (Review, 'product', 'CASCADE'),
+    (Shipping, 'user', 'CASCADE'),
+    (Order, 'user', 'CASCADE'),
+    # Une commande reste consultable même si le produit disparaît du catalogue
+    (OrderItem, 'product', None),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Passe des colonnes entières userId/productId à de vraies clés étrangères en base : "
+        "rapporte les lignes orphelines, les supprime (--delete-orphans) puis ajoute les "
+        "contraintes (--apply, MySQL uniquement)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-orphans', action='store_true')
+        parser.add_argument('--apply', action='store_true')
+
+    def handle(self, *args, **options):
+        orphans_left = 0
+        for model, relation, _ in RELATIONS:
+            orphans = model.objects.filter(**{f'{relation}__isnull': True})
+            count = orphans.count()
+            if count and options['delete_orphans']:
+                orphans.delete()
+                self.stdout.write(f'{model.__name__}.{relation} : {count} ligne(s) orpheline(s) supprimée(s)')
+                count = 0
+            elif count:
+                self.stdout.write(f'{model.__name__}.{relation} : {count} ligne(s) orpheline(s)')
+            orphans_left += count
+
+        if not options['apply']:
+            return
+        if connection.vendor != 'mysql':
+            raise CommandError("L'ajout des contraintes n'est pris en charge que sur MySQL.")
+        if orphans_left:
+            raise CommandError('Des lignes orphelines subsistent : relancez avec --delete-orphans.')
+
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for model, relation, on_delete in RELATIONS:
+                if on_delete is None:
+                    continue
+                field = model._meta.get_field(relation)
+                table = model._meta.db_table
+                column = field.local_related_fields[0].column
+                target = field.related_model._meta.db_table
+                target_column = field.foreign_related_fields[0].column
+                name = f'{table}_{column}_fk'[:64]
+
+                existing = connection.introspection.get_constraints(cursor, table)
+                if name in existing:
+                    continue
+
+                cursor.execute(
+                    f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} '
+                    f'FOREIGN KEY ({quote(column)}) REFERENCES {quote(target)} ({quote(target_column)}) ON DELETE {on_delete}'
+                )
+                self.stdout.write(f'Contrainte {name} ajoutée')
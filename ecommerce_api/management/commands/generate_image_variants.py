@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce_api.images import TARGETS, is_current, process_image
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère les déclinaisons redimensionnées (WebP/JPEG) des posters et photos de profil "
+        "existants qui n'en ont pas encore, ou dont l'image a changé depuis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(TARGETS), action='append', dest='kinds',
+                            help='Limiter à ce type d\'image (répétable)')
+        parser.add_argument('--force', action='store_true', help='Régénérer aussi les déclinaisons à jour')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        for kind in options['kinds'] or sorted(TARGETS):
+            model, field, variants_field = TARGETS[kind]
+            rows = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''}).order_by('pk')
+
+            processed = failed = 0
+            last_pk = 0
+            while True:
+                chunk = list(rows.filter(pk__gt=last_pk).values_list('pk', field, variants_field)[:options['chunk_size']])
+                if not chunk:
+                    break
+                last_pk = chunk[-1][0]
+                for pk, source, variants in chunk:
+                    if is_current(variants, source):
+                        if not options['force']:
+                            continue
+                        # Marquées périmées pour forcer la régénération
+                        model.objects.filter(pk=pk).update(**{variants_field: None})
+                    try:
+                        process_image(kind, pk)
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f'{kind} {pk} ({source}) : {e}')
+                        continue
+                    processed += 1
+
+            self.stdout.write(f'{kind} : {processed} image(s) traitée(s), {failed} échec(s)')
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce_api.importer import IMPORT_FORMATS, guess_format, iter_rows, import_products
+
+
+class Command(BaseCommand):
+    help = "Importe un catalogue fournisseur CSV ou NDJSON (upsert par fournisseur + SKU)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier à importer, ou '-' pour l'entrée standard")
+        parser.add_argument('--format', choices=IMPORT_FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        try:
+            result = import_products(iter_rows(stream, fmt), chunk_size=options['chunk_size'])
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        for error in result['errors']:
+            self.stderr.write(f"Ligne {error['row']} : {error['errors']}")
+        self.stdout.write(
+            f"{result['rows']} ligne(s) lue(s), {result['imported']} produit(s) importé(s), "
+            f"{result['error_count']} erreur(s)"
+        )
@@ -0,0 +1,269 @@
+import asyncio
+import random
+import resource
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlencode, urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from ecommerce_api.events import LocalBroker, get_broker, publish_new_notifications, user_channel
+from ecommerce_api.models import Notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Simule de nombreux abonnés au flux de notifications. Par défaut, ouvre les flux "
+        "en processus à travers l'application ASGI (middlewares, vue, lectures en base) et "
+        "mesure threads et mémoire par connexion inactive, puis la latence de diffusion "
+        "(crée puis supprime --publishes notifications) ; --broker-only mesure le hub seul ; "
+        "--url ouvre de vraies connexions SSE sur un serveur ASGI démarré."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=5000, help='Abonnés répartis sur N utilisateurs')
+        parser.add_argument('--publishes', type=int, default=2000, help='Signaux publiés (modes processus)')
+        parser.add_argument('--broker-only', action='store_true', help='Abonnés directs au LocalBroker, sans requête')
+        parser.add_argument('--url', help='Ex. http://127.0.0.1:8000/api/notifications/stream')
+        parser.add_argument('--duration', type=float, default=30.0, help='Durée en secondes (mode --url)')
+
+    def handle(self, *args, **options):
+        # Une connexion = un descripteur de fichier
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+        if options['url']:
+            asyncio.run(self.run_http(options))
+        elif options['broker_only']:
+            asyncio.run(self.run_in_process(options))
+        else:
+            user_ids = list(User.objects.order_by('id').values_list('id', flat=True)[:options['users']])
+            if not user_ids:
+                raise CommandError('Aucun utilisateur en base : les flux seraient refusés (403).')
+            asyncio.run(self.run_asgi(user_ids, options))
+
+    async def run_asgi(self, user_ids, options):
+        application = get_asgi_application()
+        path = reverse('notification-stream')
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+        connections = options['connections']
+        stats = {'connected': 0, 'failed': 0}
+        sent_at = {}
+        received = []
+        disconnect = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        async def stream(user_id, ready):
+            request_sent = False
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    if message['status'] != 200 and not ready.done():
+                        stats['failed'] += 1
+                        ready.set_result(None)
+                elif message['type'] == 'http.response.body':
+                    body = message.get('body', b'')
+                    if body.startswith(b'retry: ') and not ready.done():
+                        stats['connected'] += 1
+                        ready.set_result(None)
+                    elif body.startswith(b'id: '):
+                        received.append((int(body[4:body.index(b'\n')]), time.perf_counter()))
+
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+                'query_string': urlencode({'userId': user_id}).encode(),
+                'headers': [(b'host', host.encode()), (b'accept', b'text/event-stream')],
+                'client': ('127.0.0.1', 0), 'server': (host, 80),
+            }
+            try:
+                await application(scope, receive, send)
+            finally:
+                if not ready.done():
+                    stats['failed'] += 1
+                    ready.set_result(None)
+
+        threads_before = threading.active_count()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        tasks, waiters = [], []
+        streams_per_user = dict.fromkeys(user_ids, 0)
+        for i in range(connections):
+            user_id = user_ids[i % len(user_ids)]
+            streams_per_user[user_id] += 1
+            ready = loop.create_future()
+            tasks.append(asyncio.create_task(stream(user_id, ready)))
+            waiters.append(ready)
+        await asyncio.gather(*waiters)
+        # Laisser les flux passer au premier rattrapage puis à l'attente
+        await asyncio.sleep(0.5)
+        connect_time = time.perf_counter() - start
+        per_connection = (tracemalloc.get_traced_memory()[0] - baseline) / max(stats['connected'], 1)
+        tracemalloc.stop()
+        threads_idle = threading.active_count()
+
+        rng = random.Random(42)
+        create = sync_to_async(Notification.objects.create)
+        # Le rattrapage des flux renvoie aussi les notifications existantes : seules les nouvelles comptent
+        first_id = (await Notification.objects.order_by('-id').values_list('id', flat=True).afirst() or 0) + 1
+        created = []
+        expected = 0
+        for _ in range(options['publishes']):
+            user_id = rng.choice(user_ids)
+            # Un flux déjà en train de lire peut voir la ligne avant la publication
+            sent = time.perf_counter()
+            notification = await create(user_id=user_id, title='Test de charge', message='Test de charge')
+            created.append(notification.id)
+            sent_at[notification.id] = sent
+            publish_new_notifications({user_id: notification.id})
+            expected += streams_per_user[user_id]
+            await asyncio.sleep(0)
+        # Chaque flux de l'utilisateur reçoit la notification
+        deadline = time.perf_counter() + 30
+        while sum(notification_id >= first_id for notification_id, _ in received) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+
+        disconnect.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await sync_to_async(lambda: Notification.objects.filter(id__in=created).delete())()
+        latencies = [
+            (received_at - sent_at[notification_id]) * 1000
+            for notification_id, received_at in received if notification_id in sent_at
+        ]
+        received = [notification_id for notification_id, _ in received if notification_id >= first_id]
+
+        self.stdout.write(
+            f"{stats['connected']} flux ouverts via ASGI ({stats['failed']} échecs) "
+            f"sur {len(user_ids)} utilisateurs en {connect_time:.2f} s"
+        )
+        self.stdout.write(f'Threads du processus : {threads_before} avant, {threads_idle} avec les flux inactifs')
+        self.stdout.write(f'Mémoire par flux inactif : {per_connection / 1024:.2f} Kio')
+        self.stdout.write(f'{len(received)} réceptions sur {expected} attendues pour {options["publishes"]} notifications créées')
+        self.report_latency(latencies)
+        self.stdout.write(f'Abonnements restants : {get_broker().subscriber_count()}')
+
+    async def run_in_process(self, options):
+        broker = LocalBroker()
+        rng = random.Random(42)
+        connections, users = options['connections'], options['users']
+        latencies = []
+        received = 0
+
+        async def subscriber(user_id, ready):
+            nonlocal received
+            subscription = broker.subscribe(user_channel(user_id))
+            ready.set_result(None)
+            try:
+                while True:
+                    message = await subscription.get()
+                    latencies.append((time.perf_counter() - message['sent']) * 1000)
+                    received += 1
+            finally:
+                subscription.close()
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        tasks, waiters = [], []
+        loop = asyncio.get_running_loop()
+        for i in range(connections):
+            ready = loop.create_future()
+            tasks.append(asyncio.create_task(subscriber(i % users + 1, ready)))
+            waiters.append(ready)
+        await asyncio.gather(*waiters)
+        connect_time = time.perf_counter() - start
+        per_connection = (tracemalloc.get_traced_memory()[0] - baseline) / connections
+        tracemalloc.stop()
+
+        for _ in range(options['publishes']):
+            broker.publish(user_channel(rng.randint(1, users)), {'sent': time.perf_counter()})
+            # Laisser la boucle livrer, comme des publications espacées
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.1)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.stdout.write(f'{connections} abonnés sur {users} utilisateurs ouverts en {connect_time:.2f} s')
+        self.stdout.write(f'Mémoire par abonné inactif : {per_connection / 1024:.2f} Kio')
+        self.stdout.write(f'{received} messages livrés pour {options["publishes"]} publications')
+        self.report_latency(latencies)
+        self.stdout.write(f'Abonnements restants : {broker.subscriber_count()}')
+
+    async def run_http(self, options):
+        url = urlsplit(options['url'])
+        host, port = url.hostname, url.port or 80
+        stats = {'connected': 0, 'failed': 0, 'events': 0, 'pings': 0}
+        connect_latencies = []
+
+        async def client(user_id):
+            start = time.perf_counter()
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+                writer.write(
+                    f'GET {url.path}?userId={user_id} HTTP/1.1\r\nHost: {host}\r\n'
+                    f'Accept: text/event-stream\r\n\r\n'.encode('ascii')
+                )
+                await writer.drain()
+                status_line = await reader.readline()
+                if b' 200 ' not in status_line:
+                    stats['failed'] += 1
+                    writer.close()
+                    return
+            except OSError:
+                stats['failed'] += 1
+                return
+
+            stats['connected'] += 1
+            connect_latencies.append((time.perf_counter() - start) * 1000)
+            try:
+                # Les tailles de blocs (chunked) sont ignorées : seules les lignes SSE comptent
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    if line.startswith(b'id: '):
+                        stats['events'] += 1
+                    elif line.startswith(b': ping'):
+                        stats['pings'] += 1
+            finally:
+                writer.close()
+
+        tasks = [asyncio.create_task(client(i % options['users'] + 1)) for i in range(options['connections'])]
+        await asyncio.sleep(options['duration'])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.stdout.write(
+            f"{stats['connected']} connexions ouvertes, {stats['failed']} échecs, "
+            f"{stats['events']} notifications et {stats['pings']} heartbeats reçus en {options['duration']:.0f} s"
+        )
+        self.stdout.write('Établissement des connexions :')
+        self.report_latency(connect_latencies)
+
+    def report_latency(self, samples):
+        if not samples:
+            self.stdout.write('  aucune mesure')
+            return
+        samples.sort()
+        p50 = samples[len(samples) // 2]
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        self.stdout.write(f'  p50 {p50:.3f} ms, p99 {p99:.3f} ms, max {samples[-1]:.3f} ms')
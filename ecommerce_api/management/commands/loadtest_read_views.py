@@ -0,0 +1,165 @@
+import asyncio
+import resource
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+DEFAULT_PATHS = [
+    '/products?page=1&userId={user}',
+    '/products/search?q=produit&page=1&userId={user}',
+    '/favorites?userId={user}',
+    '/carts?userId={user}',
+    '/notifications?userId={user}',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le débit (requêtes/s) et la latence p99 des lectures les plus sollicitées "
+        "entre plusieurs déploiements, avec N connexions keep-alive simultanées. Exemple : "
+        "gunicorn ecommerce_project.wsgi -w 4 -b :8000, puis uvicorn ecommerce_project.asgi:application "
+        "--workers 4 --port 8001 avec ASYNC_READ_VIEWS = True, et "
+        "--target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', dest='targets', required=True,
+                            help='nom=URL de base du serveur (répétable)')
+        parser.add_argument('--connections', type=int, default=500)
+        parser.add_argument('--duration', type=float, default=30.0, help='Durée de mesure par cible, en secondes')
+        parser.add_argument('--warmup', type=float, default=5.0, help='Chauffe avant la mesure, en secondes')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Chemin interrogé, {user} remplacé par un id (répétable)')
+        parser.add_argument('--users', type=int, default=100, help='Ids utilisateur 1..N répartis sur les connexions')
+
+    def handle(self, *args, **options):
+        # Une connexion = un descripteur de fichier
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+        targets = []
+        for target in options['targets']:
+            name, sep, url = target.partition('=')
+            if not sep or not url.startswith('http://'):
+                raise CommandError(f'Cible invalide : {target} (attendu nom=http://hôte:port)')
+            targets.append((name, url))
+
+        results = []
+        for name, url in targets:
+            self.stdout.write(f'{name} : {options["connections"]} connexions sur {url} ...')
+            result = asyncio.run(self.run_target(url, options))
+            results.append((name, result))
+            self.report(name, result)
+
+        if len(results) > 1:
+            base_name, base = results[0]
+            for name, result in results[1:]:
+                if base['rps'] and base['p99'] and result['p99']:
+                    self.stdout.write(
+                        f'{name} / {base_name} : débit x{result["rps"] / base["rps"]:.2f}, '
+                        f'p99 x{result["p99"] / base["p99"]:.2f}'
+                    )
+
+    async def run_target(self, url, options):
+        url = urlsplit(url)
+        host, port, prefix = url.hostname, url.port or 80, url.path.rstrip('/')
+        paths = [prefix + path for path in (options['paths'] or DEFAULT_PATHS)]
+        stats = {'ok': 0, 'errors': 0, 'statuses': {}}
+        latencies = []
+        measuring = False
+
+        async def worker(index):
+            user = index % options['users'] + 1
+            reader = writer = None
+            i = index
+            while True:
+                path = paths[i % len(paths)].format(user=user)
+                i += 1
+                start = time.perf_counter()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(host, port)
+                    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode('ascii'))
+                    await writer.drain()
+                    status, keep_alive = await read_response(reader)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    if measuring:
+                        stats['errors'] += 1
+                    if writer is not None:
+                        writer.close()
+                    reader = writer = None
+                    await asyncio.sleep(0.01)
+                    continue
+                if not keep_alive:
+                    writer.close()
+                    reader = writer = None
+                if not measuring:
+                    continue
+                stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+                if status < 400:
+                    stats['ok'] += 1
+                    latencies.append((time.perf_counter() - start) * 1000)
+                else:
+                    stats['errors'] += 1
+
+        tasks = [asyncio.create_task(worker(i)) for i in range(options['connections'])]
+        await asyncio.sleep(options['warmup'])
+        measuring = True
+        await asyncio.sleep(options['duration'])
+        measuring = False
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        latencies.sort()
+        return {
+            'ok': stats['ok'],
+            'errors': stats['errors'],
+            'statuses': stats['statuses'],
+            'rps': stats['ok'] / options['duration'],
+            'p50': latencies[len(latencies) // 2] if latencies else None,
+            'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else None,
+        }
+
+    def report(self, name, result):
+        statuses = ', '.join(f'{code}: {count}' for code, count in sorted(result['statuses'].items()))
+        self.stdout.write(f'  {result["ok"]} réponses, {result["errors"]} erreurs ({statuses})')
+        if result['p99'] is None:
+            self.stdout.write('  aucune mesure')
+            return
+        self.stdout.write(
+            f'  {result["rps"]:.0f} requêtes/s, p50 {result["p50"]:.1f} ms, p99 {result["p99"]:.1f} ms'
+        )
+
+
+async def read_response(reader):
+    """Lit une réponse HTTP/1.1 complète ; renvoie `(statut, connexion réutilisable)`."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError('connexion fermée par le serveur')
+    version, status = status_line.split()[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip().lower()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif int(status) not in (204, 304):
+        # Ni longueur ni découpage : le corps s'arrête à la fermeture
+        await reader.read()
+        return int(status), False
+
+    keep_alive = headers.get('connection') != 'close' and version == b'HTTP/1.1'
+    return int(status), keep_alive
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce_api.notifications import drain_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Traite immédiatement les événements en attente dans l'outbox des notifications. "
+        "À planifier (cron) avec NOTIFICATION_WORKERS = 0, sans workers dans les processus serveur."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        processed = drain_outbox(options['batch_size'])
+        self.stdout.write(f'{processed} événement(s) traité(s)')
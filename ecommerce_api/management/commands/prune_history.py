@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ecommerce_api.history import trim_history
+from ecommerce_api.models import History
+
+
+class Command(BaseCommand):
+    help = (
+        "Applique la politique de rétention de l'historique aux données existantes : "
+        "plafond par utilisateur et âge maximal, par lots."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-per-user', type=int, default=None,
+                            help='Par défaut HISTORY_MAX_ENTRIES_PER_USER (0 = sans limite)')
+        parser.add_argument('--days', type=int, default=None,
+                            help='Par défaut HISTORY_RETENTION_DAYS (aucune limite si absent)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        days = options['days'] if options['days'] is not None else getattr(settings, 'HISTORY_RETENTION_DAYS', None)
+        expired = 0
+        if days:
+            cutoff = timezone.now() - timedelta(days=days)
+            # Suppressions par lots d'ids : pas de long verrou sur la table
+            while True:
+                ids = list(History.objects.filter(viewed_at__lt=cutoff).values_list('id', flat=True)[:chunk_size])
+                if not ids:
+                    break
+                expired += History.objects.filter(id__in=ids).delete()[0]
+            self.stdout.write(f'{expired} consultation(s) de plus de {days} jour(s) supprimée(s)')
+
+        limit = options['max_per_user']
+        if limit is None:
+            limit = getattr(settings, 'HISTORY_MAX_ENTRIES_PER_USER', 200)
+        if not limit:
+            return
+
+        trimmed = 0
+        last_user_id = None
+        users = History.objects.order_by('userId').values_list('userId', flat=True).distinct()
+        while True:
+            chunk = users if last_user_id is None else users.filter(userId__gt=last_user_id)
+            user_ids = list(chunk[:chunk_size])
+            if not user_ids:
+                break
+            last_user_id = user_ids[-1]
+            trimmed += trim_history(user_ids, limit)
+        self.stdout.write(f'{trimmed} consultation(s) au-delà de {limit} par utilisateur supprimée(s)')
@@ -0,0 +1,64 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from ecommerce_api.models import History
+
+
+class Command(BaseCommand):
+    help = (
+        "Purge l'historique de consultation par plages de clé primaire bornées, avec une pause "
+        "entre les lots : chaque DELETE reste court, sans bloquer les écritures concurrentes "
+        "ni retarder la réplication."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Limiter à cet utilisateur (répétable)')
+        parser.add_argument('--before', help='Consultations antérieures à cette date (AAAA-MM-JJ ou ISO 8601)')
+        parser.add_argument('--all', action='store_true', help="Purger tout l'historique (sans filtre)")
+        parser.add_argument('--batch-size', type=int, default=5000, help='Largeur de chaque plage d\'ids')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Pause entre deux lots, en secondes')
+
+    def handle(self, *args, **options):
+        queryset = History.objects.all()
+        if options['users']:
+            queryset = queryset.filter(userId__in=options['users'])
+        if options['before']:
+            queryset = queryset.filter(viewed_at__lt=self.parse_before(options['before']))
+        if not (options['users'] or options['before'] or options['all']):
+            raise CommandError('Précisez --user, --before ou --all.')
+
+        # Avec --user, plage d'ids des seules lignes visées (index userId) plutôt que de toute la table
+        bounds = (queryset if options['users'] else History.objects).aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write('Historique vide')
+            return
+
+        deleted = batches = 0
+        start = bounds['low']
+        while start <= bounds['high']:
+            end = start + options['batch_size']
+            # Plage d'ids fixe : chaque DELETE ne parcourt qu'une portion bornée de la clé primaire
+            batch_deleted, _ = queryset.filter(id__gte=start, id__lt=end).delete()
+            deleted += batch_deleted
+            batches += 1
+            start = end
+            if options['sleep'] and start <= bounds['high']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(f'{deleted} consultation(s) supprimée(s) en {batches} lot(s)')
+
+    def parse_before(self, value):
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f'Date invalide : {value}')
+            moment = datetime(day.year, day.month, day.day)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
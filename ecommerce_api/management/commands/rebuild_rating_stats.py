@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce_api.cache import catalogue_cache
+from ecommerce_api.models import Product
+from ecommerce_api.ratings import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats d'avis (product_rating_stats) depuis la table des avis, par lots de produits"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', dest='products', help='Limiter à ce produit (répétable)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        products = Product.objects.order_by('id')
+        if options['products']:
+            products = products.filter(id__in=options['products'])
+
+        checked = rated = 0
+        last_id = 0
+        while True:
+            product_ids = list(products.filter(id__gt=last_id).values_list('id', flat=True)[:options['chunk_size']])
+            if not product_ids:
+                break
+            last_id = product_ids[-1]
+            checked += len(product_ids)
+            rated += rebuild_rating_stats(product_ids)
+
+        catalogue_cache.invalidate_ratings()
+        self.stdout.write(f'{checked} produit(s) recalculé(s), dont {rated} avec des avis')
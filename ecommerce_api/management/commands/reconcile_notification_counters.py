@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from ecommerce_api.models import Notification, NotificationCounter
+from ecommerce_api.notifications import recount_notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare les compteurs de notifications (notification_counters) aux notifications "
+        "réelles et corrige les écarts, par lots d'utilisateurs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Limiter à cet utilisateur (répétable)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Rapporter les écarts sans les corriger')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['users']:
+            users = users.filter(id__in=options['users'])
+
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            user_ids = list(users.filter(id__gt=last_id).values_list('id', flat=True)[:options['chunk_size']])
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+            checked += len(user_ids)
+
+            truth = {
+                row['user_id']: (row['total'], row['unread'], row['latest_id'])
+                for row in Notification.objects.filter(user_id__in=user_ids).order_by()
+                .values('user_id')
+                .annotate(total=Count('id'), unread=Count('id', filter=Q(is_read=False)), latest_id=Max('id'))
+            }
+            counters = {
+                row['user_id']: (row['total'], row['unread'], row['latest_id'])
+                for row in NotificationCounter.objects.filter(user_id__in=user_ids)
+                .values('user_id', 'total', 'unread', 'latest_id')
+            }
+
+            for user_id in user_ids:
+                expected = truth.get(user_id, (0, 0, None))
+                # Pas de compteur et rien à compter : il sera créé à la première lecture
+                current = counters.get(user_id, None if user_id in truth else expected)
+                if current is not None and current[:2] == expected[:2] and (current[2] or 0) >= (expected[2] or 0):
+                    continue
+
+                self.stdout.write(f'Utilisateur {user_id} : compteur {current}, attendu {expected}')
+                if options['dry_run']:
+                    continue
+                with transaction.atomic():
+                    # Verrou sur la ligne du compteur : le recomptage ne peut pas croiser une mise à jour
+                    NotificationCounter.objects.select_for_update().filter(user_id=user_id).first()
+                    recount_notifications(user_id)
+                fixed += 1
+
+        self.stdout.write(f'{checked} utilisateur(s) vérifié(s), {fixed} compteur(s) corrigé(s)')
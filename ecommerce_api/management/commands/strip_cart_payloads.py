@@ -0,0 +1,98 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from ecommerce_api.carts import cart_extra
+from ecommerce_api.models import Cart
+
+
+def table_size(table):
+    """Taille occupée par une table (données + index) en octets, `None` si inconnue."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            # Les statistiques InnoDB ne sont rafraîchies qu'après ANALYZE TABLE
+            cursor.execute(f'ANALYZE TABLE {connection.ops.quote_name(table)}')
+            cursor.fetchall()
+            cursor.execute(
+                'SELECT data_length + index_length FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s', [table]
+            )
+        elif connection.vendor == 'sqlite':
+            try:
+                # Octets réellement utilisés dans les pages de la table et de ses index
+                cursor.execute(
+                    'SELECT SUM(pgsize - unused) FROM dbstat WHERE name = %s OR name IN '
+                    '(SELECT name FROM sqlite_master WHERE type = %s AND tbl_name = %s)', [table, 'index', table]
+                )
+            except Exception:
+                return None
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def format_size(size):
+    return 'inconnue' if size is None else f'{size / 1024 / 1024:.2f} Mio'
+
+
+class Command(BaseCommand):
+    help = (
+        "Vide par lots la copie JSON Cart.cart des lignes existantes, après en avoir extrait "
+        "les champs utiles dans Cart.extra, et affiche la taille de la table avant/après."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Compter les lignes concernées sans rien modifier')
+        parser.add_argument(
+            '--optimize', action='store_true',
+            help="Reconstruire la table à la fin (OPTIMIZE TABLE / VACUUM) pour rendre l'espace libéré"
+        )
+
+    def handle(self, *args, **options):
+        table = Cart._meta.db_table
+        rows = Cart.objects.filter(cart__isnull=False)
+        if options['dry_run']:
+            self.stdout.write(f'{rows.count()} ligne(s) avec une copie JSON, table {format_size(table_size(table))}')
+            return
+
+        before = table_size(table)
+        stripped = 0
+        last_id = 0
+        while True:
+            chunk = list(rows.filter(id__gt=last_id).order_by('id').only('id', 'cart', 'extra')[:options['chunk_size']])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            with_extra = []
+            for cart in chunk:
+                if cart.extra is None:
+                    try:
+                        cart.extra = cart_extra(json.loads(cart.cart))
+                    except ValueError:
+                        pass
+                    if cart.extra is not None:
+                        with_extra.append(cart)
+
+            # Une transaction courte par lot : pas de verrou long sur la table. Le cas
+            # courant (rien à garder) est un seul UPDATE ... WHERE id IN (...)
+            with transaction.atomic():
+                if with_extra:
+                    Cart.objects.bulk_update(with_extra, ['extra'])
+                Cart.objects.filter(id__in=[cart.id for cart in chunk]).update(cart=None)
+            stripped += len(chunk)
+
+        if options['optimize']:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'mysql':
+                    cursor.execute(f'OPTIMIZE TABLE {connection.ops.quote_name(table)}')
+                    cursor.fetchall()
+                elif connection.vendor == 'sqlite':
+                    cursor.execute('VACUUM')
+
+        after = table_size(table)
+        self.stdout.write(f'{stripped} ligne(s) allégée(s)')
+        self.stdout.write(f'Taille de {table} : {format_size(before)} avant, {format_size(after)} après')
@@ -0,0 +1,151 @@
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def stat_file(storage, name):
+    """`(chemin local ou None, taille, date de modification en secondes)` sans ouvrir le fichier."""
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        # Stockage distant : pas de chemin local, donc pas de sendfile
+        return None, storage.size(name), storage.get_modified_time(name).timestamp()
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime
+
+
+def file_etag(name, size, mtime):
+    digest = hashlib.md5(f'{name}:{size}:{mtime}'.encode('utf-8')).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def parse_range(header, size):
+    """
+    Plage `bytes=début-fin` demandée : `(début, fin incluse)`, `None` pour
+    renvoyer tout le fichier (pas de plage, plages multiples ou syntaxe
+    inconnue, ignorées comme le permet la RFC 9110), ou `False` si la plage
+    est hors du fichier (416).
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffixe : les N derniers octets
+        length = int(last)
+        return (max(size - length, 0), size - 1) if length and size else False
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def range_matches(request, etag, mtime):
+    """`If-Range` : la plage ne vaut que si le client a encore cette version du fichier."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(mtime) <= date
+
+
+def iter_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def serve_file(request, name, storage=default_storage, max_age=None, vary=None):
+    """
+    Sert un fichier du stockage sans le charger en mémoire.
+
+    - `ETag` / `Last-Modified` calculés depuis la taille et la date du fichier
+      (un `stat`), 304 si le client a déjà cette version ;
+    - `MEDIA_SENDFILE_MODE` : `'x-accel-redirect'` (nginx, emplacement interne
+      `MEDIA_ACCEL_REDIRECT_LOCATION`) ou `'x-sendfile'` (Apache, lighttpd)
+      délèguent l'envoi au serveur frontal, qui gère aussi les plages ;
+    - sinon `FileResponse` (envoi par `wsgi.file_wrapper`, donc sendfile avec
+      gunicorn/uWSGI), et 206 pour une requête `Range` à plage unique.
+
+    Renvoie `None` si le fichier n'existe pas.
+    """
+    try:
+        path, size, mtime = stat_file(storage, name)
+    except FileNotFoundError:
+        return None
+
+    etag = file_etag(name, size, mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=int(mtime))
+    if response is None:
+        response = build_response(request, storage, name, path, size, etag, mtime)
+
+    if response.status_code in (200, 206, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(int(mtime))
+        patch_cache_control(
+            response, public=True,
+            max_age=get_setting('USER_IMAGE_MAX_AGE', 300) if max_age is None else max_age
+        )
+    if vary:
+        response['Vary'] = vary
+    return response
+
+
+def build_response(request, storage, name, path, size, etag, mtime):
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    mode = get_setting('MEDIA_SENDFILE_MODE', None)
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        location = get_setting('MEDIA_ACCEL_REDIRECT_LOCATION', '/protected-media/')
+        response['X-Accel-Redirect'] = location.rstrip('/') + '/' + quote(name)
+        return response
+    if mode == 'x-sendfile' and path is not None:
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size) if range_matches(request, etag, mtime) else None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = open(path, 'rb') if path is not None else storage.open(name, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(iter_range(file, start, end - start + 1), content_type=content_type, status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
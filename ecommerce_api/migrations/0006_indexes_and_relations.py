@@ -0,0 +1,132 @@
+# Generated by Django 5.2 on 2026-10-18 06:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce_api', '0005_product_category_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='product',
+            field=models.ForeignObject(from_fields=['productId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='ecommerce_api.product', to_fields=['id']),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='user',
+            field=models.ForeignObject(from_fields=['userId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, to_fields=['id']),
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='product',
+            field=models.ForeignObject(from_fields=['productId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='ecommerce_api.product', to_fields=['id']),
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignObject(from_fields=['userId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, to_fields=['id']),
+        ),
+        migrations.AddField(
+            model_name='history',
+            name='product',
+            field=models.ForeignObject(from_fields=['productId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='ecommerce_api.product', to_fields=['id']),
+        ),
+        migrations.AddField(
+            model_name='history',
+            name='user',
+            field=models.ForeignObject(from_fields=['userId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, to_fields=['id']),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='shipping',
+            field=models.ForeignObject(from_fields=['shippingId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='ecommerce_api.shipping', to_fields=['id']),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='user',
+            field=models.ForeignObject(from_fields=['userId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, to_fields=['id']),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignObject(from_fields=['productId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='ecommerce_api.product', to_fields=['id']),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='product',
+            field=models.ForeignObject(from_fields=['productId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='ecommerce_api.product', to_fields=['id']),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='user',
+            field=models.ForeignObject(from_fields=['userId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, to_fields=['id']),
+        ),
+        migrations.AddField(
+            model_name='shipping',
+            name='user',
+            field=models.ForeignObject(from_fields=['userId'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, to_fields=['id']),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='productId',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='productId',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='productId',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='shippingId',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='productId',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='productId',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='history',
+            index=models.Index(fields=['userId', '-viewed_at'], name='history_user_viewed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['userId', '-created_at'], name='order_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['productId', '-created_at'], name='review_product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipping',
+            index=models.Index(fields=['userId'], name='shipping_user_idx'),
+        ),
+        # Après la création de l'index composite, qui couvre la clé étrangère user_id
+        migrations.AlterField(
+            model_name='notification',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 06:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def reset_counters(apps, schema_editor):
+    # Les compteurs existants n'ont pas de latest_id : ils sont recalculés à la première lecture
+    apps.get_model('ecommerce_api', 'NotificationCounter').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce_api', '0009_notification_counter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationcounter',
+            name='latest_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(reset_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'id'], name='notif_user_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce_api', '0010_notification_latest_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cart',
+            name='cart',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
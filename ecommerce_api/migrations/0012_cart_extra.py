@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce_api', '0011_cart_payload_optional'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='extra',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 06:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce_api', '0012_cart_extra'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='history',
+            name='viewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce_api', '0015_product_poster_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poster',
+            name='image_variants',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='photo_variants',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
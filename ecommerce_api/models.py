@@ -3,6 +3,27 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 
 
+def virtual_relation(to, from_field):
+    """
+    Relation en lecture seule au-dessus d'une colonne entière existante
+    (`userId`, `productId`...), sans colonne ni contrainte supplémentaire.
+
+    Permet `select_related('product')`, `prefetch_related('user')` et les jointures
+    dans les filtres, tout en gardant les champs entiers utilisés par l'API. Les
+    contraintes de clé étrangère en base sont optionnelles : voir la commande
+    `enforce_foreign_keys`.
+    """
+    return models.ForeignObject(
+        to,
+        on_delete=models.DO_NOTHING,
+        from_fields=[from_field],
+        to_fields=['id'],
+        related_name='+',
+        # Jointure externe : une ligne orpheline reste visible avec une relation vide
+        null=True,
+    )
+
+
 class Product(models.Model):
     product_name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -12,10 +33,26 @@ class Product(models.Model):
     # image = models.ImageField(upload_to='products/')
     # Nouvelle ligne :
     image = models.URLField(max_length=500, blank=True, null=True)  # Recommandé pour des URLs
+    # Référence article du fournisseur, clé d'upsert de l'import en masse
+    sku = models.CharField(max_length=100, blank=True, null=True)
+    # Entre dans l'ETag des réponses conditionnelles ; à renseigner
+    # explicitement dans les écritures en masse (`update`, `bulk_update`)
+    updated_at = models.DateTimeField(auto_now=True)
 
     # Si URLField pose des problèmes de validation ou de flexibilité, vous pouvez utiliser CharField :
     # image = models.CharField(max_length=500, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Pagination par curseur sur (category, id)
+            models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+            # MAX(updated_at) lu sur l'index (validateurs des listes de produits)
+            models.Index(fields=['updated_at'], name='product_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['supplier', 'sku'], name='product_supplier_sku_uniq'),
+        ]
+
     def __str__(self):
         return self.product_name
 
@@ -23,6 +60,8 @@ class Product(models.Model):
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     photo = models.ImageField(upload_to='users/', null=True, blank=True)
+    # Déclinaisons redimensionnées de la photo (voir `images.process_image`)
+    photo_variants = models.JSONField(null=True, blank=True)
 
     def __str__(self):
         return self.user.username
@@ -30,9 +69,12 @@ class UserProfile(models.Model):
 
 class Favorite(models.Model):
     userId = models.IntegerField()
-    productId = models.IntegerField()
+    productId = models.BigIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    user = virtual_relation(User, 'userId')
+    product = virtual_relation(Product, 'productId')
+
     class Meta:
         unique_together = ('userId', 'productId')
 
@@ -41,12 +83,19 @@ class Favorite(models.Model):
 
 
 class Cart(models.Model):
-    cart = models.TextField()  # JSON string, comme dans votre Cart.java
+    # Ancienne copie JSON de la requête (Cart.java), plus écrite par défaut et vidée
+    # par la commande `strip_cart_payloads`
+    cart = models.TextField(blank=True, null=True)
+    # Champs du client hors userId/productId/quantity, bornés par `carts.cart_extra`
+    extra = models.JSONField(blank=True, null=True)
     userId = models.IntegerField()
-    productId = models.IntegerField()
+    productId = models.BigIntegerField()
     quantity = models.IntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    user = virtual_relation(User, 'userId')
+    product = virtual_relation(Product, 'productId')
+
     class Meta:
         unique_together = ('userId', 'productId')
 
@@ -57,12 +106,20 @@ class Cart(models.Model):
 # Modèles pour les fonctionnalités commentées
 class History(models.Model):
     userId = models.IntegerField()
-    productId = models.IntegerField()
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    productId = models.BigIntegerField()
+    # Horodatage de la consultation, fixé à l'enregistrement de l'événement (et non à
+    # l'écriture différée, voir history.py)
+    viewed_at = models.DateTimeField(default=timezone.now)
+
+    user = virtual_relation(User, 'userId')
+    product = virtual_relation(Product, 'productId')
 
     class Meta:
         unique_together = ('userId', 'productId')
         ordering = ['-viewed_at']
+        indexes = [
+            models.Index(fields=['userId', '-viewed_at'], name='history_user_viewed_idx'),
+        ]
 
     def __str__(self):
         return f"User {self.userId} - Product {self.productId}"
@@ -70,19 +127,59 @@ class History(models.Model):
 
 class Review(models.Model):
     userId = models.IntegerField()
-    productId = models.IntegerField()
+    productId = models.BigIntegerField()
     rating = models.IntegerField(default=5)
     review = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    user = virtual_relation(User, 'userId')
+    product = virtual_relation(Product, 'productId')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['productId', '-created_at'], name='review_product_created_idx'),
+        ]
+
     def __str__(self):
         return f"Review by User {self.userId} on Product {self.productId}"
 
 
+class ProductRatingStats(models.Model):
+    """
+    Agrégats des avis d'un produit (nombre, somme, répartition des notes 1 à 5),
+    mis à jour à chaque avis ; reconstruits par `rebuild_rating_stats`.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='rating_stats')
+    count = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'product_rating_stats'
+
+    @property
+    def average(self):
+        return round(self.total / self.count, 2) if self.count else None
+
+    @property
+    def histogram(self):
+        return {str(rating): getattr(self, f'rating_{rating}') for rating in range(1, 6)}
+
+    def __str__(self):
+        return f"Product {self.product_id}: {self.average} ({self.count})"
+
+
 class Poster(models.Model):
     title = models.CharField(max_length=255)
     image = models.ImageField(upload_to='posters/')
     date_added = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # `{source, items: [{width, height, format, name}]}`, générées en arrière-plan
+    image_variants = models.JSONField(null=True, blank=True)
 
     def __str__(self):
         return self.title
@@ -97,6 +194,13 @@ class Shipping(models.Model):
     postal_code = models.CharField(max_length=20)
     phone = models.CharField(max_length=20)
 
+    user = virtual_relation(User, 'userId')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['userId'], name='shipping_user_idx'),
+        ]
+
     def __str__(self):
         return f"Address for {self.name} (User {self.userId})"
 
@@ -111,22 +215,32 @@ class Order(models.Model):
     )
 
     userId = models.IntegerField()
-    shippingId = models.IntegerField()
+    shippingId = models.BigIntegerField()
     payment_method = models.CharField(max_length=50)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    user = virtual_relation(User, 'userId')
+    shipping = virtual_relation(Shipping, 'shippingId')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['userId', '-created_at'], name='order_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by User {self.userId}"
 
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
-    productId = models.IntegerField()
+    productId = models.BigIntegerField()
     quantity = models.IntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    product = virtual_relation(Product, 'productId')
+
     def __str__(self):
         return f"OrderItem {self.id} - Product {self.productId}"
 
@@ -150,7 +264,8 @@ class Notification(models.Model):
         ('general', 'Général'),
     ]
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    # Index couvert par notif_user_read_created_idx (user en premier)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', db_index=False)
     title = models.CharField(max_length=255)
     message = models.TextField()
     type = models.CharField(max_length=20, choices=TYPE_CHOICES, default='general')
@@ -162,6 +277,57 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-created_at']
         db_table = 'notifications'
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created_idx'),
+            # Liste paginée par curseur (-created_at, -id)
+            models.Index(fields=['user', '-created_at', '-id'], name='notif_user_created_idx'),
+            # Mode delta (?since_id=) : nouvelles notifications d'un utilisateur
+            models.Index(fields=['user', 'id'], name='notif_user_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.user.username}"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Événements de notification en attente de traitement (pattern outbox).
+
+    La ligne est écrite dans la transaction de la requête, puis transformée en
+    `Notification` par les workers de `ecommerce_api.notifications` et supprimée.
+    Une ligne réservée (`claimed_at`) mais jamais traitée, après un crash par
+    exemple, redevient disponible une fois le bail expiré.
+    """
+    userId = models.IntegerField()
+    event = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    claim_token = models.CharField(max_length=32, null=True, blank=True, db_index=True)
+
+    class Meta:
+        db_table = 'notification_outbox'
+        indexes = [
+            models.Index(fields=['claimed_at', 'id'], name='outbox_claimed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} for User {self.userId}"
+
+
+class NotificationCounter(models.Model):
+    """
+    Compteurs dénormalisés des notifications d'un utilisateur, mis à jour dans la
+    même transaction que chaque écriture sur `Notification`.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    total = models.IntegerField(default=0)
+    unread = models.IntegerField(default=0)
+    # Plus grand id de notification créé (ne diminue pas à la suppression)
+    latest_id = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'notification_counters'
+
+    def __str__(self):
+        return f"User {self.user_id}: {self.unread}/{self.total}"
@@ -0,0 +1,339 @@
+import atexit
+import json
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, Max, Q
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .events import publish_new_notifications
+from .models import Product, Notification, NotificationOutbox, NotificationCounter
+
+
+logger = logging.getLogger(__name__)
+
+
+# Construction du texte des notifications, exécutée par les workers et non plus
+# dans la requête. Chaque fonction reçoit le payload de l'événement et les
+# produits concernés (chargés en une seule requête pour tout le lot).
+def _favorite_added(payload, products):
+    product = products.get(payload.get('product_id'))
+    if product is None:
+        return None
+    return {
+        'title': "Produit ajouté à vos favoris",
+        'message': f"Le produit '{product.product_name}' a été ajouté à vos favoris.",
+        'type': "general",
+        'data': {"product_id": product.id},
+    }
+
+
+def _review_published(payload, products):
+    product = products.get(payload.get('product_id'))
+    if product is None:
+        return None
+    return {
+        'title': "Avis publié",
+        'message': f"Votre avis sur le produit '{product.product_name}' a été publié.",
+        'type': "general",
+        'data': {"product_id": product.id},
+    }
+
+
+def _address_added(payload, products):
+    return {
+        'title': "Nouvelle adresse ajoutée",
+        'message': "Votre nouvelle adresse de livraison a été enregistrée.",
+        'type': "account",
+        'data': {"address_id": payload.get('address_id')},
+    }
+
+
+def _order_placed(payload, products):
+    return {
+        'title': "Nouvelle commande passée",
+        'message': f"Votre commande #{payload.get('order_id')} a été créée avec succès.",
+        'type': "order",
+        'data': {
+            "order_id": payload.get('order_id'),
+            "total": payload.get('total'),
+            "status": payload.get('status'),
+        },
+    }
+
+
+EVENTS = {
+    'favorite_added': _favorite_added,
+    'review_published': _review_published,
+    'address_added': _address_added,
+    'order_placed': _order_placed,
+}
+
+
+def count_notifications(user_id):
+    """Recompte (total, non lues, plus grand id) depuis la table `notifications`."""
+    counts = Notification.objects.filter(user_id=user_id).aggregate(
+        total=Count('id'), unread=Count('id', filter=Q(is_read=False)), latest_id=Max('id')
+    )
+    return counts
+
+
+def recount_notifications(user_id):
+    """Recalcule le compteur d'un utilisateur ; renvoie le compteur à jour."""
+    counts = count_notifications(user_id)
+    counter = NotificationCounter.objects.filter(user_id=user_id).first()
+    if counter is None:
+        return NotificationCounter.objects.create(user_id=user_id, **counts)
+
+    # `latest_id` est un plus haut historique : un recomptage ne le fait pas reculer
+    counts['latest_id'] = max(filter(None, [counts['latest_id'], counter.latest_id]), default=None)
+    for name, value in counts.items():
+        setattr(counter, name, value)
+    counter.save()
+    return counter
+
+
+def _apply_delta(user_id, total, unread, latest_id):
+    changes = {'total': F('total') + total, 'unread': F('unread') + unread}
+    if latest_id is not None:
+        changes['latest_id'] = Greatest(Coalesce('latest_id', 0), latest_id)
+    return NotificationCounter.objects.filter(user_id=user_id).update(**changes)
+
+
+def adjust_counter(user_id, total=0, unread=0, latest_id=None):
+    """
+    Applique un delta au compteur d'un utilisateur. À appeler dans la transaction
+    qui modifie les notifications.
+
+    Si le compteur n'existe pas encore, il est initialisé par un recomptage, qui
+    voit déjà les écritures de la transaction courante.
+    """
+    if not total and not unread and latest_id is None:
+        return
+    if _apply_delta(user_id, total, unread, latest_id):
+        return
+    try:
+        with transaction.atomic():
+            NotificationCounter.objects.create(user_id=user_id, **count_notifications(user_id))
+    except IntegrityError:
+        # Créé entre-temps par une autre transaction : on applique le delta
+        _apply_delta(user_id, total, unread, latest_id)
+
+
+def counter_etag(counter, *variant):
+    """
+    ETag de l'état des notifications d'un utilisateur. Toute écriture change au
+    moins l'un des trois nombres (création : `latest_id`, lecture : `unread`,
+    suppression : `total`). `variant` : paramètres de la requête qui changent
+    le corps de la réponse pour un même état (mode delta : `since_id`, limite).
+    """
+    suffix = ''.join(f'-{part}' for part in variant)
+    return f'"notifications-{counter.total}-{counter.unread}-{counter.latest_id or 0}{suffix}"'
+
+
+def get_counter(user_id):
+    """Compteur d'un utilisateur en O(1), initialisé à la première lecture."""
+    counter = NotificationCounter.objects.filter(user_id=user_id).first()
+    if counter is None:
+        try:
+            with transaction.atomic():
+                counter = recount_notifications(user_id)
+        except IntegrityError:
+            counter = NotificationCounter.objects.get(user_id=user_id)
+    return counter
+
+
+async def aget_counter(user_id):
+    """`get_counter` pour les vues asynchrones : lecture par l'ORM asynchrone, initialisation dans un thread."""
+    counter = await NotificationCounter.objects.filter(user_id=user_id).afirst()
+    if counter is None:
+        counter = await sync_to_async(get_counter)(user_id)
+    return counter
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def notify(user_id, event, **payload):
+    """
+    Enregistre un événement de notification dans l'outbox.
+
+    Seule l'insertion de la ligne outbox a lieu dans la requête (dans sa
+    transaction, le cas échéant) ; le reste est fait par les workers après le
+    commit. En mode `sync` (tests), l'événement est traité immédiatement.
+    """
+    if event not in EVENTS:
+        raise ValueError(f"Événement de notification inconnu : {event}")
+
+    NotificationOutbox.objects.create(userId=user_id, event=event, payload=payload)
+
+    if get_setting('NOTIFICATION_DISPATCH_MODE', 'async') == 'sync':
+        drain_outbox()
+    else:
+        transaction.on_commit(dispatcher.wake)
+
+
+def claim_batch(token, batch_size, lease):
+    """Réserve jusqu'à `batch_size` événements libres (ou dont le bail a expiré)."""
+    now = timezone.now()
+    available = Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - timedelta(seconds=lease))
+
+    ids = list(
+        NotificationOutbox.objects.filter(available).order_by('id').values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+
+    # La condition est répétée dans l'UPDATE : deux workers ne peuvent pas réserver la même ligne
+    NotificationOutbox.objects.filter(available, id__in=ids).update(claimed_at=now, claim_token=token)
+    return list(NotificationOutbox.objects.filter(claim_token=token).order_by('id'))
+
+
+def build_notifications(entries):
+    """Transforme un lot d'événements en `Notification`, en fusionnant les doublons."""
+    product_ids = {e.payload.get('product_id') for e in entries if e.payload.get('product_id')}
+    products = Product.objects.only('product_name').in_bulk(product_ids)
+    user_ids = set(User.objects.filter(id__in={e.userId for e in entries}).values_list('id', flat=True))
+
+    seen = set()
+    notifications = []
+    for entry in entries:
+        if entry.userId not in user_ids:
+            continue
+
+        key = (entry.userId, entry.event, json.dumps(entry.payload, sort_keys=True))
+        if key in seen:
+            continue
+        seen.add(key)
+
+        fields = EVENTS[entry.event](entry.payload, products)
+        if fields:
+            notifications.append(Notification(user_id=entry.userId, created_at=entry.created_at, **fields))
+    return notifications
+
+
+def process_outbox(batch_size=None, lease=None):
+    """Traite un lot d'événements ; renvoie le nombre d'événements consommés."""
+    batch_size = batch_size or get_setting('NOTIFICATION_BATCH_SIZE', 500)
+    lease = lease or get_setting('NOTIFICATION_CLAIM_LEASE', 60)
+    token = uuid.uuid4().hex
+
+    entries = claim_batch(token, batch_size, lease)
+    if not entries:
+        return 0
+
+    with transaction.atomic():
+        notifications = Notification.objects.bulk_create(build_notifications(entries))
+        NotificationOutbox.objects.filter(claim_token=token).delete()
+
+        created = {}
+        for notification in notifications:
+            created[notification.user_id] = created.get(notification.user_id, 0) + 1
+
+        # MySQL ne renvoie pas les ids créés par `bulk_create` : on relit le plus grand id par utilisateur
+        if all(notification.pk for notification in notifications):
+            latest = {}
+            for notification in notifications:
+                latest[notification.user_id] = max(latest.get(notification.user_id, 0), notification.pk)
+        else:
+            latest = dict(
+                Notification.objects.filter(user_id__in=created).order_by().values('user_id')
+                .annotate(latest_id=Max('id')).values_list('user_id', 'latest_id')
+            )
+        for user_id, count in created.items():
+            adjust_counter(user_id, total=count, unread=count, latest_id=latest.get(user_id))
+
+        # Réveil des flux SSE ouverts, une fois les notifications visibles
+        if latest:
+            transaction.on_commit(lambda: publish_new_notifications(latest))
+    return len(entries)
+
+
+def drain_outbox(batch_size=None):
+    total = 0
+    while True:
+        processed = process_outbox(batch_size)
+        if not processed:
+            return total
+        total += processed
+
+
+class NotificationDispatcher:
+    """
+    Pool de threads de fond qui vident l'outbox.
+
+    Les workers démarrent à la première requête du processus (voir
+    `start_dispatcher`) et vident aussitôt l'outbox : les événements laissés
+    par un arrêt brutal ou un redémarrage n'attendent pas une nouvelle
+    notification. Ils sont ensuite réveillés après chaque commit contenant un
+    événement et repassent périodiquement (`NOTIFICATION_POLL_INTERVAL`).
+    Avec `NOTIFICATION_WORKERS = 0`, aucun worker ne démarre : la commande
+    `process_notification_outbox` doit alors être planifiée.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        workers = get_setting('NOTIFICATION_WORKERS', 2)
+        if self._threads or workers <= 0:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(workers):
+                thread = threading.Thread(target=self._run, name=f'notification-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.stop)
+
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                drain_outbox()
+            except Exception:
+                logger.exception("Échec du traitement de l'outbox des notifications")
+            finally:
+                close_old_connections()
+            self._wakeup.wait(get_setting('NOTIFICATION_POLL_INTERVAL', 5.0))
+            self._wakeup.clear()
+
+    def stop(self, timeout=5.0):
+        """Arrête les workers puis vide l'outbox une dernière fois (arrêt du processus)."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if not threads:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in threads:
+            thread.join(timeout)
+        try:
+            drain_outbox()
+        except Exception:
+            logger.exception("Échec du vidage de l'outbox des notifications à l'arrêt")
+
+
+dispatcher = NotificationDispatcher()
+
+
+def start_dispatcher(sender, **kwargs):
+    """Receveur de `request_started` (branché dans `AppConfig.ready` en mode `async`)."""
+    if get_setting('NOTIFICATION_DISPATCH_MODE', 'async') == 'async':
+        dispatcher.start()
@@ -0,0 +1,147 @@
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+
+
+# Pagination pour les produits
+class ProductPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par curseur opaque sur une clé ordonnée (ex. `('id',)`,
+    `('category', 'id')` ou `('-created_at', '-id')` pour un tri décroissant).
+
+    Contrairement à `LIMIT/OFFSET`, chaque page est un `WHERE (clé) > (dernière
+    valeur) ORDER BY clé LIMIT n` : le coût ne dépend pas de la profondeur de la
+    page et aucun `COUNT(*)` n'est exécuté. Le curseur encode la clé de la
+    dernière (ou première) ligne et le sens de parcours.
+    """
+    ordering = ('id',)
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Curseur invalide'
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+    @classmethod
+    def is_requested(cls, request):
+        """Le mode curseur est actif dès que le paramètre `cursor` est présent (vide pour la 1re page)."""
+        return cls.cursor_query_param in request.query_params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def encode_cursor(self, values, reverse=False):
+        # Les dates sont encodées en ISO 8601 complet (microsecondes comprises) pour
+        # que la comparaison de clé reste exacte
+        values = [v.isoformat() if isinstance(v, (datetime.date, datetime.time)) else v for v in values]
+        payload = json.dumps({'p': values, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+            values = payload['p']
+            reverse = bool(payload.get('r', 0))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    @property
+    def fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def _after(self, values, reverse):
+        """Construit la comparaison de tuple `(a, b) > (va, vb)` dans le sens de parcours."""
+        fields = self.fields
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            descending = field.startswith('-')
+            op = 'lt' if descending != reverse else 'gt'
+            term = Q(**{f'{fields[i]}__{op}': values[i]})
+            for previous, value in zip(fields[:i], values[:i]):
+                term &= Q(**{previous: value})
+            condition |= term
+        return condition
+
+    def _key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def get_page_queryset(self, queryset, request):
+        """Requête de la page demandée (une ligne de plus pour savoir s'il y a une suite), non évaluée."""
+        self.limit = self.get_page_size(request)
+        self.values, self.reverse = self.decode_cursor(request)
+
+        order = [(f[1:] if f.startswith('-') else f'-{f}') if self.reverse else f for f in self.ordering]
+        queryset = queryset.order_by(*order)
+        if self.values is not None:
+            try:
+                queryset = queryset.filter(self._after(self.values, self.reverse))
+            except (TypeError, ValueError, ValidationError):
+                # Curseur bien formé mais valeur de clé non convertible (curseur forgé)
+                raise NotFound(self.invalid_cursor_message)
+        return queryset[:self.limit + 1]
+
+    def finish_page(self, results):
+        """Calcule les curseurs à partir des lignes lues et renvoie la page dans l'ordre de la clé."""
+        has_more = len(results) > self.limit
+        results = results[:self.limit]
+        if self.reverse:
+            results.reverse()
+
+        if self.reverse:
+            has_next, has_previous = self.values is not None, has_more
+        else:
+            has_next, has_previous = has_more, self.values is not None
+
+        self.next_cursor = self.encode_cursor(self._key(results[-1])) if results and has_next else None
+        self.previous_cursor = (
+            self.encode_cursor(self._key(results[0]), reverse=True) if results and has_previous else None
+        )
+        return results
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.get_page_queryset(queryset, request)
+        try:
+            results = list(page)
+        except (ValueError, ValidationError):
+            # Valeur de clé non convertible (curseur forgé)
+            raise NotFound(self.invalid_cursor_message)
+        return self.finish_page(results)
+
+    async def apaginate_queryset(self, queryset, request):
+        """Équivalent de `paginate_queryset` pour les vues asynchrones (ORM asynchrone)."""
+        page = self.get_page_queryset(queryset, request)
+        try:
+            results = [obj async for obj in page]
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return self.finish_page(results)
+
+    def get_paginated_data(self, key, data):
+        return {key: data, 'next': self.next_cursor, 'previous': self.previous_cursor}
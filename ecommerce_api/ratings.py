@@ -0,0 +1,65 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Product, ProductRatingStats, Review
+
+
+RATINGS = range(1, 6)
+
+
+def aggregate_reviews(product_ids):
+    """Agrégats calculés depuis la table des avis : `{product_id: {count, total, rating_1..5}}`."""
+    histogram = {f'rating_{rating}': Count('id', filter=Q(rating=rating)) for rating in RATINGS}
+    rows = (
+        Review.objects.filter(productId__in=product_ids).order_by()
+        .values('productId')
+        .annotate(count=Count('id'), total=Sum('rating'), **histogram)
+    )
+    return {row.pop('productId'): row for row in rows}
+
+
+def rebuild_rating_stats(product_ids):
+    """Recalcule les agrégats des produits donnés ; renvoie le nombre de produits avec des avis."""
+    product_ids = list(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+    stats = aggregate_reviews(product_ids)
+    kwargs = {'update_conflicts': True, 'update_fields': ['count', 'total'] + [f'rating_{r}' for r in RATINGS]}
+    # MySQL (ON DUPLICATE KEY UPDATE) ne permet pas de préciser la contrainte visée
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = ['product']
+    with transaction.atomic():
+        ProductRatingStats.objects.filter(product_id__in=product_ids).exclude(product_id__in=stats).delete()
+        ProductRatingStats.objects.bulk_create(
+            [ProductRatingStats(product_id=product_id, **values) for product_id, values in stats.items()],
+            **kwargs
+        )
+    return len(stats)
+
+
+def record_review(product_id, rating):
+    """
+    Ajoute un avis aux agrégats du produit, dans la transaction qui enregistre
+    l'avis. Un produit sans agrégats est initialisé par un recalcul complet ; un
+    produit inexistant est ignoré.
+    """
+    changes = {'count': F('count') + 1, 'total': F('total') + rating}
+    if rating in RATINGS:
+        changes[f'rating_{rating}'] = F(f'rating_{rating}') + 1
+    if ProductRatingStats.objects.filter(product_id=product_id).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            rebuild_rating_stats([product_id])
+    except IntegrityError:
+        # Créés entre-temps par une autre transaction
+        ProductRatingStats.objects.filter(product_id=product_id).update(**changes)
+
+
+def stats_summary(stats, histogram=False):
+    """Représentation API des agrégats (`None` = produit sans avis)."""
+    data = {
+        'average': stats.average if stats else None,
+        'count': stats.count if stats else 0,
+    }
+    if histogram:
+        data['histogram'] = stats.histogram if stats else {str(rating): 0 for rating in RATINGS}
+    return data
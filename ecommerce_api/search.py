@@ -0,0 +1,205 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Poids des champs dans le score de pertinence
+FIELD_WEIGHTS = {
+    'product_name': 3.0,
+    'category': 2.0,
+    'supplier': 1.0,
+}
+
+# Un terme exact vaut plus qu'un simple préfixe ("chaus" -> "chaussure")
+PREFIX_FACTOR = 0.5
+
+# Marge relue à chaque rattrapage : une écriture datée avant le précédent
+# rattrapage mais validée après lui n'est pas perdue
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+def normalize(text):
+    """Minuscules et suppression des accents ("Crème Brûlée" -> "creme brulee")."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+class BaseSearchBackend:
+    """
+    Interface d'un moteur de recherche produit.
+
+    `search` renvoie les IDs de produits triés par pertinence décroissante.
+    """
+
+    def index_product(self, product):
+        raise NotImplementedError
+
+    def remove_product(self, product_id):
+        raise NotImplementedError
+
+    def search(self, query):
+        raise NotImplementedError
+
+    def reset(self):
+        """Oublie l'index ; il sera reconstruit à la prochaine recherche."""
+        raise NotImplementedError
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    Index inversé en mémoire du processus, sans service externe.
+
+    L'index est construit depuis la base à la première recherche puis maintenu
+    par les signaux `post_save`/`post_delete` de `Product`, après le commit.
+    Chaque processus worker garde son propre index : les écritures des autres
+    processus sont rattrapées toutes les `SEARCH_INDEX_REFRESH_INTERVAL`
+    secondes (produits modifiés depuis le dernier rattrapage, reconstruction
+    complète si des produits ont été supprimés), jamais à chaque écriture :
+    chaque commande modifie le stock de ses produits.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._refreshed_at = 0.0  # time.monotonic()
+        self._watermark = None  # date du dernier chargement ou rattrapage
+        self._postings = {}  # token -> {product_id: poids}
+        self._docs = {}  # product_id -> tokens indexés
+        self._vocab = []  # tokens triés, pour la recherche par préfixe
+
+    def reset(self):
+        with self._lock:
+            self._loaded = False
+            self._postings = {}
+            self._docs = {}
+            self._vocab = []
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            self._refresh()
+            return
+        from .models import Product
+
+        with self._lock:
+            if self._loaded:
+                return
+            started = timezone.now()
+            products = Product.objects.only(*FIELD_WEIGHTS).iterator(chunk_size=2000)
+            for product in products:
+                self._add(product)
+            self._watermark, self._refreshed_at = started, time.monotonic()
+            self._loaded = True
+
+    def _refresh(self):
+        interval = getattr(settings, 'SEARCH_INDEX_REFRESH_INTERVAL', 30)
+        if time.monotonic() - self._refreshed_at < interval:
+            return
+        from .models import Product
+
+        # Lectures hors verrou : les recherches continuent sur l'index courant
+        started = timezone.now()
+        changed = list(Product.objects.filter(updated_at__gte=self._watermark - REFRESH_OVERLAP).only(*FIELD_WEIGHTS))
+        count = Product.objects.count()
+        with self._lock:
+            if not self._loaded:
+                return
+            for product in changed:
+                self._remove(product.pk)
+                self._add(product)
+            self._watermark, self._refreshed_at = started, time.monotonic()
+            deleted = len(self._docs) != count
+        if deleted:
+            # Suppressions faites par un autre processus : invisibles au rattrapage par date
+            self.reset()
+            self._ensure_loaded()
+
+    def _add(self, product):
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(product, field)):
+                weights[token] = weights.get(token, 0.0) + weight
+
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                insort(self._vocab, token)
+            postings[product.pk] = weight
+        self._docs[product.pk] = set(weights)
+
+    def _remove(self, product_id):
+        for token in self._docs.pop(product_id, ()):
+            postings = self._postings[token]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                del self._vocab[bisect_left(self._vocab, token)]
+
+    def index_product(self, product):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(product.pk)
+            self._add(product)
+
+    def remove_product(self, product_id):
+        with self._lock:
+            if self._loaded:
+                self._remove(product_id)
+
+    def _term_scores(self, term):
+        scores = {}
+        start = bisect_left(self._vocab, term)
+        for token in self._vocab[start:]:
+            if not token.startswith(term):
+                break
+            factor = 1.0 if token == term else PREFIX_FACTOR
+            for product_id, weight in self._postings[token].items():
+                score = weight * factor
+                if score > scores.get(product_id, 0.0):
+                    scores[product_id] = score
+        return scores
+
+    def search(self, query):
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        self._ensure_loaded()
+        with self._lock:
+            # Tous les termes doivent correspondre ; on commence par le plus sélectif
+            per_term = sorted((self._term_scores(term) for term in set(terms)), key=len)
+            totals = dict(per_term[0])
+            for scores in per_term[1:]:
+                totals = {pid: total + scores[pid] for pid, total in totals.items() if pid in scores}
+                if not totals:
+                    break
+
+        return sorted(totals, key=lambda pid: (-totals[pid], pid))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'ecommerce_api.search.InMemorySearchBackend')
+                _backend = import_string(path)()
+    return _backend
@@ -1,9 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import models
 from .models import (
     Product, UserProfile, Favorite, Cart, History,
-    Review, Poster, Shipping, Order, OrderItem, Otp, Notification
+    Review, Poster, Shipping, Order, OrderItem, Otp, Notification, ProductRatingStats
 )
+from .cache import catalogue_cache
+from .images import current_variants
+from .ratings import stats_summary
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -21,26 +25,95 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+class ProductListSerializer(serializers.ListSerializer):
+    """
+    Sérialiseur de liste qui charge en une seule fois les IDs favoris et panier
+    de l'utilisateur, au lieu de deux requêtes `.exists()` par produit.
+
+    Les vues asynchrones chargent ces données elles-mêmes et les passent dans le
+    contexte (`rating_stats`, `favorite_ids`, `cart_ids`) : la sérialisation ne
+    fait alors aucune requête.
+    """
+
+    def to_representation(self, data):
+        data = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        context = self.child.context
+        # Agrégats des avis de tous les produits de la liste en une requête (ou depuis le cache)
+        self.child._rating_stats = context.get('rating_stats')
+        if self.child._rating_stats is None:
+            self.child._rating_stats = catalogue_cache.get_rating_stats(product.id for product in data)
+
+        user_id = context.get('user_id')
+        if 'favorite_ids' in context:
+            self.child._favorite_ids = context['favorite_ids']
+            self.child._cart_ids = context['cart_ids']
+        elif user_id:
+            self.child._favorite_ids = set(
+                Favorite.objects.filter(userId=user_id).values_list('productId', flat=True)
+            )
+            self.child._cart_ids = set(
+                Cart.objects.filter(userId=user_id).values_list('productId', flat=True)
+            )
+        try:
+            return super().to_representation(data)
+        finally:
+            self.child._favorite_ids = None
+            self.child._cart_ids = None
+            self.child._rating_stats = None
+
+
 class ProductSerializer(serializers.ModelSerializer):
     isFavourite = serializers.SerializerMethodField()
     isInCart = serializers.SerializerMethodField()
+    rating = serializers.SerializerMethodField()
+
+    _favorite_ids = None
+    _cart_ids = None
+    _rating_stats = None
 
     class Meta:
         model = Product
-        fields = ['id', 'product_name', 'price', 'quantity', 'supplier', 'category', 'image', 'isFavourite', 'isInCart']
+        fields = [
+            'id', 'product_name', 'price', 'quantity', 'supplier', 'category', 'image', 'isFavourite', 'isInCart',
+            'rating',
+        ]
+        list_serializer_class = ProductListSerializer
 
     def get_isFavourite(self, obj):
+        if self._favorite_ids is not None:
+            return 1 if obj.id in self._favorite_ids else 0
         user_id = self.context.get('user_id')
         if user_id:
             return 1 if Favorite.objects.filter(userId=user_id, productId=obj.id).exists() else 0
         return 0
 
     def get_isInCart(self, obj):
+        if self._cart_ids is not None:
+            return 1 if obj.id in self._cart_ids else 0
         user_id = self.context.get('user_id')
         if user_id:
             return 1 if Cart.objects.filter(userId=user_id, productId=obj.id).exists() else 0
         return 0
 
+    def get_rating(self, obj):
+        if self._rating_stats is not None:
+            stats = self._rating_stats.get(obj.id)
+        else:
+            stats = ProductRatingStats.objects.filter(product_id=obj.id).first()
+        return stats_summary(stats)
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    """Validation d'une ligne d'import en masse (upsert par fournisseur + SKU)."""
+    sku = serializers.CharField(max_length=100)
+    supplier = serializers.CharField(max_length=255)
+
+    class Meta:
+        model = Product
+        fields = ['sku', 'product_name', 'price', 'quantity', 'supplier', 'category', 'image']
+        # L'unicité (supplier, sku) est justement la clé d'upsert : pas de validateur
+        validators = []
+
 
 class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -54,6 +127,17 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ['cart', 'userId', 'productId', 'quantity']
 
 
+class CartOperationSerializer(serializers.Serializer):
+    productId = serializers.IntegerField(min_value=1)
+    # 0 = retirer le produit du panier
+    quantity = serializers.IntegerField(min_value=0)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    userId = serializers.IntegerField(min_value=1)
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=500)
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
@@ -73,23 +157,56 @@ class CartApiResponse(serializers.Serializer):
     carts = ProductSerializer(many=True)
 
 
+class CartLineSerializer(serializers.Serializer):
+    productId = serializers.IntegerField()
+    product_name = serializers.CharField(allow_null=True)
+    image = serializers.CharField(allow_null=True)
+    quantity = serializers.IntegerField()
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    line_total = serializers.DecimalField(max_digits=14, decimal_places=2, allow_null=True)
+    available_quantity = serializers.IntegerField()
+    in_stock = serializers.BooleanField()
+
+
+class CartSummarySerializer(serializers.Serializer):
+    lines = CartLineSerializer(many=True)
+    item_count = serializers.IntegerField()
+    total_quantity = serializers.IntegerField()
+    grand_total = serializers.DecimalField(max_digits=14, decimal_places=2)
+    all_in_stock = serializers.BooleanField()
+
+
 # Serializers pour les modèles supplémentaires
 class HistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = History
         fields = ['userId', 'productId']
+        # Revoir un produit met à jour l'entrée existante : pas de validateur d'unicité
+        validators = []
 
 
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = ['userId', 'productId', 'rating', 'review']
+        # Les agrégats par produit ne connaissent que les notes 1 à 5
+        extra_kwargs = {'rating': {'min_value': 1, 'max_value': 5}}
 
 
 class PosterSerializer(serializers.ModelSerializer):
+    # Déclinaisons redimensionnées (WebP/JPEG), vide tant qu'elles ne sont pas générées
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Poster
-        fields = ['id', 'title', 'image']
+        fields = ['id', 'title', 'image', 'variants']
+
+    def get_variants(self, obj):
+        return [
+            {'width': item['width'], 'height': item['height'], 'format': item['format'],
+             'url': obj.image.storage.url(item['name'])}
+            for item in current_variants(obj.image_variants, obj.image.name if obj.image else None)
+        ]
 
 
 class ShippingSerializer(serializers.ModelSerializer):
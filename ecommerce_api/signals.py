@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import catalogue_cache
+from .images import image_processor, is_current
+from .models import Product, Poster, UserProfile
+from .search import get_search_backend
+
+
+# Index de recherche produit, mis à jour après le commit : une écriture annulée
+# n'y entre jamais
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    transaction.on_commit(lambda: get_search_backend().index_product(instance))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    # `pk` est remis à None à la fin de la suppression
+    product_id = instance.pk
+    transaction.on_commit(lambda: get_search_backend().remove_product(product_id))
+
+
+# Cache catalogue, invalidé après le commit : avant, une lecture concurrente
+# remettrait en cache les données d'avant l'écriture
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    transaction.on_commit(catalogue_cache.invalidate_products)
+
+
+@receiver(post_save, sender=Poster)
+@receiver(post_delete, sender=Poster)
+def invalidate_poster_cache(sender, instance, **kwargs):
+    transaction.on_commit(catalogue_cache.invalidate_posters)
+
+
+# Déclinaisons d'images, générées après le commit hors du thread de la requête
+@receiver(post_save, sender=Poster)
+def process_poster_image(sender, instance, **kwargs):
+    if instance.image and not is_current(instance.image_variants, instance.image.name):
+        transaction.on_commit(lambda: image_processor.submit('poster', instance.pk))
+
+
+@receiver(post_save, sender=UserProfile)
+def process_user_photo(sender, instance, **kwargs):
+    if instance.photo and not is_current(instance.photo_variants, instance.photo.name):
+        transaction.on_commit(lambda: image_processor.submit('user', instance.pk))
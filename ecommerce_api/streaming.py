@@ -0,0 +1,56 @@
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+
+def iter_queryset_chunks(queryset, chunk_size=2000):
+    """
+    Lit un queryset par lots de `chunk_size` lignes, dans l'ordre de la clé
+    primaire, une requête par lot (`pk > dernier id lu ... LIMIT chunk_size`).
+
+    Pas de `.iterator()` : avec mysqlclient, le curseur charge tout le résultat
+    en mémoire côté client, chaque requête doit donc rester bornée.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1].pk
+
+
+def iter_json_envelope(key, chunks, serializer_class, context=None):
+    """
+    Génère `{"<key>":[...]}` morceau par morceau à partir de lots d'instances.
+
+    Les lots sont sérialisés et rendus un par un : la mémoire reste bornée par la
+    taille d'un lot, quelle que soit la taille du catalogue. Le rendu passe par le
+    `JSONRenderer` de DRF, ce qui donne exactement les mêmes octets qu'une
+    `Response` classique.
+    """
+    renderer = JSONRenderer()
+    yield b'{' + renderer.render(key) + b':['
+
+    # Un seul sérialiseur pour tous les lots : `to_representation` ne garde
+    # aucune référence vers les instances, qui sont libérées lot après lot.
+    serializer = serializer_class(many=True, context=context or {})
+    first = True
+    for chunk in chunks:
+        if not chunk:
+            continue
+        body = renderer.render(serializer.to_representation(chunk))[1:-1]
+        yield body if first else b',' + body
+        first = False
+
+    yield b']}'
+
+
+def streaming_json_response(key, chunks, serializer_class, context=None):
+    return StreamingHttpResponse(
+        iter_json_envelope(key, chunks, serializer_class, context),
+        content_type='application/json',
+    )
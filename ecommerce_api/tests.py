@@ -1,3 +1,1930 @@
-from django.test import TestCase
+import asyncio
+import copy
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.utils import load_backend
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .models import (
+    Product, Favorite, Cart, Poster, History, Review, Order, OrderItem, Notification, NotificationOutbox,
+    NotificationCounter, ProductRatingStats, UserProfile
+)
+from . import async_views
+from .pagination import KeysetPagination
+from .serializers import ProductSerializer
+from .search import InMemorySearchBackend, get_search_backend, normalize
+from .cache import CatalogueCache, catalogue_cache
+from .notifications import NotificationDispatcher, drain_outbox, notify, process_outbox
+from .importer import iter_rows, import_products
+from .carts import cart_extra
+from .history import HistoryBuffer, upsert_history
+from .events import LocalBroker, get_broker, load_notifications, notification_events
+from .dbpool import ConnectionPool, PoolTimeout, pool_stats
+
+
+# Pas de workers d'outbox démarrés par les requêtes des tests : ils liraient la
+# base de test en parallèle (NotificationDispatcherTests démarre les siens)
+no_notification_workers = override_settings(NOTIFICATION_WORKERS=0)
+
+
+def setUpModule():
+    no_notification_workers.enable()
+
+
+def tearDownModule():
+    no_notification_workers.disable()
+
+
+@override_settings(NOTIFICATION_DISPATCH_MODE='sync', HISTORY_WRITE_MODE='sync', IMAGE_PROCESSING_MODE='sync')
+class CatalogueTestCase(TestCase):
+    """
+    Les rollbacks de TestCase ne déclenchent pas les signaux : on repart d'un
+    index de recherche et d'un cache catalogue vides à chaque test. Les
+    notifications, l'historique et les déclinaisons d'images sont traités en
+    ligne, sans démarrer de thread de fond.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        get_search_backend().reset()
+        catalogue_cache.clear()
+
+
+def create_products(count, **kwargs):
+    defaults = {'price': '10.00', 'quantity': 5, 'supplier': 'Fournisseur', 'category': 'Divers'}
+    defaults.update(kwargs)
+    return Product.objects.bulk_create([
+        Product(product_name=f'Produit {i}', **defaults) for i in range(count)
+    ])
+
+
+class ProductListQueryCountTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+
+    def count_queries(self, url, params):
+        # `bulk_create` ne déclenche pas les signaux : on repart d'un index et d'un cache vides
+        get_search_backend().reset()
+        catalogue_cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), json.loads(body)
+
+    def test_search_query_count_does_not_grow_with_results(self):
+        products = create_products(3)
+        params = {'q': 'Produit', 'userId': self.user.id}
+        small, _ = self.count_queries(reverse('search_for_product'), params)
+
+        products += create_products(40)
+        Favorite.objects.create(userId=self.user.id, productId=products[0].id)
+        Cart.objects.create(userId=self.user.id, productId=products[1].id, cart='{}')
+        large, data = self.count_queries(reverse('search_for_product'), params)
+
+        self.assertEqual(small, large)
+        flags = {p['id']: (p['isFavourite'], p['isInCart']) for p in data['products']}
+        self.assertEqual(flags[products[0].id], (1, 0))
+        self.assertEqual(flags[products[1].id], (0, 1))
+        self.assertEqual(flags[products[2].id], (0, 0))
+
+    def test_product_lists_use_constant_queries(self):
+        products = create_products(25)
+        for product in products:
+            Favorite.objects.create(userId=self.user.id, productId=product.id)
+            Cart.objects.create(userId=self.user.id, productId=product.id, cart='{}')
+
+        params = {'userId': self.user.id}
+        for name in ('get_products', 'get_all_products', 'get_favorites', 'get_products_in_cart'):
+            with self.subTest(endpoint=name):
+                queries, _ = self.count_queries(reverse(name), params)
+                self.assertLess(queries, 10)
+
+
+class KeysetPaginationTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = create_products(25) + create_products(7, category='Sport')
+
+    def walk(self, url, params):
+        ids, cursor, pages = [], '', []
+        while cursor is not None:
+            data = self.client.get(url, {**params, 'cursor': cursor, 'page_size': 10}).json()
+            pages.append(data)
+            ids += [p['id'] for p in data['products']]
+            cursor = data['next']
+        return ids, pages
+
+    def test_cursor_walks_whole_catalogue_in_id_order(self):
+        ids, pages = self.walk(reverse('get_products'), {})
+        self.assertEqual(ids, sorted(p.id for p in self.products))
+        self.assertIsNone(pages[0]['previous'])
+
+        previous = self.client.get(reverse('get_products'), {'cursor': pages[2]['previous'], 'page_size': 10}).json()
+        self.assertEqual(previous['products'], pages[1]['products'])
+
+    def test_cursor_by_category(self):
+        ids, _ = self.walk(reverse('get_products_by_category'), {'category': 'Sport'})
+        self.assertEqual(ids, sorted(p.id for p in self.products if p.category == 'Sport'))
+
+    def test_page_parameter_still_supported(self):
+        data = self.client.get(reverse('get_products'), {'page': 2}).json()
+        self.assertEqual(len(data['products']), 10)
+        self.assertNotIn('next', data)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('get_products'), {'cursor': 'pas-un-curseur'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_forged_cursor_values(self):
+        def forge(*values):
+            return KeysetPagination().encode_cursor(values)
+
+        user = User.objects.create_user(username='client', password='secret')
+        cases = [
+            (reverse('get_products'), {}, forge('abc')),
+            (reverse('get_products'), {}, forge([1])),
+            (reverse('get_products_by_category'), {'category': 'Sport'}, forge('Sport', 'abc')),
+            (reverse('get_orders'), {'userId': user.id}, forge('pas-une-date', 1)),
+        ]
+        for url, params, cursor in cases:
+            with self.subTest(url=url, cursor=cursor):
+                response = self.client.get(url, {**params, 'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class StreamingAllProductsTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+
+    def test_stream_matches_regular_json_response(self):
+        user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        products = create_products(5)
+        Product.objects.create(product_name='Crème brûlée', price='3.50', supplier='Pâtisserie', category='Desserts')
+        Favorite.objects.create(userId=user.id, productId=products[2].id)
+
+        response = self.client.get(reverse('get_all_products'), {'userId': user.id})
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content)
+
+        expected = JSONRenderer().render({
+            'products': ProductSerializer(Product.objects.all(), many=True, context={'user_id': user.id}).data
+        })
+        self.assertEqual(body, expected)
+
+    def test_empty_catalogue(self):
+        response = self.client.get(reverse('get_all_products'))
+        self.assertEqual(b''.join(response.streaming_content), b'{"products":[]}')
+
+    @override_settings(PRODUCT_STREAM_CHUNK_SIZE=100)
+    def test_each_query_reads_one_chunk(self):
+        create_products(250)
+        response = self.client.get(reverse('get_all_products'))
+        with CaptureQueriesContext(connection) as ctx:
+            body = b''.join(response.streaming_content)
+        self.assertEqual(len(json.loads(body)['products']), 250)
+
+        # Chaque lecture est bornée côté serveur, quel que soit le pilote
+        selects = [q['sql'] for q in ctx.captured_queries if 'FROM "ecommerce_api_product"' in q['sql']]
+        self.assertEqual(len(selects), 3)
+        for sql in selects:
+            self.assertIn('LIMIT 100', sql)
+        self.assertIn('"ecommerce_api_product"."id" >', selects[1])
+
+    def peak_memory(self, count):
+        Product.objects.all().delete()
+        create_products(count)
+        tracemalloc.start()
+        try:
+            response = self.client.get(reverse('get_all_products'))
+            for _ in response.streaming_content:
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    @override_settings(PRODUCT_STREAM_CHUNK_SIZE=100)
+    def test_peak_memory_stays_flat(self):
+        small = self.peak_memory(300)
+        large = self.peak_memory(3000)
+        self.assertLess(large, small * 2)
+
+
+class ProductSearchTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.creme = Product.objects.create(
+            product_name='Crème hydratante', price='12.00', supplier='Beauté Naturelle', category='Beauté')
+        self.chaussure = Product.objects.create(
+            product_name='Chaussures de sport', price='59.90', supplier='Atelier Dakar', category='Sport')
+        self.ballon = Product.objects.create(
+            product_name='Ballon', price='15.00', supplier='Sport Plus', category='Sport')
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('search_for_product'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [p['id'] for p in response.json()['products']]
+
+    def test_normalize_folds_accents(self):
+        self.assertEqual(normalize('Crème Brûlée ÉTÉ'), 'creme brulee ete')
+
+    def test_accent_insensitive_prefix_match(self):
+        self.assertEqual(self.search('creme'), [self.creme.id])
+        self.assertEqual(self.search('CHAUS'), [self.chaussure.id])
+        self.assertEqual(self.search('beaute'), [self.creme.id])
+
+    def test_ranking_prefers_name_over_supplier(self):
+        self.assertEqual(self.search('sport'), [self.chaussure.id, self.ballon.id])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.search('sport ballon'), [self.ballon.id])
+        self.assertEqual(self.search('ballon creme'), [])
+
+    def test_index_follows_save_and_delete(self):
+        self.search('ballon')
+        self.ballon.product_name = 'Raquette'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ballon.save()
+        self.assertEqual(self.search('ballon'), [])
+        self.assertEqual(self.search('raquette'), [self.ballon.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ballon.delete()
+        self.assertEqual(self.search('raquette'), [])
+
+    def test_rolled_back_write_is_not_indexed(self):
+        self.search('ballon')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Product.objects.create(product_name='Raquette', price='9.00', supplier='Sport Plus', category='Sport')
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(get_search_backend().search('raquette'), [])
+
+    def test_pagination(self):
+        self.assertEqual(self.search('sport', page=1, page_size=1), [self.chaussure.id])
+        self.assertEqual(self.search('sport', page=2, page_size=1), [self.ballon.id])
+
+    def test_empty_query_returns_catalogue(self):
+        self.assertEqual(len(self.search('')), 3)
+
+    def test_backend_can_be_used_standalone(self):
+        backend = InMemorySearchBackend()
+        self.assertEqual(backend.search('hydratante'), [self.creme.id])
+
+
+class SearchIndexRefreshTests(CatalogueTestCase):
+    def test_index_catches_up_with_other_processes(self):
+        product = Product.objects.create(product_name='Tapis', price='10.00', supplier='Fournisseur', category='Divers')
+        # Index d'un autre worker : les signaux de ce processus ne le mettent pas à jour
+        backend = InMemorySearchBackend()
+        self.assertEqual(backend.search('tapis'), [product.id])
+
+        other = Product.objects.create(
+            product_name='Tapis de yoga', price='20.00', supplier='Fournisseur', category='Sport')
+        # Aucune requête par recherche avant le délai, même après des écritures
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.search('yoga'), [])
+        with override_settings(SEARCH_INDEX_REFRESH_INTERVAL=0):
+            self.assertEqual(backend.search('yoga'), [other.id])
+
+            product.delete()
+            self.assertEqual(backend.search('tapis'), [other.id])
+
+            Product.objects.filter(id=other.id).update(product_name='Natte', updated_at=timezone.now())
+            self.assertEqual(backend.search('natte'), [other.id])
+
+
+class CatalogueCacheTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.product = create_products(1)[0]
+
+    def test_product_save_invalidates_entries(self):
+        url = reverse('get_products')
+        self.assertEqual(self.client.get(url).json()['products'][0]['product_name'], 'Produit 0')
+
+        version = catalogue_cache.get_version('products')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.product_name = 'Produit renommé'
+            self.product.save()
+            # Rien n'est invalidé avant le commit : une lecture concurrente relirait l'ancienne ligne
+            self.assertEqual(catalogue_cache.get_version('products'), version)
+
+        self.assertEqual(self.client.get(url).json()['products'][0]['product_name'], 'Produit renommé')
+
+    def test_all_products_streamed_without_caching(self):
+        url = reverse('get_all_products')
+        body = b''.join(self.client.get(url).streaming_content)
+        self.assertEqual(json.loads(body)['products'][0]['id'], self.product.id)
+        # Les lots ne sont pas recopiés dans le cache de chaque worker : relus à chaque fois
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(b''.join(self.client.get(url).streaming_content), body)
+        self.assertTrue(any('ecommerce_api_product' in query['sql'] for query in ctx.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertEqual(b''.join(self.client.get(url).streaming_content), b'{"products":[]}')
+
+    def test_posters_invalidated_by_signals(self):
+        url = reverse('get_posters')
+        self.assertEqual(self.client.get(url).json()['posters'], [])
+        # Sans image : pas de déclinaisons à générer au commit
+        with self.captureOnCommitCallbacks(execute=True):
+            Poster.objects.create(title='Soldes', image='')
+        self.assertEqual([p['title'] for p in self.client.get(url).json()['posters']], ['Soldes'])
+
+    def test_single_flight_under_concurrency(self):
+        cache = CatalogueCache(poll_interval=0.001)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'valeur'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('cle', loader)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['valeur'] * 10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['loads'], 1)
+
+    def test_stats_endpoint(self):
+        for _ in range(2):
+            catalogue_cache.get_list('products', 'stats', lambda: [self.product.id])
+        stats = self.client.get(reverse('catalogue_cache_stats')).json()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+
+class IndexUsageTests(TestCase):
+    """Vérifie via EXPLAIN que les requêtes chaudes utilisent les index dédiés."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_reviews_by_product(self):
+        self.assertUsesIndex(
+            Review.objects.filter(productId=1).order_by('-created_at'), 'review_product_created_idx')
+
+    def test_orders_by_user(self):
+        self.assertUsesIndex(Order.objects.filter(userId=1).order_by('-created_at'), 'order_user_created_idx')
+
+    def test_unread_notifications(self):
+        queryset = Notification.objects.filter(user=self.user, is_read=False)
+        if connection.vendor == 'mysql':
+            # Colonne `key` : l'index retenu, pas seulement les candidats (`possible_keys`)
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN {sql}', params)
+                columns = [column[0] for column in cursor.description]
+                keys = [dict(zip(columns, row))['key'] for row in cursor.fetchall()]
+            self.assertIn('notif_user_read_created_idx', keys)
+        else:
+            # SQLite ne sait pas utiliser `NOT is_read` dans un index : on vérifie seulement
+            # que la recherche passe par un index (user, ...) et non par un parcours de table
+            self.assertUsesIndex(queryset, 'USING INDEX notif_user_')
+
+    def test_notifications_by_cursor(self):
+        self.assertUsesIndex(
+            Notification.objects.filter(user=self.user).order_by('-created_at', '-id'), 'notif_user_created_idx')
+
+    def test_history_by_user(self):
+        self.assertUsesIndex(History.objects.filter(userId=1).order_by('-viewed_at'), 'history_user_viewed_idx')
+
+
+class VirtualRelationTests(TestCase):
+    def test_select_related_product_and_user(self):
+        user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        product = create_products(1)[0]
+        Favorite.objects.create(userId=user.id, productId=product.id)
+        Favorite.objects.create(userId=user.id, productId=product.id + 1000)
+
+        with self.assertNumQueries(1):
+            favorites = list(Favorite.objects.select_related('product', 'user').order_by('id'))
+            self.assertEqual(favorites[0].product, product)
+            self.assertEqual(favorites[0].user, user)
+            # Ligne orpheline : conservée, relation vide
+            self.assertIsNone(favorites[1].product)
+
+
+class OrderProductTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+
+    def order(self, lines, **extra):
+        payload = {
+            'userId': self.user.id, 'shippingId': 1, 'paymentMethod': 'card',
+            'products': [{'productId': p.id, 'quantity': q, 'price': '0.01'} for p, q in lines],
+            **extra,
+        }
+        return self.client.post(reverse('order_product'), payload, format='json')
+
+    @override_settings(NOTIFICATION_DISPATCH_MODE='async')
+    def test_bulk_order_uses_constant_queries(self):
+        products = create_products(30)
+        for product in products:
+            Cart.objects.create(userId=self.user.id, productId=product.id, cart='{}')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.order([(p, 2) for p in products], totalPrice='1.00')
+        self.assertEqual(response.status_code, 201)
+        self.assertLess(len(ctx.captured_queries), 15)
+
+        order = Order.objects.get()
+        # Total calculé côté serveur : 30 produits x 2 x 10.00
+        self.assertEqual(order.total_price, 600)
+        self.assertEqual(order.items.count(), 30)
+        self.assertFalse(Cart.objects.filter(userId=self.user.id).exists())
+        self.assertEqual(set(Product.objects.values_list('quantity', flat=True)), {3})
+
+    def test_insufficient_stock_rolls_back(self):
+        available, scarce = create_products(2)
+        scarce.quantity = 1
+        scarce.save()
+        Cart.objects.create(userId=self.user.id, productId=available.id, cart='{}')
+
+        response = self.order([(available, 1), (scarce, 2)])
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertTrue(Cart.objects.exists())
+        self.assertEqual(Product.objects.get(id=available.id).quantity, 5)
+
+    def test_stock_change_invalidates_catalogue_cache(self):
+        product = create_products(1)[0]
+        url = reverse('get_products')
+        self.assertEqual(self.client.get(url).json()['products'][0]['quantity'], 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order([(product, 2)])
+        self.assertEqual(self.client.get(url).json()['products'][0]['quantity'], 3)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentOrderTests(TransactionTestCase):
+    def test_last_units_are_sold_once(self):
+        product = create_products(1, quantity=3)[0]
+        users = [
+            User.objects.create_user(username=f'client{i}', email=f'client{i}@example.com', password='secret')
+            for i in range(12)
+        ]
+        statuses = []
+
+        def buy(user):
+            try:
+                response = APIClient().post(reverse('order_product'), {
+                    'userId': user.id, 'shippingId': 1,
+                    'products': [{'productId': product.id, 'quantity': 1}],
+                }, format='json')
+                statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses.count(201), 3)
+        self.assertEqual(statuses.count(409), 9)
+        self.assertEqual(Product.objects.get(id=product.id).quantity, 0)
+        self.assertEqual(OrderItem.objects.count(), 3)
+
+
+class GetOrdersTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+
+    def create_orders(self, count, order_status='pending'):
+        for _ in range(count):
+            order = Order.objects.create(
+                userId=self.user.id, shippingId=1, payment_method='card', total_price='20.00', status=order_status)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, productId=1, quantity=1, price='10.00'),
+                OrderItem(order=order, productId=2, quantity=1, price='10.00'),
+            ])
+
+    def test_query_count_is_constant(self):
+        self.create_orders(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('get_orders'), {'userId': self.user.id})
+        self.create_orders(40)
+        with CaptureQueriesContext(connection) as large:
+            data = self.client.get(reverse('get_orders'), {'userId': self.user.id}).json()
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(len(data['orders']), 42)
+        self.assertEqual(len(data['orders'][0]['items']), 2)
+
+    def test_status_and_since_filters(self):
+        self.create_orders(2)
+        checkpoint = timezone.now()
+        self.create_orders(1, order_status='shipped')
+
+        params = {'userId': self.user.id}
+        self.assertEqual(len(self.client.get(reverse('get_orders'), {**params, 'status': 'shipped'}).json()['orders']), 1)
+        since = self.client.get(reverse('get_orders'), {**params, 'since': checkpoint.isoformat()}).json()
+        self.assertEqual([o['status'] for o in since['orders']], ['shipped'])
+        response = self.client.get(reverse('get_orders'), {**params, 'since': 'hier'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination(self):
+        self.create_orders(5)
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        ids, cursor = [], ''
+        while cursor is not None:
+            data = self.client.get(reverse('get_orders'), {'userId': self.user.id, 'cursor': cursor, 'page_size': 2}).json()
+            ids += [o['id'] for o in data['orders']]
+            cursor = data['next']
+        self.assertEqual(ids, expected)
+
+
+class NotificationPipelineTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.product = Product.objects.create(
+            product_name='Thé vert', price='4.00', supplier='Fournisseur', category='Boissons')
+
+    @override_settings(NOTIFICATION_DISPATCH_MODE='async')
+    def test_request_only_writes_outbox(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                reverse('add_favorite'), {'userId': self.user.id, 'productId': self.product.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        tables = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('auth_user', tables)
+        self.assertNotIn('ecommerce_api_product', tables)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationOutbox.objects.get().event, 'favorite_added')
+
+        self.assertEqual(drain_outbox(), 1)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.message, "Le produit 'Thé vert' a été ajouté à vos favoris.")
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_sync_mode_for_every_endpoint(self):
+        self.client.post(reverse('add_favorite'), {'userId': self.user.id, 'productId': self.product.id}, format='json')
+        self.client.post(reverse('add_review'), {
+            'userId': self.user.id, 'productId': self.product.id, 'rating': 4, 'review': 'Très bon'}, format='json')
+        self.client.post(reverse('add_shipping_address'), {
+            'userId': self.user.id, 'name': 'Awa', 'address': 'Rue 10', 'city': 'Dakar', 'country': 'Sénégal',
+            'postal_code': '10200', 'phone': '770000000'}, format='json')
+        self.client.post(reverse('order_product'), {
+            'userId': self.user.id, 'shippingId': 1,
+            'products': [{'productId': self.product.id, 'quantity': 0}]}, format='json')
+        self.product.quantity = 5
+        self.product.save()
+        self.client.post(reverse('order_product'), {
+            'userId': self.user.id, 'shippingId': 1,
+            'products': [{'productId': self.product.id, 'quantity': 1}]}, format='json')
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list('type', flat=True)), ['account', 'general', 'general', 'order'])
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    @override_settings(NOTIFICATION_DISPATCH_MODE='async')
+    def test_duplicate_events_are_coalesced(self):
+        for _ in range(3):
+            notify(self.user.id, 'favorite_added', product_id=self.product.id)
+        notify(self.user.id, 'address_added', address_id=7)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(process_outbox(), 4)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "notifications"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_expired_claims_are_recovered(self):
+        # Événement réservé par un worker mort il y a longtemps
+        NotificationOutbox.objects.create(
+            userId=self.user.id, event='address_added', payload={'address_id': 1},
+            claimed_at=timezone.now() - timedelta(hours=1), claim_token='mort')
+        # Événement réservé à l'instant par un worker vivant
+        NotificationOutbox.objects.create(
+            userId=self.user.id, event='address_added', payload={'address_id': 2},
+            claimed_at=timezone.now(), claim_token='vivant')
+
+        self.assertEqual(process_outbox(), 1)
+        self.assertEqual(Notification.objects.get().data, {'address_id': 1})
+        self.assertEqual(NotificationOutbox.objects.get().claim_token, 'vivant')
+
+
+class NotificationDispatcherTests(TransactionTestCase):
+    @override_settings(NOTIFICATION_WORKERS=1, NOTIFICATION_POLL_INTERVAL=60)
+    def test_worker_drains_outbox_when_woken(self):
+        user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        NotificationOutbox.objects.create(userId=user.id, event='address_added', payload={'address_id': 1})
+
+        dispatcher = NotificationDispatcher()
+        try:
+            dispatcher.start()
+            time.sleep(0.2)
+            NotificationOutbox.objects.create(userId=user.id, event='address_added', payload={'address_id': 2})
+            dispatcher.wake()
+            # Le worker traite l'événement puis attend le prochain réveil
+            time.sleep(0.5)
+            self.assertEqual(Notification.objects.filter(user=user).count(), 2)
+            self.assertFalse(NotificationOutbox.objects.exists())
+        finally:
+            dispatcher.stop()
+
+    @override_settings(NOTIFICATION_WORKERS=1, NOTIFICATION_POLL_INTERVAL=60)
+    def test_first_request_drains_pending_events(self):
+        # Événement laissé par un processus arrêté avant de le traiter
+        user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        NotificationOutbox.objects.create(userId=user.id, event='address_added', payload={'address_id': 1})
+
+        dispatcher = NotificationDispatcher()
+        with mock.patch('ecommerce_api.notifications.dispatcher', dispatcher):
+            try:
+                self.client.get(reverse('get_products'))
+                time.sleep(0.5)
+                self.assertEqual(Notification.objects.filter(user=user).count(), 1)
+            finally:
+                dispatcher.stop()
+
+    @override_settings(NOTIFICATION_WORKERS=1, NOTIFICATION_POLL_INTERVAL=60)
+    def test_stop_flushes_pending_events(self):
+        user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        dispatcher = NotificationDispatcher()
+        dispatcher.start()
+        time.sleep(0.1)
+        NotificationOutbox.objects.create(userId=user.id, event='address_added', payload={'address_id': 1})
+        dispatcher.stop()
+        self.assertEqual(Notification.objects.filter(user=user).count(), 1)
+
+
+class NotificationCounterTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.client.force_authenticate(self.user)
+        for i in range(25):
+            notify(self.user.id, 'address_added', address_id=i)
+
+    def assertCounter(self, total, unread):
+        counter = NotificationCounter.objects.get(user=self.user)
+        self.assertEqual((counter.total, counter.unread), (total, unread))
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), total)
+        self.assertEqual(Notification.objects.filter(user=self.user, is_read=False).count(), unread)
+
+    def test_counters_follow_every_write(self):
+        self.assertCounter(25, 25)
+
+        notifications = list(Notification.objects.filter(user=self.user).order_by('id'))
+        self.client.put(reverse('mark-as-read', args=[notifications[0].id]))
+        # Relire une notification déjà lue ne décrémente pas deux fois
+        self.client.put(reverse('mark-as-read', args=[notifications[0].id]))
+        self.assertCounter(25, 24)
+
+        self.client.delete(reverse('delete-notification', args=[notifications[0].id]))
+        self.client.delete(reverse('delete-notification', args=[notifications[1].id]))
+        self.assertCounter(23, 23)
+
+        response = self.client.post(reverse('mark-all-read'))
+        self.assertEqual(response.data['message'], '23 notifications marquées comme lues')
+        self.assertCounter(23, 0)
+
+    def test_list_serves_counts_without_count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('notification-list'), {'userId': self.user.id, 'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql']])
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+        self.assertEqual(response.data['total_pages'], 2)
+        self.assertEqual(response.data['current_page'], 2)
+        self.assertEqual(len(response.data['notifications']), 5)
+        self.assertEqual((response.data['total_count'], response.data['unread_count']), (25, 25))
+
+        # Page hors limites : dernière page, comme `Paginator.get_page`
+        response = self.client.get(reverse('notification-list'), {'userId': self.user.id, 'page': 99})
+        self.assertEqual(response.data['current_page'], 2)
+
+    def test_list_by_cursor(self):
+        url = reverse('notification-list')
+        first = self.client.get(url, {'userId': self.user.id, 'cursor': ''}).data
+        second = self.client.get(url, {'userId': self.user.id, 'cursor': first['next']}).data
+
+        ids = [n['id'] for n in first['notifications'] + second['notifications']]
+        expected = list(
+            Notification.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertIsNone(second['next'])
+        self.assertEqual(second['total_count'], 25)
+
+    def test_missing_counter_is_initialised_on_read(self):
+        NotificationCounter.objects.all().delete()
+        response = self.client.get(reverse('notification-list'), {'userId': self.user.id})
+        self.assertEqual((response.data['total_count'], response.data['unread_count']), (25, 25))
+        self.assertCounter(25, 25)
+
+    def test_reconcile_repairs_drift(self):
+        other = User.objects.create_user(username='autre', email='autre@example.com', password='secret')
+        NotificationCounter.objects.filter(user=self.user).update(total=3, unread=40)
+        NotificationCounter.objects.create(user=other, total=2, unread=2)
+
+        out = io.StringIO()
+        call_command('reconcile_notification_counters', '--dry-run', stdout=out)
+        self.assertIn('0 compteur(s) corrigé(s)', out.getvalue())
+
+        call_command('reconcile_notification_counters', '--chunk-size', '1', stdout=io.StringIO())
+        self.assertCounter(25, 25)
+        self.assertEqual(NotificationCounter.objects.get(user=other).total, 0)
+
+
+class NotificationPollingTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            notify(self.user.id, 'address_added', address_id=i)
+        self.latest_id = Notification.objects.filter(user=self.user).latest('id').id
+
+    def test_status_and_not_modified(self):
+        url = reverse('notification-status')
+        response = self.client.get(url, {'userId': self.user.id})
+        self.assertEqual(response.data, {'unread_count': 3, 'total_count': 3, 'latest_id': self.latest_id})
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'userId': self.user.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        # Une lecture change l'état, donc l'ETag
+        self.client.put(reverse('mark-as-read', args=[self.latest_id]))
+        response = self.client.get(url, {'userId': self.user.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['unread_count'], 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_status_for_unknown_user(self):
+        response = self.client.get(reverse('notification-status'), {'userId': 999})
+        self.assertEqual(response.status_code, 403)
+
+    def test_latest_id_is_a_high_water_mark(self):
+        self.client.delete(reverse('delete-notification', args=[self.latest_id]))
+        response = self.client.get(reverse('notification-status'), {'userId': self.user.id})
+        self.assertEqual((response.data['total_count'], response.data['latest_id']), (2, self.latest_id))
+
+    def test_since_id_returns_only_new_notifications(self):
+        url = reverse('notification-list')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'userId': self.user.id, 'since_id': self.latest_id})
+        self.assertEqual(response.data['notifications'], [])
+        self.assertEqual(response.data['since_id'], self.latest_id)
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "notifications"' in q['sql']])
+
+        notify(self.user.id, 'address_added', address_id=10)
+        notify(self.user.id, 'address_added', address_id=11)
+        response = self.client.get(url, {'userId': self.user.id, 'since_id': self.latest_id})
+        ids = [n['id'] for n in response.data['notifications']]
+        self.assertEqual(len(ids), 2)
+        self.assertTrue(all(i > self.latest_id for i in ids))
+        self.assertEqual(response.data['since_id'], max(ids))
+        self.assertEqual(response.data['unread_count'], 5)
+
+        response = self.client.get(
+            url, {'userId': self.user.id, 'since_id': self.latest_id}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_since_id_etag_depends_on_since_id(self):
+        url = reverse('notification-list')
+        first_id = Notification.objects.filter(user=self.user).earliest('id').id
+        response = self.client.get(url, {'userId': self.user.id, 'since_id': 0})
+        etag = response['ETag']
+
+        # Même état, autre since_id (suite de `has_more`) : la réponse n'est pas celle déjà reçue
+        response = self.client.get(url, {'userId': self.user.id, 'since_id': first_id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['notifications']), 2)
+
+        status_etag = self.client.get(reverse('notification-status'), {'userId': self.user.id})['ETag']
+        self.assertNotEqual(status_etag, etag)
+        response = self.client.get(url, {'userId': self.user.id, 'since_id': 0}, HTTP_IF_NONE_MATCH=status_etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(NOTIFICATION_DISPATCH_MODE='sync')
+class NotificationStreamTests(TransactionTestCase):
+    """
+    Les flux lisent la base depuis les threads partagés : les données du test
+    doivent être validées pour y être visibles.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        for i in range(3):
+            notify(self.user.id, 'address_added', address_id=i)
+        self.ids = list(Notification.objects.filter(user=self.user).order_by('id').values_list('id', flat=True))
+
+    def create_notification(self):
+        # Publication au commit, comme dans les workers
+        notify(self.user.id, 'order_placed', order_id=42, total='10.00', status='pending')
+        return Notification.objects.filter(user=self.user).latest('id').id
+
+    async def test_resume_push_and_heartbeat(self):
+        events = notification_events(self.user.id, self.ids[0], heartbeat=0.05)
+        try:
+            self.assertEqual(await anext(events), 'retry: 5000\n\n')
+            # Rattrapage depuis Last-Event-ID
+            self.assertTrue((await anext(events)).startswith(f'id: {self.ids[1]}\nevent: notification\ndata: '))
+            self.assertTrue((await anext(events)).startswith(f'id: {self.ids[2]}\n'))
+
+            self.assertEqual(await anext(events), ': ping\n\n')
+
+            new_id = await sync_to_async(self.create_notification)()
+            block = await anext(events)
+            self.assertTrue(block.startswith(f'id: {new_id}\n'))
+            data = json.loads(block.split('data: ', 1)[1])
+            self.assertEqual(data['message'], 'Votre commande #42 a été créée avec succès.')
+        finally:
+            await events.aclose()
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    async def test_stream_endpoint(self):
+        url = reverse('notification-stream')
+        response = await self.async_client.get(url, {'userId': 999})
+        self.assertEqual(response.status_code, 403)
+
+        response = await self.async_client.get(url, {'userId': self.user.id}, headers={'Last-Event-ID': str(self.ids[1])})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+        self.assertTrue((await anext(chunks)).startswith(f'id: {self.ids[2]}\n'.encode()))
+        await chunks.aclose()
+
+    @override_settings(NOTIFICATION_STREAM_DB_THREADS=2)
+    def test_idle_streams_do_not_hold_threads(self):
+        application = get_asgi_application()
+        path = reverse('notification-stream')
+
+        async def stream(caught_up, disconnect):
+            request_sent = False
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.body' and message.get('body', b'').startswith(b'id: '):
+                    if not caught_up.done():
+                        caught_up.set_result(None)
+
+            await application({
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+                'query_string': f'userId={self.user.id}&last_event_id=0'.encode(),
+                'headers': [(b'host', b'localhost')], 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            }, receive, send)
+
+        async def scenario():
+            # Boucle sans async_to_sync autour, comme celle d'un serveur ASGI
+            disconnect = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            caught_up = [loop.create_future() for _ in range(30)]
+            tasks = [asyncio.create_task(stream(future, disconnect)) for future in caught_up]
+            try:
+                await asyncio.wait_for(asyncio.gather(*caught_up), 10)
+                await asyncio.sleep(0.1)
+                return threading.active_count()
+            finally:
+                disconnect.set()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        threads = threading.active_count()
+        # Seuls les threads partagés des lectures, pas un thread par flux
+        self.assertLessEqual(asyncio.run(scenario()) - threads, 2)
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    def test_stream_refused_under_wsgi(self):
+        response = self.client.get(reverse('notification-stream'), {'userId': self.user.id})
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+
+    def test_local_broker_coalesces_signals(self):
+        async def scenario():
+            broker = LocalBroker()
+            subscription = broker.subscribe('user:1')
+            for latest_id in (1, 2, 3):
+                broker.publish('user:1', {'latest_id': latest_id})
+            first = await subscription.get(0.1)
+            second = await subscription.get(0.01)
+            subscription.close()
+            return first, second, broker.subscriber_count()
+
+        self.assertEqual(asyncio.run(scenario()), ({'latest_id': 3}, None, 0))
+
+
+class NotificationStreamConnectionTests(TransactionTestCase):
+    def test_poll_releases_connection(self):
+        user = User.objects.create_user(username='client', password='secret')
+        Notification.objects.create(user=user, title='Titre', message='Message')
+        with mock.patch.object(connection, 'close', wraps=connection.close) as close:
+            self.assertEqual(len(load_notifications(user.id, 0, 10)), 1)
+        close.assert_called_once_with()
+
+
+class CartSummaryTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.tea = Product.objects.create(
+            product_name='Thé', price='4.50', quantity=10, supplier='Fournisseur', category='Boissons')
+        self.coffee = Product.objects.create(
+            product_name='Café', price='7.25', quantity=1, supplier='Fournisseur', category='Boissons')
+        for product, quantity in ((self.tea, 3), (self.coffee, 2)):
+            self.client.post(reverse('add_to_cart'), {
+                'userId': self.user.id, 'productId': product.id, 'quantity': quantity}, format='json')
+
+    def get_summary(self):
+        response = self.client.get(reverse('get_cart_summary'), {'userId': self.user.id})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_summary_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            summary = self.get_summary()
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        tea, coffee = summary['lines']
+        self.assertEqual((tea['quantity'], tea['unit_price'], tea['line_total']), (3, '4.50', '13.50'))
+        self.assertTrue(tea['in_stock'])
+        self.assertEqual((coffee['line_total'], coffee['available_quantity']), ('14.50', 1))
+        self.assertFalse(coffee['in_stock'])
+        self.assertEqual(summary['grand_total'], '28.00')
+        self.assertEqual((summary['item_count'], summary['total_quantity']), (2, 5))
+        self.assertFalse(summary['all_in_stock'])
+
+        # Deuxième lecture servie par le cache
+        with CaptureQueriesContext(connection) as ctx:
+            self.get_summary()
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_cart_writes_invalidate_summary(self):
+        self.get_summary()
+        self.client.post(reverse('add_to_cart'), {
+            'userId': self.user.id, 'productId': self.coffee.id, 'quantity': 1}, format='json')
+        self.assertEqual(self.get_summary()['grand_total'], '20.75')
+
+        self.client.delete(
+            reverse('remove_from_cart') + f'?userId={self.user.id}&productId={self.coffee.id}')
+        self.assertEqual(self.get_summary()['grand_total'], '13.50')
+
+        # Changement de prix : la version des produits fait partie de la clé
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tea.price = '5.00'
+            self.tea.save()
+        self.assertEqual(self.get_summary()['grand_total'], '15.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('order_product'), {
+                'userId': self.user.id, 'shippingId': 1,
+                'products': [{'productId': self.tea.id, 'quantity': 3}]}, format='json')
+        self.assertEqual(self.get_summary()['lines'], [])
+
+    def test_deleted_product_line(self):
+        Product.objects.filter(id=self.coffee.id).delete()
+        summary = self.get_summary()
+        line = summary['lines'][1]
+        self.assertEqual((line['unit_price'], line['line_total'], line['in_stock']), (None, None, False))
+        self.assertEqual(summary['grand_total'], '13.50')
+
+
+class CartBatchTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.products = create_products(4)
+        self.client.post(reverse('add_to_cart'), {
+            'userId': self.user.id, 'productId': self.products[0].id, 'quantity': 1}, format='json')
+        self.client.post(reverse('add_to_cart'), {
+            'userId': self.user.id, 'productId': self.products[1].id, 'quantity': 1}, format='json')
+
+    def batch(self, operations, user_id=None):
+        return self.client.post(reverse('update_cart_batch'), {
+            'userId': user_id or self.user.id, 'operations': operations}, format='json')
+
+    def test_batch_upserts_and_removes(self):
+        p0, p1, p2, p3 = self.products
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.batch([
+                    {'productId': p0.id, 'quantity': 4},
+                    {'productId': p1.id, 'quantity': 0},
+                    {'productId': p2.id, 'quantity': 2},
+                    {'productId': p3.id, 'quantity': 1},
+                    # Dernière opération gagnante
+                    {'productId': p3.id, 'quantity': 3},
+                ])
+        self.assertEqual(response.status_code, 200)
+
+        writes = [q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(
+            dict(Cart.objects.filter(userId=self.user.id).values_list('productId', 'quantity')),
+            {p0.id: 4, p2.id: 2, p3.id: 3})
+        self.assertEqual([line['productId'] for line in response.data['lines']], [p0.id, p2.id, p3.id])
+        self.assertEqual(response.data['grand_total'], '90.00')
+
+    def test_unknown_product_rejects_whole_batch(self):
+        response = self.batch([
+            {'productId': self.products[2].id, 'quantity': 1}, {'productId': 999999, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['productIds'], [999999])
+        self.assertEqual(Cart.objects.filter(userId=self.user.id).count(), 2)
+
+    def test_invalid_payloads(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch([{'productId': self.products[0].id, 'quantity': -1}]).status_code, 400)
+        self.assertEqual(self.batch([{'productId': self.products[0].id, 'quantity': 1}], user_id=999).status_code, 400)
+
+    def test_payload_copy_is_optional(self):
+        self.assertIsNone(Cart.objects.filter(userId=self.user.id).first().cart)
+        with self.settings(CART_STORE_PAYLOAD=True):
+            self.client.post(reverse('add_to_cart'), {
+                'userId': self.user.id, 'productId': self.products[0].id, 'quantity': 2}, format='json')
+        cart = Cart.objects.get(userId=self.user.id, productId=self.products[0].id)
+        self.assertEqual(json.loads(cart.cart)['quantity'], 2)
+
+
+class CartPayloadTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.product = create_products(1)[0]
+
+    def test_add_to_cart_keeps_only_extra_fields(self):
+        self.client.post(reverse('add_to_cart'), {
+            'userId': self.user.id, 'productId': self.product.id, 'quantity': 2,
+            'note': 'cadeau', 'options': {'taille': 'M'}}, format='json')
+        cart = Cart.objects.get(userId=self.user.id)
+        self.assertIsNone(cart.cart)
+        self.assertEqual(cart.extra, {'note': 'cadeau'})
+
+    def test_extra_is_bounded(self):
+        extra = cart_extra({f'champ{i}': 'x' * 100 for i in range(30)})
+        self.assertLessEqual(len(json.dumps(extra)), 1024)
+        self.assertIsNone(cart_extra({'userId': 1, 'productId': 2, 'quantity': 3}))
+
+    def test_strip_command(self):
+        legacy = [
+            Cart(userId=self.user.id, productId=i, quantity=1,
+                 cart=json.dumps({'userId': self.user.id, 'productId': i, 'quantity': 1, **({'note': 'n'} if i == 2 else {})}))
+            for i in range(1, 6)
+        ]
+        legacy.append(Cart(userId=self.user.id, productId=6, quantity=1, cart='pas du json'))
+        Cart.objects.bulk_create(legacy)
+
+        out = io.StringIO()
+        call_command('strip_cart_payloads', '--chunk-size', '2', stdout=out)
+        self.assertIn('6 ligne(s) allégée(s)', out.getvalue())
+        self.assertIn('Taille de ecommerce_api_cart', out.getvalue())
+        self.assertFalse(Cart.objects.filter(cart__isnull=False).exists())
+        self.assertEqual(list(Cart.objects.filter(extra__isnull=False).values_list('productId', 'extra')), [(2, {'note': 'n'})])
+
+
+class HistoryBufferTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.products = create_products(3)
+        # Tampon sans thread de fond : les écritures sont déclenchées par le test
+        self.buffer = HistoryBuffer()
+        self.buffer.start = lambda: None
+
+    def view(self, product):
+        return self.client.post(
+            reverse('add_to_history'), {'userId': self.user.id, 'productId': product.id}, format='json')
+
+    def test_sync_mode_updates_existing_entry(self):
+        self.assertEqual(self.view(self.products[0]).status_code, 200)
+        first = History.objects.get().viewed_at
+        # Revoir le même produit met à jour l'horodatage (le validateur d'unicité le refusait)
+        self.assertEqual(self.view(self.products[0]).status_code, 200)
+        self.assertEqual(History.objects.count(), 1)
+        self.assertGreater(History.objects.get().viewed_at, first)
+
+    @override_settings(HISTORY_WRITE_MODE='buffered')
+    def test_views_are_coalesced_into_one_upsert(self):
+        History.objects.create(userId=self.user.id, productId=self.products[0].id,
+                               viewed_at=timezone.now() - timedelta(days=1))
+        with mock.patch('ecommerce_api.views.history_buffer', self.buffer):
+            with CaptureQueriesContext(connection) as ctx:
+                for i in range(60):
+                    self.assertEqual(self.view(self.products[i % 3]).status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'ecommerce_api_history' in q['sql']])
+        self.assertEqual(self.buffer.pending_count(), 3)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.buffer.flush(), 3)
+        # Un seul upsert (plus la vérification du plafond des utilisateurs, en lecture)
+        writes = [q for q in ctx.captured_queries if not q['sql'].startswith('SELECT')]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(History.objects.filter(userId=self.user.id).count(), 3)
+        self.assertGreater(History.objects.get(productId=self.products[0].id).viewed_at,
+                           timezone.now() - timedelta(minutes=1))
+
+    @override_settings(HISTORY_WRITE_MODE='buffered')
+    def test_latest_view_wins_and_failed_flush_is_retried(self):
+        now = timezone.now()
+        product_id = self.products[0].id
+        self.buffer.record(self.user.id, product_id, now)
+        self.buffer.record(self.user.id, product_id, now - timedelta(minutes=5))
+
+        with mock.patch('ecommerce_api.history.upsert_history', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertEqual(self.buffer.pending_count(), 1)
+
+        # Arrêt du processus : le tampon est vidé
+        self.buffer.stop()
+        self.assertEqual(History.objects.get(productId=product_id).viewed_at, now)
+
+
+class HistoryRetentionTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.products = create_products(8)
+        now = timezone.now()
+        # products[0] vu en dernier
+        History.objects.bulk_create([
+            History(userId=self.user.id, productId=p.id, viewed_at=now - timedelta(days=i))
+            for i, p in enumerate(self.products)
+        ])
+
+    def history_ids(self):
+        return list(History.objects.filter(userId=self.user.id).order_by('-viewed_at').values_list('productId', flat=True))
+
+    @override_settings(HISTORY_MAX_ENTRIES_PER_USER=5)
+    def test_cap_is_enforced_on_write(self):
+        self.client.post(reverse('add_to_history'), {
+            'userId': self.user.id, 'productId': self.products[7].id}, format='json')
+        ids = [p.id for p in self.products]
+        self.assertEqual(self.history_ids(), [ids[7]] + ids[:4])
+
+    @override_settings(HISTORY_MAX_ENTRIES_PER_USER=5)
+    def test_flush_checks_cap_in_one_query(self):
+        users = [User.objects.create_user(username=f'client{i}', password='secret') for i in range(20)]
+        buffer = HistoryBuffer()
+        buffer.start = lambda: None
+        with override_settings(HISTORY_WRITE_MODE='buffered'):
+            for user in users:
+                buffer.record(user.id, self.products[0].id)
+            buffer.record(self.user.id, self.products[7].id, timezone.now())
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(buffer.flush(), 21)
+        # Upsert + recherche groupée des utilisateurs au-delà du plafond + plafond du seul utilisateur concerné
+        self.assertEqual(len(ctx.captured_queries), 4)
+        ids = [p.id for p in self.products]
+        self.assertEqual(self.history_ids(), [ids[7]] + ids[:4])
+
+    def test_prune_command(self):
+        other = User.objects.create_user(username='autre', email='autre@example.com', password='secret')
+        History.objects.create(userId=other.id, productId=self.products[0].id)
+
+        out = io.StringIO()
+        call_command('prune_history', '--days', '6', '--max-per-user', '3', '--chunk-size', '1', stdout=out)
+        self.assertIn('2 consultation(s) de plus de 6 jour(s)', out.getvalue())
+        self.assertIn('3 consultation(s) au-delà de 3', out.getvalue())
+        self.assertEqual(self.history_ids(), [p.id for p in self.products[:3]])
+        self.assertEqual(History.objects.filter(userId=other.id).count(), 1)
+
+    def test_history_is_paginated_in_sql(self):
+        Product.objects.filter(id=self.products[1].id).delete()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('get_products_in_history'), {
+                'userId': self.user.id, 'page': 2, 'page_size': 3})
+        self.assertEqual(
+            [p['id'] for p in response.data['history']], [p.id for p in self.products[4:7]])
+        # COUNT + page jointe + favoris/panier + agrégats d'avis en lot
+        self.assertEqual(len(ctx.captured_queries), 5)
+        self.assertTrue(any('LIMIT 3 OFFSET 3' in q['sql'] for q in ctx.captured_queries))
+
+
+class HistoryPurgeTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.other = User.objects.create_user(username='autre', email='autre@example.com', password='secret')
+        now = timezone.now()
+        History.objects.bulk_create(
+            [History(userId=self.user.id, productId=i, viewed_at=now - timedelta(days=i)) for i in range(1, 11)]
+            + [History(userId=self.other.id, productId=i, viewed_at=now - timedelta(days=i)) for i in range(1, 11)]
+        )
+
+    def test_clear_is_scoped_to_user_and_single_delete(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.delete(reverse('remove_all_from_history') + f'?userId={self.user.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([q['sql'].split()[0] for q in ctx.captured_queries], ['DELETE'])
+        self.assertFalse(History.objects.filter(userId=self.user.id).exists())
+        self.assertEqual(History.objects.filter(userId=self.other.id).count(), 10)
+
+        self.assertEqual(self.client.delete(reverse('remove_all_from_history')).status_code, 400)
+
+    def test_clear_drops_buffered_views(self):
+        buffer = HistoryBuffer()
+        buffer.start = lambda: None
+        with mock.patch('ecommerce_api.history.history_buffer', buffer), \
+                override_settings(HISTORY_WRITE_MODE='buffered'):
+            buffer.record(self.user.id, 99)
+            buffer.record(self.other.id, 99)
+            self.client.delete(reverse('remove_all_from_history') + f'?userId={self.user.id}')
+        buffer.flush()
+        self.assertFalse(History.objects.filter(userId=self.user.id).exists())
+        self.assertTrue(History.objects.filter(userId=self.other.id, productId=99).exists())
+
+    @override_settings(HISTORY_WRITE_MODE='buffered')
+    def test_clear_waits_for_inflight_flush(self):
+        buffer = HistoryBuffer()
+        buffer.start = lambda: None
+        buffer.record(self.user.id, 99)
+        discarded = threading.Event()
+        clearing = threading.Thread(target=lambda: (buffer.discard_user(self.user.id), discarded.set()))
+
+        def upsert(views):
+            # Tampon déjà vidé par l'écriture : l'effacement lancé maintenant attend sa fin
+            clearing.start()
+            self.assertFalse(discarded.wait(0.2))
+            upsert_history(views)
+
+        with mock.patch('ecommerce_api.history.upsert_history', side_effect=upsert):
+            buffer.flush()
+        clearing.join()
+        # Suite de clear_user_history : le DELETE passe après l'écriture
+        History.objects.filter(userId=self.user.id).delete()
+        self.assertFalse(History.objects.filter(userId=self.user.id).exists())
+
+    def test_purge_command_in_id_ranges(self):
+        with self.assertRaises(CommandError):
+            call_command('purge_history', stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command('purge_history', '--before', (timezone.now() - timedelta(days=5, hours=12)).isoformat(),
+                     '--user', str(self.user.id), '--batch-size', '3', '--sleep', '0', stdout=out)
+        # Plage d'ids des seules lignes visées (ids 6 à 10), pas celle de toute la table
+        self.assertIn('5 consultation(s) supprimée(s) en 2 lot(s)', out.getvalue())
+        self.assertEqual(History.objects.filter(userId=self.user.id).count(), 5)
+
+        call_command('purge_history', '--all', '--batch-size', '100', '--sleep', '0', stdout=io.StringIO())
+        self.assertFalse(History.objects.exists())
+
+
+class RatingStatsTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.products = create_products(3)
+
+    def review(self, product, rating):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('add_review'), {
+                'userId': self.user.id, 'productId': product.id, 'rating': rating, 'review': 'Avis'}, format='json')
+
+    def test_stats_updated_incrementally(self):
+        for rating in (5, 4, 4):
+            self.assertEqual(self.review(self.products[0], rating).status_code, 201)
+        self.assertEqual(self.review(self.products[0], 9).status_code, 400)
+
+        stats = ProductRatingStats.objects.get(product=self.products[0])
+        self.assertEqual((stats.count, stats.total, stats.average), (3, 13, 4.33))
+        self.assertEqual(stats.histogram, {'1': 0, '2': 0, '3': 0, '4': 2, '5': 1})
+
+    def test_stats_on_product_lists_without_per_product_queries(self):
+        self.review(self.products[0], 5)
+        self.review(self.products[1], 2)
+
+        url = reverse('get_products')
+        self.client.get(url)
+        # Page et agrégats servis par le cache
+        with CaptureQueriesContext(connection) as ctx:
+            products = self.client.get(url).data['products']
+        self.assertEqual(len(ctx.captured_queries), 0)
+        ratings = {p['id']: p['rating'] for p in products}
+        self.assertEqual(ratings[self.products[0].id], {'average': 5.0, 'count': 1})
+        self.assertEqual(ratings[self.products[2].id], {'average': None, 'count': 0})
+
+        # Un nouvel avis invalide les agrégats en cache
+        self.review(self.products[2], 3)
+        ratings = {p['id']: p['rating'] for p in self.client.get(url).data['products']}
+        self.assertEqual(ratings[self.products[2].id], {'average': 3.0, 'count': 1})
+
+    def test_reviews_are_paginated_with_stats(self):
+        Review.objects.bulk_create(
+            [Review(userId=self.user.id, productId=self.products[0].id, rating=1 + i % 5, review=f'Avis {i}')
+             for i in range(25)])
+        call_command('rebuild_rating_stats', stdout=io.StringIO())
+
+        url = reverse('get_all_reviews')
+        first = self.client.get(url, {'productId': self.products[0].id}).data
+        self.assertEqual(len(first['reviews']), 10)
+        self.assertEqual(first['stats']['count'], 25)
+        self.assertEqual(first['stats']['histogram']['3'], 5)
+
+        seen = [r['review'] for r in first['reviews']]
+        cursor = first['next']
+        while cursor:
+            page = self.client.get(url, {'productId': self.products[0].id, 'cursor': cursor}).data
+            seen += [r['review'] for r in page['reviews']]
+            cursor = page['next']
+        self.assertEqual(sorted(seen), sorted(f'Avis {i}' for i in range(25)))
+
+    def test_rebuild_repairs_drift(self):
+        self.review(self.products[0], 5)
+        ProductRatingStats.objects.filter(product=self.products[0]).update(count=40, total=2)
+        ProductRatingStats.objects.create(product=self.products[1], count=3, total=3)
+
+        out = io.StringIO()
+        call_command('rebuild_rating_stats', '--chunk-size', '2', stdout=out)
+        self.assertIn('3 produit(s) recalculé(s), dont 1 avec des avis', out.getvalue())
+        stats = ProductRatingStats.objects.get(product=self.products[0])
+        self.assertEqual((stats.count, stats.total, stats.rating_5), (1, 5, 1))
+        self.assertFalse(ProductRatingStats.objects.filter(product=self.products[1]).exists())
+
+
+class ConditionalGetTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.products = create_products(3)
+
+    def revalidate(self, url, params, response, **headers):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'], **headers)
+
+    def test_unchanged_product_list_is_not_modified_without_queries(self):
+        url = reverse('get_products')
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.revalidate(url, {}, first)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], first['ETag'])
+
+        # Pas de Last-Modified : une suppression ne ferait pas avancer la date
+        self.assertNotIn('Last-Modified', first)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date()).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].price = '12.00'
+            self.products[0].save()
+        changed = self.revalidate(url, {}, first)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[1].delete()
+        self.assertEqual(self.revalidate(url, {}, changed).status_code, 200)
+
+    def test_user_flags_and_bulk_writes_change_validators(self):
+        params = {'userId': self.user.id}
+        for name in ('get_products', 'get_favorites'):
+            with self.subTest(endpoint=name):
+                url = reverse(name)
+                first = self.client.get(url, params)
+                self.assertEqual(self.revalidate(url, params, first).status_code, 304)
+
+                favorite = Favorite.objects.create(userId=self.user.id, productId=self.products[0].id)
+                second = self.revalidate(url, params, first)
+                self.assertEqual(second.status_code, 200)
+                favorite.delete()
+                self.assertEqual(self.revalidate(url, params, second).status_code, 200)
+
+        # `bulk_update` de la commande : stock et updated_at changent ensemble
+        url = reverse('get_all_products')
+        first = self.client.get(url)
+        b''.join(first.streaming_content)
+        before = Product.objects.get(id=self.products[1].id).updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('order_product'), {
+                'userId': self.user.id, 'shippingId': 1,
+                'products': [{'productId': self.products[1].id, 'quantity': 1}]}, format='json')
+        self.assertGreater(Product.objects.get(id=self.products[1].id).updated_at, before)
+        self.assertEqual(self.revalidate(url, {}, first).status_code, 200)
+
+    def test_reviews_and_posters(self):
+        url = reverse('get_all_reviews')
+        params = {'productId': self.products[0].id}
+        first = self.client.get(url, params)
+        self.assertEqual(self.revalidate(url, params, first).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add_review'), {
+                'userId': self.user.id, 'productId': self.products[0].id, 'rating': 4, 'review': 'Bien'},
+                format='json')
+        self.assertEqual(self.revalidate(url, params, first).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+        url = reverse('get_posters')
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, {}, first).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            poster = Poster.objects.create(title='Soldes', image='')
+        second = self.revalidate(url, {}, first)
+        self.assertEqual(second.status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            poster.delete()
+        self.assertEqual(self.revalidate(url, {}, second).status_code, 200)
+
+
+def image_upload(name, size, fmt='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+class ImageVariantTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_DERIVATIVE_WIDTHS=[320, 640, 1080])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_poster_variants_generated_after_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            poster = Poster.objects.create(title='Soldes', image=image_upload('soldes.jpg', (1600, 800)))
+        small = Poster.objects.create(title='Logo', image=image_upload('logo.png', (200, 100), 'PNG'))
+        call_command('generate_image_variants', stdout=io.StringIO())
+
+        posters = {p['title']: p for p in self.client.get(reverse('get_posters')).json()['posters']}
+        variants = posters['Soldes']['variants']
+        self.assertEqual([(v['width'], v['format']) for v in variants], [
+            (320, 'webp'), (320, 'jpeg'), (640, 'webp'), (640, 'jpeg'), (1080, 'webp'), (1080, 'jpeg')])
+        self.assertEqual(variants[0]['height'], 160)
+        self.assertTrue(variants[0]['url'].endswith('posters/soldes_w320.webp'))
+        # Pas d'agrandissement : une image plus étroite que toutes les largeurs garde son original
+        self.assertEqual(posters['Logo']['variants'], [])
+
+        poster.refresh_from_db()
+        with default_storage.open(poster.image_variants['items'][2]['name']) as f:
+            self.assertEqual(Image.open(f).size, (640, 320))
+        small.refresh_from_db()
+        self.assertEqual(small.image_variants, {'source': small.image.name, 'items': []})
+
+    def test_backfill_command(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            poster = Poster.objects.create(title='Soldes', image=image_upload('soldes.jpg', (800, 400)))
+        Poster.objects.filter(id=poster.id).update(image_variants=None)
+
+        out = io.StringIO()
+        call_command('generate_image_variants', '--kind', 'poster', stdout=out)
+        self.assertIn('poster : 1 image(s) traitée(s), 0 échec(s)', out.getvalue())
+        poster.refresh_from_db()
+        self.assertEqual([v['width'] for v in poster.image_variants['items']], [320, 320, 640, 640])
+
+        out = io.StringIO()
+        call_command('generate_image_variants', '--kind', 'poster', stdout=out)
+        self.assertIn('poster : 0 image(s) traitée(s)', out.getvalue())
+
+    def test_user_image_variants(self):
+        user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(reverse('upload_photo'), {
+                'id': user.id, 'userPhoto': image_upload('moi.jpg', (1200, 1200))}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+
+        url = reverse('get_user_image')
+        response = self.client.get(url, {'id': user.id, 'width': 300}, HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (320, 320))
+
+        response = self.client.get(url, {'id': user.id, 'width': 500, 'imageFormat': 'jpeg'})
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (640, 640))
+
+        # Sans largeur, ou plus large que toutes les déclinaisons : l'original
+        response = self.client.get(url, {'id': user.id, 'width': 2000})
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (1200, 1200))
+
+        # Nouvelle photo : les anciennes déclinaisons sont supprimées
+        old = UserProfile.objects.get(user=user).photo_variants['items']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('upload_photo'), {
+                'id': user.id, 'userPhoto': image_upload('moi2.jpg', (700, 700))}, format='multipart')
+        self.assertFalse(any(default_storage.exists(item['name']) for item in old))
+        profile = UserProfile.objects.get(user=user)
+        self.assertEqual([v['width'] for v in profile.photo_variants['items']], [320, 320, 640, 640])
+
+
+class UserImageTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_DERIVATIVE_WIDTHS=[])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        UserProfile.objects.create(user=self.user, photo=image_upload('moi.png', (64, 64), 'PNG'))
+        self.url = reverse('get_user_image')
+        with default_storage.open(UserProfile.objects.get(user=self.user).photo.name) as f:
+            self.data = f.read()
+
+    def test_streamed_in_one_query_with_validators(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'id': self.user.id})
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age=300', response['Cache-Control'])
+
+        not_modified = self.client.get(self.url, {'id': self.user.id}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+        self.assertEqual(self.client.get(self.url, {'id': self.user.id + 1}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'id': 'abc'}).status_code, 404)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, {'id': self.user.id}, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[10:20])
+
+        response = self.client.get(self.url, {'id': self.user.id}, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-5:])
+
+        response = self.client.get(self.url, {'id': self.user.id}, HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+
+        # If-Range périmé : fichier complet
+        response = self.client.get(self.url, {'id': self.user.id}, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"ancien"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_offload_to_front_server(self):
+        photo = UserProfile.objects.get(user=self.user).photo
+        with self.settings(MEDIA_SENDFILE_MODE='x-accel-redirect'):
+            response = self.client.get(self.url, {'id': self.user.id})
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{photo.name}')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('ETag', response)
+
+        with self.settings(MEDIA_SENDFILE_MODE='x-sendfile'):
+            response = self.client.get(self.url, {'id': self.user.id})
+        self.assertEqual(response['X-Sendfile'], photo.path)
+
+
+class AsyncReadViewTests(CatalogueTestCase):
+    """Les vues asynchrones (ASYNC_READ_VIEWS) renvoient exactement les réponses des vues synchrones."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret')
+        self.products = create_products(5)
+        get_search_backend().reset()
+        for product in self.products:
+            get_search_backend().index_product(product)
+        Favorite.objects.create(userId=self.user.id, productId=self.products[0].id)
+        Cart.objects.create(userId=self.user.id, productId=self.products[1].id)
+        Review.objects.create(userId=self.user.id, productId=self.products[0].id, rating=4, review='Bien')
+        call_command('rebuild_rating_stats', stdout=io.StringIO())
+        Notification.objects.bulk_create(
+            [Notification(user=self.user, title=f'Titre {i}', message='Message') for i in range(25)]
+        )
+        self.factory = AsyncRequestFactory()
+
+    def compare(self, name, async_view, params, headers=None):
+        url = reverse(name)
+        catalogue_cache.clear()
+        expected = self.client.get(url, params, headers=headers)
+        # Cache vide aussi pour la vue asynchrone : ses propres chargements sont exercés
+        catalogue_cache.clear()
+        response = async_to_sync(async_view)(self.factory.get(url, params, headers=headers))
+        self.assertEqual(response.status_code, expected.status_code, params)
+        self.assertEqual(response.content, expected.content, params)
+        self.assertEqual(response.get('ETag'), expected.get('ETag'))
+        return response
+
+    def test_product_views_match(self):
+        user = {'userId': self.user.id}
+        for params in ({}, user, {'cursor': ''}, {'cursor': '', 'page_size': 2, **user}, {'page': 99},
+                       {'cursor': 'invalide'}):
+            self.compare('get_products', async_views.get_products, params)
+        second = self.client.get(reverse('get_products'), {'cursor': '', 'page_size': 2}).json()['next']
+        self.compare('get_products', async_views.get_products, {'cursor': second, 'page_size': 2})
+
+        for params in ({'q': 'Produit'}, {'q': ''}, {'q': 'Produit', 'page': 1, 'page_size': 2, **user}):
+            self.compare('search_for_product', async_views.search_for_product, params)
+        self.compare('get_favorites', async_views.get_favorites, user)
+        self.compare('get_products_in_cart', async_views.get_products_in_cart, user)
+
+        # Réponse conditionnelle et méthode refusée, comme les vues DRF
+        etag = self.client.get(reverse('get_products')).get('ETag')
+        response = self.compare('get_products', async_views.get_products, {}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        response = async_to_sync(async_views.get_products)(self.factory.post(reverse('get_products')))
+        self.assertEqual(response.status_code, 405)
+
+    def test_search_loads_cold_index(self):
+        # Premier appel du processus sur un worker ASGI : l'index n'a jamais été chargé
+        get_search_backend().reset()
+        url = reverse('search_for_product')
+        response = async_to_sync(async_views.search_for_product)(self.factory.get(url, {'q': 'Produit'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['products']), 5)
+
+    def test_notification_list_matches(self):
+        user = {'userId': self.user.id}
+        for params in (user, {**user, 'page': 2}, {**user, 'cursor': ''}, {**user, 'since_id': 0},
+                       {'userId': self.user.id + 1}):
+            self.compare('notification-list', async_views.notification_list, params)
+
+        first = self.client.get(reverse('notification-list'), {**user, 'cursor': ''}).json()
+        self.compare('notification-list', async_views.notification_list, {**user, 'cursor': first['next']})
+        etag = self.client.get(reverse('notification-list'), {**user, 'since_id': 0})['ETag']
+        response = self.compare(
+            'notification-list', async_views.notification_list, {**user, 'since_id': 0}, headers={'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class ProductImportTests(CatalogueTestCase):
+    CSV = (
+        'sku,product_name,price,quantity,supplier,category\n'
+        'A-1,Savon noir,2.50,10,Karité SA,Beauté\n'
+        'A-2,Beurre de karité,,5,Karité SA,Beauté\n'
+        'A-3,Huile de baobab,7.00,,Karité SA,Beauté\n'
+    )
+
+    def test_csv_upsert_with_row_errors(self):
+        Product.objects.create(
+            sku='A-1', product_name='Ancien nom', price='1.00', supplier='Karité SA', category='Beauté')
+        upload = SimpleUploadedFile('catalogue.csv', self.CSV.encode('utf-8'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('import_products'), {'file': upload})
+        data = response.json()
+
+        self.assertEqual((data['rows'], data['imported'], data['error_count']), (3, 2, 1))
+        self.assertEqual(data['errors'][0]['row'], 2)
+        self.assertIn('price', data['errors'][0]['errors'])
+
+        self.assertEqual(Product.objects.count(), 2)
+        savon = Product.objects.get(sku='A-1')
+        self.assertEqual((savon.product_name, savon.quantity), ('Savon noir', 10))
+        self.assertEqual(Product.objects.get(sku='A-3').quantity, 0)
+
+    def test_missing_or_blank_cells_keep_existing_values(self):
+        Product.objects.create(
+            sku='A-3', product_name='Ancien nom', price='1.00', quantity=7, supplier='Karité SA',
+            category='Beauté', image='https://example.com/baobab.jpg')
+        stream = io.BytesIO(self.CSV.encode('utf-8'))
+        with self.captureOnCommitCallbacks(execute=True):
+            import_products(iter_rows(stream, 'csv'))
+
+        huile = Product.objects.get(sku='A-3')
+        self.assertEqual((huile.product_name, huile.quantity), ('Huile de baobab', 7))
+        self.assertEqual(huile.image, 'https://example.com/baobab.jpg')
+        self.assertEqual(Product.objects.get(sku='A-1').quantity, 10)
+
+    def test_ndjson_and_invalidations(self):
+        existing = Product.objects.create(
+            sku='B-1', product_name='Mangue', price='1.00', supplier='Verger', category='Fruits')
+        url = reverse('get_products')
+        self.assertEqual(self.client.get(url).json()['products'][0]['product_name'], 'Mangue')
+        self.assertEqual(get_search_backend().search('papaye'), [])
+
+        stream = io.BytesIO(
+            b'{"sku": "B-1", "product_name": "Papaye", "price": "2.00", "supplier": "Verger", "category": "Fruits"}\n'
+            b'\n'
+            b'pas du json\n'
+            b'{"sku": "B-2", "product_name": "Goyave", "price": "3.00", "supplier": "Verger", "category": "Fruits"}\n'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_products(iter_rows(stream, 'ndjson'), chunk_size=2)
+
+        self.assertEqual((result['rows'], result['imported'], result['error_count']), (3, 2, 1))
+        self.assertEqual(result['errors'][0]['row'], 3)
+        self.assertEqual(self.client.get(url).json()['products'][0]['product_name'], 'Papaye')
+        self.assertEqual(get_search_backend().search('papaye'), [existing.id])
+
+    def test_management_command(self):
+        path = self.tmp_file('catalogue.csv', self.CSV)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_products', path, stdout=out, stderr=err)
+        self.assertIn('2 produit(s) importé(s)', out.getvalue())
+        self.assertIn('Ligne 2', err.getvalue())
+
+    def tmp_file(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+
+class FakeConnection:
+    def __init__(self, usable=True):
+        self.usable = usable
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def check_fake_connection(connection):
+    if not connection.usable:
+        raise OSError('connexion perdue')
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_reuses_returned_connection(self):
+        pool = ConnectionPool(max_size=2)
+        connection, reused = pool.getconn(FakeConnection)
+        self.assertFalse(reused)
+        pool.putconn(connection)
+        self.assertEqual(pool.getconn(FakeConnection), (connection, True))
+
+        stats = pool.stats()
+        self.assertEqual((stats['connections_opened'], stats['checkouts']), (1, 2))
+        self.assertEqual((stats['size'], stats['in_use'], stats['idle']), (1, 1, 0))
+
+    def test_waits_for_a_free_connection_then_times_out(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        connection, _ = pool.getconn(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(FakeConnection)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+        pool.timeout = 5
+        releaser = threading.Timer(0.05, pool.putconn, [connection])
+        releaser.start()
+        self.assertEqual(pool.getconn(FakeConnection), (connection, True))
+        releaser.join()
+        stats = pool.stats()
+        self.assertEqual((stats['waits'], stats['connections_opened'], stats['waiting']), (1, 1, 0))
+        self.assertGreater(stats['wait_time_max_ms'], 0)
+
+    def test_discards_idle_broken_and_unhealthy_connections(self):
+        pool = ConnectionPool(max_size=2, max_idle=0, check=check_fake_connection)
+        connection, _ = pool.getconn(FakeConnection)
+        pool.putconn(connection)
+        time.sleep(0.01)
+        self.assertFalse(pool.getconn(FakeConnection)[1])
+        self.assertTrue(connection.closed)
+
+        pool = ConnectionPool(max_size=2, check=check_fake_connection)
+        connection, _ = pool.getconn(FakeConnection)
+        connection.usable = False
+        pool.putconn(connection)
+        replacement, reused = pool.getconn(FakeConnection)
+        self.assertIsNot(replacement, connection)
+        self.assertFalse(reused)
+        self.assertEqual(pool.stats()['health_check_failures'], 1)
+
+        pool.putconn(replacement, broken=True)
+        self.assertTrue(replacement.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_forgets_connections_inherited_across_fork(self):
+        pool = ConnectionPool(max_size=1)
+        connection, _ = pool.getconn(FakeConnection)
+        pool.putconn(connection)
+        with mock.patch('ecommerce_api.dbpool.os.getpid', return_value=os.getpid() + 1):
+            self.assertFalse(pool.getconn(FakeConnection)[1])
+            self.assertEqual(pool.stats()['connections_opened'], 1)
+        # Le socket appartient toujours au parent
+        self.assertFalse(connection.closed)
+
+
+def pooled_sqlite_wrapper(path, alias='pool-tests', **settings):
+    settings_dict = copy.deepcopy(connection.settings_dict)
+    settings_dict.update({
+        'ENGINE': 'ecommerce_api.backends.sqlite3', 'NAME': path, 'OPTIONS': {'pool': {'max_size': 2}},
+    }, **settings)
+    return load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+
+
+class PooledBackendTests(SimpleTestCase):
+    """Backend SQLite avec pool, sur un fichier temporaire hors des bases de test."""
+
+    def make_wrapper(self, path, alias='pool-tests', **settings):
+        wrapper = pooled_sqlite_wrapper(path, alias, **settings)
+        self.addCleanup(wrapper.close_pool)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'pool.sqlite3')
+
+    def test_close_returns_connection_to_pool(self):
+        wrapper = self.make_wrapper(self.path)
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        raw = wrapper.connection
+        wrapper.close()
+        self.assertIsNone(wrapper.connection)
+
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, raw)
+        stats = pool_stats()['pool-tests']
+        self.assertEqual((stats['connections_opened'], stats['checkouts'], stats['in_use']), (1, 2, 1))
+        response = self.client.get(reverse('database_pool_stats'))
+        self.assertEqual(response.json()['pool-tests']['in_use'], 1)
+
+    def test_open_transaction_rolled_back_before_reuse(self):
+        wrapper = self.make_wrapper(self.path)
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO item (id) VALUES (1)')
+        wrapper.close()
+
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone(), (0,))
+        self.assertTrue(wrapper.get_autocommit())
+
+    def test_connections_shared_between_threads(self):
+        wrapper = self.make_wrapper(self.path)
+        seen = []
+
+        def request():
+            # Un wrapper par thread, comme django.db.connections
+            thread_wrapper = pooled_sqlite_wrapper(self.path)
+            for _ in range(20):
+                with thread_wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                seen.append(id(thread_wrapper.connection))
+                thread_wrapper.close()
+
+        threads = [threading.Thread(target=request) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(seen), 80)
+        stats = wrapper.pool.stats()
+        self.assertLessEqual(stats['connections_opened'], 2)
+        self.assertEqual((stats['checkouts'], stats['in_use']), (80, 0))
+
+    def test_requires_conn_max_age_zero(self):
+        wrapper = self.make_wrapper(self.path, alias='pool-tests-persistent', CONN_MAX_AGE=60)
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper.ensure_connection()
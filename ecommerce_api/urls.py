@@ -1,5 +1,11 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Lectures les plus sollicitées : vues asynchrones (déploiement ASGI) si ASYNC_READ_VIEWS
+use_async = getattr(settings, 'ASYNC_READ_VIEWS', False)
+read_views = async_views if use_async else views
+notification_list = async_views.notification_list if use_async else views.NotificationListView.as_view()
 
 urlpatterns = [
     # Authentification
@@ -17,19 +23,23 @@ urlpatterns = [
 
     # Produits
     path('products/insert', views.insert_product, name='insert_product'),
-    path('products', views.get_products, name='get_products'),
+    path('products/import', views.import_products, name='import_products'),
+    path('products', read_views.get_products, name='get_products'),
     path('all_products', views.get_all_products, name='get_all_products'),
-    path('products/search', views.search_for_product, name='search_for_product'),
+    path('products/category', views.get_products_by_category, name='get_products_by_category'),
+    path('products/search', read_views.search_for_product, name='search_for_product'),
 
     # Favoris
     path('favorites/add', views.add_favorite, name='add_favorite'),
     path('favorites/remove', views.remove_favorite, name='remove_favorite'),
-    path('favorites', views.get_favorites, name='get_favorites'),
+    path('favorites', read_views.get_favorites, name='get_favorites'),
 
     # Panier
     path('carts/add', views.add_to_cart, name='add_to_cart'),
     path('carts/remove', views.remove_from_cart, name='remove_from_cart'),
-    path('carts', views.get_products_in_cart, name='get_products_in_cart'),
+    path('carts', read_views.get_products_in_cart, name='get_products_in_cart'),
+    path('carts/summary', views.get_cart_summary, name='get_cart_summary'),
+    path('carts/batch', views.update_cart_batch, name='update_cart_batch'),
 
     # Historique
     path('history/add', views.add_to_history, name='add_to_history'),
@@ -43,13 +53,19 @@ urlpatterns = [
     # Posters
     path('posters', views.get_posters, name='get_posters'),
 
+    # Cache catalogue et pool de connexions
+    path('catalogue/cache-stats', views.get_catalogue_cache_stats, name='catalogue_cache_stats'),
+    path('database/pool-stats', views.get_database_pool_stats, name='database_pool_stats'),
+
     # Commandes
     path('orders/get', views.get_orders, name='get_orders'),
     path('address/add', views.add_shipping_address, name='add_shipping_address'),
     path('orders/add', views.order_product, name='order_product'),
 
     # Notifications
-    path('notifications', views.NotificationListView.as_view(), name='notification-list'),
+    path('notifications', notification_list, name='notification-list'),
+    path('notifications/status', views.get_notification_status, name='notification-status'),
+    path('notifications/stream', views.notification_stream, name='notification-stream'),
     path('notifications/<int:notificationId>/read', views.mark_notification_as_read, name='mark-as-read'),
     path('notifications/<int:notificationId>', views.delete_notification, name='delete-notification'),
     path('notifications/mark-all-read', views.mark_all_as_read, name='mark-all-read'),
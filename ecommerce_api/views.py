@@ -1,16 +1,20 @@
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from rest_framework import status, generics
 from rest_framework.decorators import api_view, parser_classes, permission_classes
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+import csv
 import json
 import random
 import string
@@ -18,20 +22,30 @@ from django.core.files.storage import default_storage
 from django.core.mail import send_mail
 from .models import (
     Product, UserProfile, Favorite, Cart, History,
-    Review, Poster, Shipping, Order, OrderItem, Otp, Notification
+    Review, Poster, Shipping, Order, OrderItem, Otp, Notification, NotificationCounter,
+    ProductRatingStats
 )
 from .serializers import (
     UserSerializer, ProductSerializer, FavoriteSerializer,
     HistorySerializer, ReviewSerializer, PosterSerializer, ShippingSerializer,
-    OrderSerializer, OtpSerializer, NotificationListSerializer
+    OrderSerializer, OtpSerializer, NotificationListSerializer, CartBatchSerializer
 )
-
-
-# Pagination pour les produits
-class ProductPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+from .pagination import ProductPagination, KeysetPagination
+from .streaming import iter_queryset_chunks, streaming_json_response
+from .search import get_search_backend, tokenize
+from .cache import catalogue_cache
+from .dbpool import pool_stats
+from .notifications import notify, adjust_counter, get_counter, counter_etag
+from .conditional import (
+    conditional, favorites_validators, posters_validators, product_list_validators, reviews_validators
+)
+from .images import FORMATS, current_variants, delete_derivatives
+from .media import serve_file
+from .carts import apply_cart_operations, cart_extra, get_cart_summary as cart_summary
+from .events import notification_events, release_connection, stream_sync_to_async
+from .ratings import record_review, stats_summary
+from .history import clear_user_history, history_buffer
+from .importer import IMPORT_FORMATS, guess_format, iter_rows, import_products as run_product_import
 
 
 # Authentification
@@ -158,8 +172,11 @@ def upload_photo(request):
     if profile.photo:
         if default_storage.exists(profile.photo.name):
             default_storage.delete(profile.photo.name)
+        delete_derivatives(profile.photo_variants)
 
     profile.photo = user_photo
+    profile.photo_variants = None
+    # Déclinaisons générées en arrière-plan après le commit (signal post_save)
     profile.save()
 
     return Response(status=status.HTTP_200_OK)
@@ -210,19 +227,53 @@ def update_profile(request):
 
 @api_view(['GET'])
 def get_user_image(request):
-    user_id = request.query_params.get('id')
-    user = get_object_or_404(User, id=user_id)
+    """
+    Photo de l'utilisateur. Avec `?width=`, renvoie la plus petite déclinaison
+    au moins aussi large (l'original si aucune ne l'est). Format : `?imageFormat=`
+    (webp, jpeg ; `format` est réservé par DRF), sinon WebP si le client l'accepte.
 
+    Le fichier est envoyé sans passer par la mémoire du worker (voir
+    `media.serve_file` : ETag, plages, Cache-Control, délégation au serveur frontal).
+    """
+    # Une seule requête : le profil de l'utilisateur, sans relire l'utilisateur
     try:
-        profile = UserProfile.objects.get(user=user)
-        if profile.photo:
-            return HttpResponse(profile.photo, content_type="image/jpeg")
-    except UserProfile.DoesNotExist:
-        pass
+        profile = UserProfile.objects.filter(user_id=request.query_params.get('id')).only(
+            'photo', 'photo_variants'
+        ).first()
+    except ValueError:
+        profile = None
+
+    if profile is not None and profile.photo:
+        variant = select_variant(profile, request)
+        negotiated = 'width' in request.query_params and request.query_params.get('imageFormat') not in FORMATS
+        response = serve_file(
+            request, variant['name'] if variant else profile.photo.name, storage=profile.photo.storage,
+            vary='Accept' if negotiated else None
+        )
+        if response is not None:
+            return response
 
     return Response({"error": "No image found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+def select_variant(profile, request):
+    try:
+        width = int(request.query_params.get('width') or 0)
+    except ValueError:
+        width = 0
+    if width <= 0:
+        return None
+    fmt = request.query_params.get('imageFormat')
+    if fmt not in FORMATS:
+        fmt = 'webp' if 'image/webp' in request.META.get('HTTP_ACCEPT', '') else 'jpeg'
+
+    items = [
+        item for item in current_variants(profile.photo_variants, profile.photo.name)
+        if item['format'] == fmt and item['width'] >= width
+    ]
+    return min(items, key=lambda item: item['width']) if items else None
+
+
 # Fonctions pour produits
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
@@ -238,39 +289,100 @@ def insert_product(request):
         quantity=product_info.get('quantity', 0),
         supplier=product_info.get('supplier', ''),
         category=product_info.get('category', ''),
-        image=request.data.get('image')
+        image=request.data.get('image'),
+        sku=product_info.get('sku') or None
     )
 
     return Response(status=status.HTTP_201_CREATED)
 
 
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+def import_products(request):
+    """
+    Import en masse d'un catalogue fournisseur (fichier CSV ou NDJSON dans `file`).
+
+    Les produits sont insérés ou mis à jour par (supplier, sku) ; les lignes
+    invalides sont rapportées sans interrompre l'import.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Fichier requis'}, status=status.HTTP_400_BAD_REQUEST)
+
+    fmt = request.data.get('format') or guess_format(upload.name)
+    if fmt not in IMPORT_FORMATS:
+        return Response({'error': f'Format non supporté : {fmt}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        result = run_product_import(iter_rows(upload, fmt))
+    except (UnicodeDecodeError, csv.Error) as e:
+        return Response({'error': f'Fichier illisible : {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(result, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
+@conditional(product_list_validators)
 def get_products(request):
+    user_id = request.query_params.get('userId')
+    products = Product.objects.all()
+
+    # Mode curseur (`?cursor=`) : pagination par clé sur `id`, sans OFFSET ni COUNT(*)
+    if KeysetPagination.is_requested(request):
+        paginator = KeysetPagination(ordering=('id',))
+
+        def load_page():
+            results = paginator.paginate_queryset(products, request)
+            return results, paginator.next_cursor, paginator.previous_cursor
+
+        params = ('cursor', request.query_params.get('cursor'), paginator.get_page_size(request))
+        result_page, paginator.next_cursor, paginator.previous_cursor = catalogue_cache.get_list(
+            'products', params, load_page
+        )
+        serializer = ProductSerializer(result_page, many=True, context={'user_id': user_id})
+        return Response(paginator.get_paginated_data('products', serializer.data))
+
     paginator = ProductPagination()
     page = request.query_params.get('page', 1)
 
-    products = Product.objects.all()
-    result_page = paginator.paginate_queryset(products, request)
+    # Page mise en cache (instances) ; les indicateurs favori/panier restent calculés par utilisateur
+    params = ('page', page, paginator.get_page_size(request))
+    result_page = catalogue_cache.get_list(
+        'products', params, lambda: list(paginator.paginate_queryset(products, request))
+    )
 
-    serializer = ProductSerializer(result_page, many=True)
+    serializer = ProductSerializer(result_page, many=True, context={'user_id': user_id})
     return Response({"products": serializer.data})
 
 
 @api_view(['GET'])
+@conditional(product_list_validators)
 def get_all_products(request):
-    products = Product.objects.all()
-    serializer = ProductSerializer(products, many=True)
-    return Response({"products": serializer.data})
+    user_id = request.query_params.get('userId')
+
+    # Réponse en flux, lot par lot depuis la base : le catalogue n'est jamais
+    # entièrement chargé en mémoire, ni recopié dans le cache de chaque worker
+    chunks = iter_queryset_chunks(Product.objects.all(), getattr(settings, 'PRODUCT_STREAM_CHUNK_SIZE', 2000))
+    return streaming_json_response('products', chunks, ProductSerializer, context={'user_id': user_id})
 
 
 @api_view(['GET'])
 def get_products_by_category(request):
-    paginator = ProductPagination()
     category = request.query_params.get('category')
     user_id = request.query_params.get('userId')
-    page = request.query_params.get('page', 1)
 
     products = Product.objects.filter(category=category)
+
+    # Mode curseur (`?cursor=`) : pagination par clé sur `(category, id)`
+    if KeysetPagination.is_requested(request):
+        paginator = KeysetPagination(ordering=('category', 'id'))
+        result_page = paginator.paginate_queryset(products, request)
+        serializer = ProductSerializer(result_page, many=True, context={'user_id': user_id})
+        return Response(paginator.get_paginated_data('products', serializer.data))
+
+    paginator = ProductPagination()
+    page = request.query_params.get('page', 1)
+
     result_page = paginator.paginate_queryset(products, request)
 
     serializer = ProductSerializer(result_page, many=True, context={'user_id': user_id})
@@ -282,11 +394,22 @@ def search_for_product(request):
     keyword = request.query_params.get('q', '')
     user_id = request.query_params.get('userId')
 
-    products = Product.objects.filter(
-        Q(product_name__icontains=keyword) |
-        Q(supplier__icontains=keyword) |
-        Q(category__icontains=keyword)
-    )
+    # Sans terme exploitable, on conserve l'ancien comportement (tout le catalogue)
+    if not tokenize(keyword):
+        products = Product.objects.all()
+        serializer = ProductSerializer(products, many=True, context={'user_id': user_id})
+        return Response({"products": serializer.data})
+
+    # IDs classés par pertinence via l'index de recherche
+    product_ids = get_search_backend().search(keyword)
+
+    # Pagination optionnelle (`page` / `page_size`) sur la liste classée
+    if 'page' in request.query_params or 'page_size' in request.query_params:
+        paginator = ProductPagination()
+        product_ids = paginator.paginate_queryset(product_ids, request)
+
+    products_dict = Product.objects.in_bulk(product_ids)
+    products = [products_dict[pid] for pid in product_ids if pid in products_dict]
 
     serializer = ProductSerializer(products, many=True, context={'user_id': user_id})
     return Response({"products": serializer.data})
@@ -307,15 +430,7 @@ def add_favorite(request):
         )
 
         if created:
-            user = User.objects.get(id=user_id)
-            product = Product.objects.get(id=product_id)
-            Notification.objects.create(
-                user=user,
-                title="Produit ajouté à vos favoris",
-                message=f"Le produit '{product.product_name}' a été ajouté à vos favoris.",
-                type="general",
-                data={"product_id": product_id}
-            )
+            notify(user_id, 'favorite_added', product_id=product_id)
 
         return Response(status=status.HTTP_200_OK)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -333,6 +448,7 @@ def remove_favorite(request):
 
 
 @api_view(['GET'])
+@conditional(favorites_validators)
 def get_favorites(request):
     user_id = request.query_params.get('userId')
 
@@ -366,10 +482,16 @@ def add_to_cart(request):
         # Check if the product already exists in the cart
         existing_cart = Cart.objects.filter(userId=user_id, productId=product_id).first()
 
+        # Copie JSON de la requête, conservée seulement si CART_STORE_PAYLOAD est activé ;
+        # les seuls champs utiles du client vont dans `extra`
+        payload = json.dumps(cart_data) if getattr(settings, 'CART_STORE_PAYLOAD', False) else None
+        extra = cart_extra(cart_data)
+
         if existing_cart:
             # Update existing cart item
             existing_cart.quantity = quantity
-            existing_cart.cart = json.dumps(cart_data)  # Store as JSON string if needed
+            existing_cart.cart = payload
+            existing_cart.extra = extra
             existing_cart.save()
         else:
             # Create new cart item
@@ -377,10 +499,12 @@ def add_to_cart(request):
                 userId=user_id,
                 productId=product_id,
                 quantity=quantity,
-                cart=json.dumps(cart_data)  # Store as JSON string if needed
+                cart=payload,
+                extra=extra
             )
             cart.save()
 
+        catalogue_cache.invalidate_cart(user_id)
         return Response({'message': 'Item added to cart successfully'}, status=status.HTTP_200_OK)
 
     except Exception as e:
@@ -394,6 +518,7 @@ def remove_from_cart(request):
 
     cart = get_object_or_404(Cart, userId=user_id, productId=product_id)
     cart.delete()
+    catalogue_cache.invalidate_cart(user_id)
 
     return Response(status=status.HTTP_200_OK)
 
@@ -413,17 +538,47 @@ def get_products_in_cart(request):
     return Response({"carts": serializer.data})
 
 
+@api_view(['POST'])
+@parser_classes([JSONParser])
+def update_cart_batch(request):
+    """
+    Applique plusieurs opérations `{productId, quantity}` au panier (quantité 0 =
+    retrait) en une transaction, puis renvoie le panier obtenu.
+    """
+    serializer = CartBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    user_id = serializer.validated_data['userId']
+    if not User.objects.filter(id=user_id).exists():
+        return Response({'error': 'Utilisateur introuvable'}, status=status.HTTP_400_BAD_REQUEST)
+
+    unknown = apply_cart_operations(user_id, serializer.validated_data['operations'])
+    if unknown:
+        return Response({'error': 'Produit introuvable', 'productIds': unknown}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(cart_summary(user_id))
+
+
+@api_view(['GET'])
+def get_cart_summary(request):
+    """Lignes du panier avec quantité, prix unitaire, total de ligne, stock et total général."""
+    user_id = request.query_params.get('userId')
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return Response({'error': 'userId is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(cart_summary(user_id))
+
+
 # Fonctions pour l'historique
 @api_view(['POST'])
 def add_to_history(request):
     serializer = HistorySerializer(data=request.data)
     if serializer.is_valid():
-        # Mettre à jour l'horodatage ou créer une nouvelle entrée
-        history, created = History.objects.update_or_create(
-            userId=serializer.validated_data['userId'],
-            productId=serializer.validated_data['productId'],
-            defaults={'viewed_at': timezone.now()}
-        )
+        # Écriture différée : les consultations sont regroupées puis écrites en un upsert
+        history_buffer.record(serializer.validated_data['userId'], serializer.validated_data['productId'])
 
         return Response(status=status.HTTP_200_OK)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -431,7 +586,13 @@ def add_to_history(request):
 
 @api_view(['DELETE'])
 def remove_all_from_history(request):
-    History.objects.all().delete()
+    # Seul l'historique de l'utilisateur est effacé (les purges globales passent par `purge_history`)
+    try:
+        user_id = int(request.query_params.get('userId'))
+    except (TypeError, ValueError):
+        return Response({'error': 'userId is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    clear_user_history(user_id)
     return Response(status=status.HTTP_200_OK)
 
 
@@ -442,18 +603,17 @@ def get_products_in_history(request):
 
     paginator = ProductPagination()
 
-    # Récupérer les IDs des produits dans l'historique
-    history_items = History.objects.filter(userId=user_id).order_by('-viewed_at')
-    history_product_ids = history_items.values_list('productId', flat=True)
-
-    # Récupérer les produits correspondants
-    # Préserver l'ordre de l'historique
-    products_dict = {p.id: p for p in Product.objects.filter(id__in=history_product_ids)}
-    products = [products_dict.get(pid) for pid in history_product_ids if pid in products_dict]
-
-    result_page = paginator.paginate_queryset(products, request)
+    # Jointure historique -> produit paginée en SQL, dans l'ordre de consultation ;
+    # les produits supprimés du catalogue sont ignorés
+    history_items = (
+        History.objects.filter(userId=user_id, product__isnull=False)
+        .select_related('product')
+        .order_by('-viewed_at', '-id')
+    )
+    result_page = paginator.paginate_queryset(history_items, request)
+    products = [item.product for item in result_page]
 
-    serializer = ProductSerializer(result_page, many=True, context={'user_id': user_id})
+    serializer = ProductSerializer(products, many=True, context={'user_id': user_id})
     return Response({"history": serializer.data})
 
 
@@ -462,48 +622,89 @@ def get_products_in_history(request):
 def add_review(request):
     serializer = ReviewSerializer(data=request.data)
     if serializer.is_valid():
-        review = serializer.save()
+        with transaction.atomic():
+            review = serializer.save()
+            record_review(review.productId, review.rating)
+            transaction.on_commit(catalogue_cache.invalidate_ratings)
 
-        user = User.objects.get(id=review.userId)
-        product = Product.objects.get(id=review.productId)
-
-        Notification.objects.create(
-            user=user,
-            title="Avis publié",
-            message=f"Votre avis sur le produit '{product.product_name}' a été publié.",
-            type="general",
-            data={"product_id": product.id}
-        )
+        notify(review.userId, 'review_published', product_id=review.productId)
 
         return Response(status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET'])
+@conditional(reviews_validators)
 def get_all_reviews(request):
     product_id = request.query_params.get('productId')
+    try:
+        product_id = int(product_id)
+    except (TypeError, ValueError):
+        return Response({'error': 'productId is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    reviews = Review.objects.filter(productId=product_id).order_by('-created_at')
+    # Pagination par curseur (première page sans `cursor`) : un produit populaire
+    # ne renvoie plus tous ses avis d'un coup
+    paginator = KeysetPagination(ordering=('-created_at', '-id'))
+    reviews = paginator.paginate_queryset(Review.objects.filter(productId=product_id), request)
 
     serializer = ReviewSerializer(reviews, many=True)
-    return Response({"reviews": serializer.data})
+    data = paginator.get_paginated_data('reviews', serializer.data)
+    data['stats'] = stats_summary(ProductRatingStats.objects.filter(product_id=product_id).first(), histogram=True)
+    return Response(data)
 
 
 # Fonction pour les posters (bannières)
 @api_view(['GET'])
+@conditional(posters_validators)
 def get_posters(request):
-    posters = Poster.objects.all().order_by('-date_added')
+    def load_posters():
+        posters = Poster.objects.all().order_by('-date_added')
+        return list(PosterSerializer(posters, many=True).data)
+
+    return Response({"posters": catalogue_cache.get_list('posters', 'all', load_posters)})
+
+
+@api_view(['GET'])
+def get_catalogue_cache_stats(request):
+    """Compteurs hits/misses du cache catalogue pour ce processus worker."""
+    return Response(catalogue_cache.stats())
+
 
-    serializer = PosterSerializer(posters, many=True)
-    return Response({"posters": serializer.data})
+@api_view(['GET'])
+def get_database_pool_stats(request):
+    """Métriques des pools de connexions (prêtées, libres, en attente, temps d'attente) de ce processus."""
+    return Response(pool_stats())
 
 
 # Fonctions pour les commandes
 @api_view(['GET'])
 def get_orders(request):
     user_id = request.query_params.get('userId')
-
-    orders = Order.objects.filter(userId=user_id).order_by('-created_at')
+    order_status = request.query_params.get('status')
+    since = request.query_params.get('since')
+
+    # Lignes de commande chargées en une seule requête, limitées aux champs sérialisés
+    items = Prefetch('items', queryset=OrderItem.objects.only('order_id', 'productId', 'quantity', 'price'))
+    orders = Order.objects.filter(userId=user_id).prefetch_related(items).order_by('-created_at')
+
+    if order_status:
+        orders = orders.filter(status=order_status)
+
+    # Synchronisation incrémentale : seulement les commandes créées après `since` (ISO 8601)
+    if since:
+        since_date = parse_datetime(since)
+        if since_date is None:
+            return Response({'error': 'Paramètre since invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(since_date):
+            since_date = timezone.make_aware(since_date)
+        orders = orders.filter(created_at__gt=since_date)
+
+    # Mode curseur (`?cursor=`) sur `(created_at, id)` décroissants
+    if KeysetPagination.is_requested(request):
+        paginator = KeysetPagination(ordering=('-created_at', '-id'))
+        result_page = paginator.paginate_queryset(orders, request)
+        serializer = OrderSerializer(result_page, many=True)
+        return Response(paginator.get_paginated_data('orders', serializer.data))
 
     serializer = OrderSerializer(orders, many=True)
     return Response({"orders": serializer.data})
@@ -515,14 +716,7 @@ def add_shipping_address(request):
     if serializer.is_valid():
         shipping = serializer.save()
 
-        user = User.objects.get(id=shipping.userId)
-        Notification.objects.create(
-            user=user,
-            title="Nouvelle adresse ajoutée",
-            message="Votre nouvelle adresse de livraison a été enregistrée.",
-            type="account",
-            data={"address_id": shipping.id}
-        )
+        notify(shipping.userId, 'address_added', address_id=shipping.id)
 
         return Response(status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -532,43 +726,73 @@ def add_shipping_address(request):
 def order_product(request):
     try:
         data = request.data
+        user_id = data.get('userId')
+
+        # Quantités demandées par produit (les lignes en double sont cumulées)
+        quantities = {}
+        for product_data in data.get('products', []):
+            product_id = int(product_data.get('productId'))
+            quantity = int(product_data.get('quantity', 1))
+            if quantity <= 0:
+                return Response({'error': 'Quantité invalide'}, status=status.HTTP_400_BAD_REQUEST)
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+        if not quantities:
+            return Response({'error': 'Aucun produit à commander'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not User.objects.filter(id=user_id).exists():
+            return Response({'error': 'Utilisateur introuvable'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # Verrouillage des produits dans l'ordre des id : deux commandes concurrentes
+            # prennent leurs verrous dans le même ordre, sans interblocage possible
+            products = list(
+                Product.objects.select_for_update().filter(id__in=quantities).order_by('id')
+            )
+            if len(products) != len(quantities):
+                return Response({'error': 'Produit introuvable'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Créer la commande
-        order = Order.objects.create(
-            userId=data.get('userId'),
-            shippingId=data.get('shippingId'),
-            payment_method=data.get('paymentMethod', 'card'),
-            total_price=data.get('totalPrice', 0)
-        )
+            for product in products:
+                if product.quantity < quantities[product.id]:
+                    return Response({
+                        'error': f"Stock insuffisant pour le produit '{product.product_name}'"
+                    }, status=status.HTTP_409_CONFLICT)
+
+            # Le total est calculé à partir des prix verrouillés, pas de `totalPrice` du client
+            order = Order.objects.create(
+                userId=user_id,
+                shippingId=data.get('shippingId'),
+                payment_method=data.get('paymentMethod', 'card'),
+                total_price=sum(product.price * quantities[product.id] for product in products)
+            )
 
-        # Ajouter les produits commandés
-        products = data.get('products', [])
-        for product_data in products:
-            OrderItem.objects.create(
-                order=order,
-                productId=product_data.get('productId'),
-                quantity=product_data.get('quantity', 1),
-                price=product_data.get('price', 0)
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    productId=product.id,
+                    quantity=quantities[product.id],
+                    price=product.price
+                )
+                for product in products
+            ])
+
+            now = timezone.now()
+            for product in products:
+                product.quantity -= quantities[product.id]
+                product.updated_at = now
+            Product.objects.bulk_update(products, ['quantity', 'updated_at'])
+
+            # Supprimer les produits commandés du panier en une seule requête
+            Cart.objects.filter(userId=user_id, productId__in=quantities).delete()
+
+            notify(
+                user_id, 'order_placed',
+                order_id=order.id, total=float(order.total_price), status=order.status
             )
 
-            # Supprimer le produit du panier
-            Cart.objects.filter(
-                userId=data.get('userId'),
-                productId=product_data.get('productId')
-            ).delete()
-
-        user = User.objects.get(id=data.get('userId'))
-        Notification.objects.create(
-            user=user,
-            title="Nouvelle commande passée",
-            message=f"Votre commande #{order.id} a été créée avec succès.",
-            type="order",
-            data={
-                "order_id": order.id,
-                "total": float(order.total_price),
-                "status": order.status
-            }
-        )
+            # `bulk_update` ne déclenche pas les signaux : stocks à rafraîchir dans le cache
+            transaction.on_commit(catalogue_cache.invalidate_products)
+            transaction.on_commit(lambda: catalogue_cache.invalidate_cart(user_id))
 
         return Response(status=status.HTTP_201_CREATED)
     except Exception as e:
@@ -584,22 +808,43 @@ class NotificationListView(generics.ListAPIView):
 
     def list(self, request, *args, **kwargs):
         user_id = (request.GET.get('userId'))
-        page = int(request.GET.get('page', 1))
         per_page = 20
 
         try:
             user = User.objects.get(id=user_id)
 
-            # Récupérer toutes les notifications de l'utilisateur
+            # Compteurs matérialisés : une lecture par clé primaire au lieu de COUNT(*)
+            counter = get_counter(user.id)
             notifications = Notification.objects.filter(user=user)
 
-            # Compter les notifications non lues
-            unread_count = notifications.filter(is_read=False).count()
-            total_count = notifications.count()
-
-            # Pagination
-            paginator = Paginator(notifications, per_page)
-            notifications_page = paginator.get_page(page)
+            # Mode delta (?since_id=) : seulement les notifications plus récentes que la dernière connue
+            if 'since_id' in request.GET:
+                return self.list_since(request, user, counter)
+
+            # Mode curseur (?cursor=) : pas d'OFFSET, coût constant quelle que soit la page
+            if KeysetPagination.is_requested(request):
+                paginator = KeysetPagination(ordering=('-created_at', '-id'))
+                paginator.page_size = per_page
+                page = paginator.paginate_queryset(notifications, request)
+                serializer = self.get_serializer(page, many=True)
+                return Response({
+                    'success': True,
+                    'message': 'Notifications récupérées avec succès',
+                    **paginator.get_paginated_data('notifications', serializer.data),
+                    'total_count': counter.total,
+                    'unread_count': counter.unread
+                })
+
+            # Mode page (?page=), conservé pour les anciens clients : le nombre de pages
+            # vient du compteur, la page est bornée comme avec `Paginator.get_page`
+            total_pages = max(1, -(-counter.total // per_page))
+            try:
+                page = int(request.GET.get('page', 1))
+            except (TypeError, ValueError):
+                page = 1
+            page = min(max(page, 1), total_pages)
+            offset = (page - 1) * per_page
+            notifications_page = notifications.order_by('-created_at', '-id')[offset:offset + per_page]
 
             # Sérialiser les données
             serializer = self.get_serializer(notifications_page, many=True)
@@ -608,10 +853,10 @@ class NotificationListView(generics.ListAPIView):
                 'success': True,
                 'message': 'Notifications récupérées avec succès',
                 'notifications': serializer.data,
-                'total_pages': paginator.num_pages,
+                'total_pages': total_pages,
                 'current_page': page,
-                'total_count': total_count,
-                'unread_count': unread_count
+                'total_count': counter.total,
+                'unread_count': counter.unread
             })
         except User.DoesNotExist:
             return Response({
@@ -619,14 +864,136 @@ class NotificationListView(generics.ListAPIView):
                 'message': 'Accès non autorisé'
             }, status=status.HTTP_403_FORBIDDEN)
 
+    def list_since(self, request, user, counter):
+        try:
+            since_id = int(request.GET.get('since_id') or 0)
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'since_id invalide'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Même état et mêmes paramètres, même réponse : 304 sans corps si le client l'a déjà
+        limit = KeysetPagination.max_page_size
+        etag = counter_etag(counter, 'since', since_id, limit)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        notifications = []
+        # Rien de plus récent que le plus grand id connu : aucune requête sur `notifications`
+        if since_id < (counter.latest_id or 0):
+            notifications = list(
+                Notification.objects.filter(user=user, id__gt=since_id).order_by('id')[:limit + 1]
+            )
+        has_more = len(notifications) > limit
+        notifications = notifications[:limit]
+
+        serializer = self.get_serializer(notifications, many=True)
+        response = Response({
+            'success': True,
+            'message': 'Notifications récupérées avec succès',
+            'notifications': serializer.data,
+            # À renvoyer en since_id au prochain appel
+            'since_id': notifications[-1].id if notifications else max(since_id, counter.latest_id or 0),
+            'has_more': has_more,
+            'total_count': counter.total,
+            'unread_count': counter.unread
+        })
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+def _find_counter(user_id):
+    """Compteur de notifications de l'utilisateur, `None` si l'utilisateur n'existe pas."""
+    try:
+        counter = NotificationCounter.objects.filter(user_id=user_id).first()
+        if counter is None:
+            # Premier appel : le compteur n'existe pas encore
+            user = User.objects.get(id=user_id)
+            counter = get_counter(user.id)
+    except (User.DoesNotExist, ValueError):
+        return None
+    return counter
+
+
+@api_view(['GET'])
+#@permission_classes([IsAuthenticated])
+def get_notification_status(request):
+    """
+    État minimal pour le badge : nombre de non lues et plus grand id. Avec
+    `If-None-Match`, un état inchangé renvoie 304 sans corps.
+    """
+    counter = _find_counter(request.GET.get('userId'))
+    if counter is None:
+        return Response({
+            'success': False,
+            'message': 'Accès non autorisé'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    etag = counter_etag(counter)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        response = Response({
+            'unread_count': counter.unread,
+            'total_count': counter.total,
+            'latest_id': counter.latest_id
+        })
+        response['ETag'] = etag
+    else:
+        response = not_modified
+    # Le client doit toujours revalider (avec If-None-Match)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+async def notification_stream(request):
+    """
+    Flux Server-Sent Events des nouvelles notifications (vue asynchrone, à
+    servir en ASGI). Sans `Last-Event-ID`, le flux commence après la dernière
+    notification existante ; avec, il renvoie d'abord celles manquées.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if not isinstance(request, ASGIRequest):
+        # Sous WSGI, le flux infini serait consommé en entier avant l'envoi : worker bloqué
+        return JsonResponse({
+            'success': False,
+            'message': 'Flux disponible uniquement en ASGI'
+        }, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    user_id = request.GET.get('userId')
+    counter = await stream_sync_to_async(release_connection(_find_counter))(user_id)
+    if counter is None:
+        return JsonResponse({'success': False, 'message': 'Accès non autorisé'}, status=status.HTTP_403_FORBIDDEN)
+
+    # Le navigateur renvoie l'en-tête à la reconnexion ; le paramètre sert à la première connexion
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else (counter.latest_id or 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Last-Event-ID invalide'}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(notification_events(counter.user_id, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Pas de mise en tampon par nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 
 @api_view(['PUT'])
 #@permission_classes([IsAuthenticated])
 def mark_notification_as_read(request, notificationId):
     try:
         notification = get_object_or_404(Notification, id=notificationId, user=request.user)
-        notification.is_read = True
-        notification.save()
+
+        with transaction.atomic():
+            # UPDATE conditionnel : seul le passage non lue -> lue décrémente le compteur
+            updated = Notification.objects.filter(id=notification.id, is_read=False).update(
+                is_read=True, updated_at=timezone.now()
+            )
+            adjust_counter(notification.user_id, unread=-updated)
 
         return Response({
             'success': True,
@@ -649,8 +1016,12 @@ def mark_notification_as_read(request, notificationId):
 #@permission_classes([IsAuthenticated])
 def delete_notification(request, notificationId):
     try:
-        notification = get_object_or_404(Notification, id=notificationId, user=request.user)
-        notification.delete()
+        with transaction.atomic():
+            notification = get_object_or_404(
+                Notification.objects.select_for_update(), id=notificationId, user=request.user
+            )
+            notification.delete()
+            adjust_counter(notification.user_id, total=-1, unread=0 if notification.is_read else -1)
 
         return Response({
             'success': True,
@@ -673,12 +1044,15 @@ def delete_notification(request, notificationId):
 #@permission_classes([IsAuthenticated])
 def mark_all_as_read(request):
     try:
-        notifications = Notification.objects.filter(user=request.user, is_read=False)
-        notifications.update(is_read=True)
+        with transaction.atomic():
+            updated = Notification.objects.filter(user=request.user, is_read=False).update(
+                is_read=True, updated_at=timezone.now()
+            )
+            adjust_counter(request.user.id, unread=-updated)
 
         return Response({
             'success': True,
-            'message': f'{notifications.count()} notifications marquées comme lues'
+            'message': f'{updated} notifications marquées comme lues'
         })
 
     except Exception as e:
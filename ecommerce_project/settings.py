@@ -74,17 +74,50 @@ WSGI_APPLICATION = 'ecommerce_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Backend MySQL avec pool de connexions (ecommerce_api.dbpool) : la connexion fermée en fin
+# de requête est rendue au pool au lieu d'être coupée. `max_size` par processus serveur
+# (workers x max_size <= max_connections de MySQL), `timeout` d'attente d'une connexion
+# libre, `max_idle` sous le wait_timeout du serveur ; secondes. CONN_HEALTH_CHECKS vérifie
+# une connexion réutilisée avant de la prêter. Le pool exige CONN_MAX_AGE = 0.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'ecommerce_api.backends.mysql',
         'NAME': 'ecommerce_db',
         'USER': 'root',
         'PASSWORD': '',
         'HOST': 'localhost',
         'PORT': '3306',
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'max_size': 20,
+                'timeout': 10,
+                'max_idle': 300,
+                'max_lifetime': 3600,
+            },
+        },
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalogue': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalogue',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Cache catalogue produits/posters (alias de CACHES et durée de vie en secondes)
+CATALOGUE_CACHE_ALIAS = 'catalogue'
+CATALOGUE_CACHE_TIMEOUT = 300
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -125,3 +158,51 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Moteur de recherche produit (classe dérivant de ecommerce_api.search.BaseSearchBackend)
+PRODUCT_SEARCH_BACKEND = 'ecommerce_api.search.InMemorySearchBackend'
+# Index en mémoire : délai (secondes) entre deux rattrapages des écritures des autres processus
+SEARCH_INDEX_REFRESH_INTERVAL = 30
+
+# Notifications : 'async' (workers de fond alimentés par l'outbox) ou 'sync' (traitement immédiat)
+NOTIFICATION_DISPATCH_MODE = 'async'
+NOTIFICATION_WORKERS = 2  # threads par processus ; 0 = planifier process_notification_outbox (cron)
+NOTIFICATION_BATCH_SIZE = 500
+NOTIFICATION_POLL_INTERVAL = 5.0  # secondes, reprise des événements en attente
+NOTIFICATION_CLAIM_LEASE = 60  # secondes avant qu'un événement réservé soit repris
+
+# Flux SSE des notifications (servi en ASGI). Avec plusieurs processus serveur, utiliser
+# 'ecommerce_api.events.RedisBroker' (paquet redis) pour diffuser entre processus.
+NOTIFICATION_BROKER = 'ecommerce_api.events.LocalBroker'
+NOTIFICATION_REDIS_URL = 'redis://localhost:6379/0'
+NOTIFICATION_STREAM_HEARTBEAT = 15  # secondes entre deux commentaires `: ping`
+NOTIFICATION_STREAM_RETRY = 5000  # délai de reconnexion conseillé au client (ms)
+NOTIFICATION_STREAM_DB_THREADS = 4  # threads partagés par les flux du processus pour leurs lectures en base
+
+# Conserver la copie JSON brute de chaque requête add_to_cart dans Cart.cart (jamais relue)
+CART_STORE_PAYLOAD = False
+
+# Historique de consultation : 'buffered' (écriture différée regroupée) ou 'sync' (écriture immédiate)
+HISTORY_WRITE_MODE = 'buffered'
+HISTORY_FLUSH_INTERVAL = 0.5  # secondes entre deux écritures
+HISTORY_FLUSH_SIZE = 1000  # couples (userId, productId) en attente déclenchant une écriture
+HISTORY_MAX_ENTRIES_PER_USER = 200  # consultations gardées par utilisateur (0 = sans limite)
+HISTORY_RETENTION_DAYS = None  # âge maximal appliqué par la commande prune_history (None = sans limite)
+
+# Déclinaisons d'images (posters, photos de profil) : 'background' (thread de fond) ou 'sync'
+IMAGE_PROCESSING_MODE = 'background'
+IMAGE_DERIVATIVE_WIDTHS = [320, 640, 1080]  # pixels, jamais au-delà de la largeur d'origine
+IMAGE_DERIVATIVE_FORMATS = ['webp', 'jpeg']
+IMAGE_DERIVATIVE_QUALITY = 80
+
+# Envoi des photos de profil : None (FileResponse, sendfile via wsgi.file_wrapper),
+# 'x-accel-redirect' (nginx, emplacement `internal` ci-dessous pointant sur MEDIA_ROOT)
+# ou 'x-sendfile' (Apache mod_xsendfile, lighttpd)
+MEDIA_SENDFILE_MODE = None
+MEDIA_ACCEL_REDIRECT_LOCATION = '/protected-media/'
+USER_IMAGE_MAX_AGE = 300  # secondes de cache client avant revalidation (ETag)
+
+# Vues asynchrones pour les lectures les plus sollicitées (produits, recherche, favoris,
+# panier, notifications). À activer uniquement en ASGI : sous WSGI, chaque requête
+# asynchrone démarre sa propre boucle d'événements.
+ASYNC_READ_VIEWS = False